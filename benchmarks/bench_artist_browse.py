@@ -0,0 +1,71 @@
+"""
+Measure the latency of browsing an artist (`tidal:artist:<id>`).
+
+A fake session serves an artist whose top tracks, albums and EPs/singles take
+an artificial latency to fetch. The artist is browsed with a cold cache (the
+artist itself is fetched too) and then again with the artist object cached,
+with and without EPs/singles. The time for the parts fetched one after the
+other (i.e. how the artist directory used to be built) is shown as reference.
+
+Usage: poetry run python benchmarks/bench_artist_browse.py [LATENCY_MS]
+"""
+
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from mopidy_tidal import context
+from mopidy_tidal.library import TidalLibraryProvider
+
+
+def delayed(latency, value):
+    def call(*_, **__):
+        time.sleep(latency)
+        return value
+
+    return call
+
+
+def make_session(latency):
+    artist = SimpleNamespace(id=1, name="Artist")
+    albums = [
+        SimpleNamespace(id=i, name=f"Album {i}", artist=artist) for i in range(20)
+    ]
+    tracks = [
+        SimpleNamespace(id=i, name=f"Track {i}", artist=artist, album=albums[0])
+        for i in range(10)
+    ]
+    artist.get_top_tracks = delayed(latency, tracks)
+    artist.get_albums = delayed(latency, albums)
+    artist.get_ep_singles = delayed(latency, albums[:5])
+    return SimpleNamespace(artist=delayed(latency, artist))
+
+
+def browse(provider, eps):
+    context.get_config()["tidal"]["browse_artist_eps"] = eps
+    start = time.perf_counter()
+    provider.browse("tidal:artist:1")
+    return time.perf_counter() - start
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 100) / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config({"core": {"cache_dir": tmp, "data_dir": tmp}, "tidal": {}})
+        provider = TidalLibraryProvider(
+            backend=mock.Mock(session=make_session(latency))
+        )
+
+        print(f"{latency * 1000:.0f} ms per API call")
+        print(
+            f"sequential (reference): {3 * latency:.2f}s, with EPs {4 * latency:.2f}s"
+        )
+        print(f"cold:                   {browse(provider, False):.2f}s")
+        print(f"cached artist:          {browse(provider, False):.2f}s")
+        print(f"cached artist, EPs:     {browse(provider, True):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the `file` and `sqlite` LruCache storage backends.
+
+For each backend, N entries are written with `LruCache.update`, then a fresh
+cache (i.e. a cold start with an empty memory tier) reads all of them back from
+the storage.
+
+Usage: poetry run python benchmarks/bench_cache_storage.py [N]
+"""
+
+import sys
+import tempfile
+import time
+
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal import context
+from mopidy_tidal.lru_cache import LruCache
+
+
+def make_tracks(n):
+    artist = Artist(uri="tidal:artist:1", name="Artist")
+    album = Album(uri="tidal:album:2", name="Album", artists=[artist])
+    return {
+        f"tidal:track:1:2:{i}": Track(
+            uri=f"tidal:track:1:2:{i}",
+            name=f"Track {i}",
+            artists=[artist],
+            album=album,
+            length=180000,
+        )
+        for i in range(n)
+    }
+
+
+def run(backend, tracks):
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config(
+            {
+                "core": {"cache_dir": tmp, "data_dir": tmp},
+                "tidal": {"cache_backend": backend},
+            }
+        )
+
+        cache = LruCache(max_size=0)
+        start = time.perf_counter()
+        cache.update(tracks)
+        write_secs = time.perf_counter() - start
+        del cache
+
+        start = time.perf_counter()
+        cache = LruCache(max_size=0)
+        init_secs = time.perf_counter() - start
+        for key in tracks:
+            cache[key]
+        cold_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for key in tracks:
+            cache[key]
+        warm_secs = time.perf_counter() - start
+
+    n = len(tracks)
+    print(
+        f"{backend:>6}: write {n / write_secs:10.0f} items/s | "
+        f"init {init_secs * 1000:7.1f} ms | "
+        f"cold lookups {n / cold_secs:10.0f} /s ({cold_secs:.2f}s total) | "
+        f"warm lookups {n / warm_secs:10.0f} /s"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    tracks = make_tracks(n)
+    print(f"{n} entries")
+    for backend in ("file", "sqlite"):
+        run(backend, tracks)
+
+
+if __name__ == "__main__":
+    main()
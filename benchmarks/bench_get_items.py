@@ -0,0 +1,67 @@
+"""
+Compare paginated fetches in `workers.get_items` with and without a known total.
+
+A fake paged endpoint with an artificial per-request latency serves N items;
+`get_items` fetches them first by probing rounds of pages, then with the total
+number of items known in advance. Finally, `iter_items` streams them with the
+total known, and the time until its first item is available is measured.
+
+Usage: poetry run python benchmarks/bench_get_items.py [LATENCY_MS]
+"""
+
+import sys
+import threading
+import time
+
+from mopidy_tidal.workers import get_items, iter_items
+
+
+def make_paged_source(num_items, latency):
+    calls = []
+    lock = threading.Lock()
+
+    def paged_source(limit, offset):
+        with lock:
+            calls.append(offset)
+        time.sleep(latency)
+        return list(range(offset, min(offset + limit, num_items)))
+
+    return paged_source, calls
+
+
+def run(num_items, latency, total):
+    source, calls = make_paged_source(num_items, latency)
+    start = time.perf_counter()
+    items = get_items(source, total=total)
+    secs = time.perf_counter() - start
+    assert items == list(range(num_items))
+    return secs, len(calls)
+
+
+def run_streaming(num_items, latency):
+    source, calls = make_paged_source(num_items, latency)
+    start = time.perf_counter()
+    items = iter_items(source, total=num_items)
+    next(items)
+    first_secs = time.perf_counter() - start
+    assert len([*items]) == num_items - 1
+    return first_secs, time.perf_counter() - start
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    print(f"{latency * 1000:.0f} ms per request")
+    for num_items in (100, 1_000, 10_000):
+        probe_secs, probe_calls = run(num_items, latency, None)
+        total_secs, total_calls = run(num_items, latency, num_items)
+        first_secs, stream_secs = run_streaming(num_items, latency)
+        print(
+            f"{num_items:>6} items: "
+            f"probing {probe_secs:6.2f}s ({probe_calls:3d} requests) | "
+            f"total known {total_secs:6.2f}s ({total_calls:3d} requests) | "
+            f"streaming: first item {first_secs:5.2f}s, all {stream_secs:6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
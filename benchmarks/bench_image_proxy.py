@@ -0,0 +1,87 @@
+"""
+Measure the throughput of the image proxy.
+
+N images (of about 60 KB each) are requested once through the proxy, which
+downloads them from a fake TIDAL with an artificial latency, then requested
+again by one client and by concurrent clients, which are served from the disk
+cache. The clients run in the same process as the proxy.
+
+Usage: poetry run python benchmarks/bench_image_proxy.py [N] [LATENCY_MS]
+"""
+
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mopidy_tidal import context
+from mopidy_tidal.image_proxy import ImageFileCache, ImageProxy
+from mopidy_tidal.metrics import metrics
+
+IMAGE_SIZE = 60 * 1024
+CLIENTS = 8
+ROUNDS = 5
+
+
+def make_fetch(latency):
+    def fetch(url):
+        time.sleep(latency)
+        return url.encode().ljust(IMAGE_SIZE, b"\0")
+
+    return fetch
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return len(response.read())
+
+
+def run(urls, clients):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        size = sum(pool.map(get, urls))
+    return time.perf_counter() - start, size
+
+
+def main():
+    num_images = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config({"core": {"cache_dir": tmp, "data_dir": tmp}, "tidal": {}})
+        proxy = ImageProxy(
+            port=0,
+            hostname="localhost",
+            cache=ImageFileCache(Path(tmp) / "images", 1024 * 1024 * 1024),
+            fetch=make_fetch(latency),
+        )
+        urls = [
+            proxy.proxy_url(
+                "https://resources.tidal.com/images/{}/640x640.jpg".format(
+                    str(uuid.uuid4()).replace("-", "/")
+                )
+            )
+            for _ in range(num_images)
+        ]
+
+        print(f"{num_images} images, {latency * 1000:.0f} ms per download")
+        secs, _ = run(urls, CLIENTS)
+        print(f"cold:   {num_images / secs:8.1f} images/s ({secs:5.2f}s)")
+
+        for clients in (1, CLIENTS):
+            secs, size = run(urls * ROUNDS, clients)
+            print(
+                f"cached: {num_images * ROUNDS / secs:8.1f} images/s "
+                f"({size / secs / 1024 / 1024:6.1f} MB/s, {clients} client(s))"
+            )
+        print(
+            f"downloads: {metrics.counter('image_proxy.miss')}, "
+            f"cache hits: {metrics.counter('image_proxy.hit')}"
+        )
+        proxy.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Measure library lookups against a fake session, which serves albums, artists
+and playlists with an artificial latency and counts the API calls.
+
+- Tracks from a few albums are looked up one URI at a time (i.e. how `lookup`
+  used to resolve them) and then with a single `lookup` of all the URIs, which
+  fetches each album once.
+- 50 mixed album, artist and playlist URIs are looked up one at a time (i.e.
+  sequentially) and then with a single, concurrent, `lookup`.
+
+Usage: poetry run python benchmarks/bench_lookup.py [LATENCY_MS]
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from mopidy_tidal import context
+from mopidy_tidal.library import TidalLibraryProvider
+
+
+class FakeSession:
+    def __init__(self, num_albums, tracks_per_album, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        artist = SimpleNamespace(id=1, name="Artist")
+        self.albums = {}
+        for album_id in range(num_albums):
+            album = SimpleNamespace(
+                id=album_id,
+                name=f"Album {album_id}",
+                artist=artist,
+                artists=[artist],
+                release_date=None,
+            )
+            tracks = [
+                SimpleNamespace(
+                    id=album_id * 1000 + i,
+                    name=f"Track {i}",
+                    full_name=f"Track {i}",
+                    artist=artist,
+                    artists=[artist],
+                    album=album,
+                    duration=180,
+                    track_num=i + 1,
+                    disc_num=1,
+                    volume_num=1,
+                    release_date=None,
+                )
+                for i in range(tracks_per_album)
+            ]
+            album.tracks = self._api_call("album.tracks", lambda t=tracks: t)
+            self.albums[str(album_id)] = album
+
+        all_tracks = [t for a in self.albums.values() for t in a.tracks.__wrapped__()]
+        artist.get_top_tracks = self._api_call(
+            "artist.get_top_tracks", lambda: all_tracks[:10]
+        )
+        self.artists = {"1": artist}
+        self.playlists = {}
+        for playlist_id in range(num_albums):
+            playlist = SimpleNamespace(
+                id=str(playlist_id),
+                name=f"Playlist {playlist_id}",
+                last_updated=None,
+                num_tracks=len(all_tracks),
+            )
+            playlist.tracks = self._api_call(
+                "playlist.tracks",
+                lambda limit, offset: all_tracks[offset : offset + limit],
+            )
+            playlist.tracks.__name__ = "tracks"
+            self.playlists[str(playlist_id)] = playlist
+
+    def _api_call(self, name, func):
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls[name] += 1
+            time.sleep(self.latency)
+            return func(*args, **kwargs)
+
+        call.__wrapped__ = func
+        return call
+
+    def album(self, album_id):
+        return self._api_call("album", self.albums.__getitem__)(album_id)
+
+    def artist(self, artist_id):
+        return self._api_call("artist", self.artists.__getitem__)(artist_id)
+
+    def playlist(self, playlist_id):
+        return self._api_call("playlist", self.playlists.__getitem__)(playlist_id)
+
+
+def make_provider(session):
+    backend = mock.Mock(session=session)
+    provider = TidalLibraryProvider(backend=backend)
+    for cache in (
+        provider._track_cache,
+        provider._album_cache,
+        provider._artist_cache,
+        provider._playlist_cache,
+    ):
+        cache._persist = False
+    return provider
+
+
+def run(num_albums, tracks_per_album, latency):
+    session = FakeSession(num_albums, tracks_per_album, latency)
+    uris = [
+        f"tidal:track:1:{album_id}:{album_id * 1000 + i}"
+        for album_id in range(num_albums)
+        for i in range(tracks_per_album)
+    ]
+
+    provider = make_provider(session)
+    start = time.perf_counter()
+    one_by_one = [t for uri in uris for t in provider.lookup(uri)]
+    one_by_one_secs = time.perf_counter() - start
+    one_by_one_calls = sum(session.calls.values())
+
+    session.calls.clear()
+    provider = make_provider(session)
+    start = time.perf_counter()
+    grouped = provider.lookup(uris)
+    grouped_secs = time.perf_counter() - start
+    grouped_calls = sum(session.calls.values())
+
+    assert grouped == one_by_one
+    print(
+        f"{num_albums} album(s) x {tracks_per_album} tracks: "
+        f"one by one {one_by_one_calls:4d} calls ({one_by_one_secs:5.2f}s) | "
+        f"grouped {grouped_calls:4d} calls ({grouped_secs:5.2f}s)"
+    )
+
+
+def run_mixed(num_uris, latency):
+    session = FakeSession(num_uris // 3 + 1, 20, latency)
+    kinds = ["album", "artist", "playlist"]
+    uris = []
+    for i in range(num_uris):
+        kind = kinds[i % len(kinds)]
+        item_id = 1 if kind == "artist" else i // len(kinds)
+        uris.append(f"tidal:{kind}:{item_id}")
+
+    start = time.perf_counter()
+    sequential = []
+    for uri in uris:
+        # A new provider for each URI, so that nothing is served from the cache
+        sequential += make_provider(session).lookup(uri)
+    sequential_secs = time.perf_counter() - start
+
+    provider = make_provider(session)
+    start = time.perf_counter()
+    concurrent = provider.lookup(uris)
+    concurrent_secs = time.perf_counter() - start
+
+    assert concurrent == sequential
+    print(
+        f"{num_uris} mixed URIs: sequential {sequential_secs:5.2f}s | "
+        f"concurrent {concurrent_secs:5.2f}s"
+    )
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 20) / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config({"core": {"cache_dir": tmp, "data_dir": tmp}, "tidal": {}})
+        print(f"{latency * 1000:.0f} ms per API call")
+        run(1, 40, latency)
+        run(4, 10, latency)
+        run(10, 12, latency)
+        run_mixed(50, latency)
+
+
+if __name__ == "__main__":
+    main()
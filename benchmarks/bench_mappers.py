@@ -0,0 +1,84 @@
+"""
+Measure the mapping of N synthetic tracks (from albums of 100 tracks) to Mopidy
+models, with and without the shared artist and album models.
+
+For each run, the time taken by `create_mopidy_tracks`, the memory held by the
+mapped tracks (and the peak memory while mapping them), the number of distinct `Album` objects and the size of the
+tracks pickled one by one (as the track cache stores them) are reported.
+
+Usage: poetry run python benchmarks/bench_mappers.py [N]
+"""
+
+import gc
+import pickle
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from mopidy_tidal import full_models_mappers
+from mopidy_tidal.full_models_mappers import ModelTable, create_mopidy_tracks
+
+TRACKS_PER_ALBUM = 100
+
+
+def make_tracks(n):
+    tracks = []
+    for album_id in range((n + TRACKS_PER_ALBUM - 1) // TRACKS_PER_ALBUM):
+        artist = SimpleNamespace(id=album_id % 10, name=f"Artist {album_id % 10}")
+        album = SimpleNamespace(
+            id=album_id, name=f"Album {album_id}", artist=artist, release_date=None
+        )
+        for i in range(min(TRACKS_PER_ALBUM, n - len(tracks))):
+            tracks.append(
+                SimpleNamespace(
+                    id=album_id * 1000 + i,
+                    full_name=f"Track {i}",
+                    track_num=i + 1,
+                    disc_num=1,
+                    volume_num=1,
+                    duration=180,
+                    artist=artist,
+                    album=album,
+                    release_date=None,
+                )
+            )
+    return tracks
+
+
+def map_tracks(tidal_tracks, table_size):
+    full_models_mappers._artists = ModelTable(table_size)
+    full_models_mappers._albums = ModelTable(table_size)
+    gc.collect()
+    return create_mopidy_tracks(tidal_tracks)
+
+
+def run(name, tidal_tracks, table_size):
+    start = time.perf_counter()
+    map_tracks(tidal_tracks, table_size)
+    secs = time.perf_counter() - start
+
+    tracemalloc.start()
+    tracks = map_tracks(tidal_tracks, table_size)
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    albums = len({id(t.album) for t in tracks})
+    pickled = sum(len(pickle.dumps(t)) for t in tracks)
+    print(
+        f"{name:9s} {secs:6.3f}s | {memory / 1024 / 1024:6.2f} MB "
+        f"(peak {peak / 1024 / 1024:6.2f} MB) | "
+        f"{albums:6d} Album objects | {pickled / 1024 / 1024:6.2f} MB pickled"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    tidal_tracks = make_tracks(n)
+    print(f"{n} tracks, {TRACKS_PER_ALBUM} per album")
+    run("unshared", tidal_tracks, 0)
+    run("shared", tidal_tracks, full_models_mappers.INTERN_TABLE_SIZE)
+
+
+if __name__ == "__main__":
+    main()
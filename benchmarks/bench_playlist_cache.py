@@ -0,0 +1,107 @@
+"""
+Compare the playlist cache storing whole Mopidy playlists with the compact
+one, which stores track IDs over a shared track store.
+
+N playlists of 300 tracks are drawn from a pool of tracks, so that each track
+belongs to about 20 playlists. For each format, the playlists are written to
+the cache, then a fresh cache (i.e. a cold start, with none of the playlists
+still in memory) reads all of them back.
+
+Usage: poetry run python benchmarks/bench_playlist_cache.py [N]
+"""
+
+import gc
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mopidy.models import Album, Artist, Playlist, Track
+
+from mopidy_tidal import context, track_store
+from mopidy_tidal.playlists import PlaylistCache
+
+TRACKS_PER_PLAYLIST = 300
+PLAYLISTS_PER_TRACK = 20
+
+
+class FullPlaylistCache(PlaylistCache):
+    """The playlist cache, storing the tracks within each playlist."""
+
+    compact = False
+
+
+def make_playlists(n):
+    rnd = random.Random(0)
+    num_tracks = max(n * TRACKS_PER_PLAYLIST // PLAYLISTS_PER_TRACK, 1)
+    tracks = []
+    for i in range(num_tracks):
+        artist = Artist(uri=f"tidal:artist:{i % 500}", name=f"Artist {i % 500}")
+        album = Album(
+            uri=f"tidal:album:{i // 10}", name=f"Album {i // 10}", artists=[artist]
+        )
+        tracks.append(
+            Track(
+                uri=f"tidal:track:{i % 500}:{i // 10}:{i}",
+                name=f"Track {i}",
+                artists=[artist],
+                album=album,
+                length=180000,
+                track_no=i % 10 + 1,
+                disc_no=1,
+            )
+        )
+
+    return {
+        f"tidal:playlist:{p}": Playlist(
+            uri=f"tidal:playlist:{p}",
+            name=f"Playlist {p}",
+            tracks=rnd.sample(tracks, min(TRACKS_PER_PLAYLIST, len(tracks))),
+            last_modified=1000,
+        )
+        for p in range(n)
+    }
+
+
+def disk_size(directory):
+    return sum(f.stat().st_size for f in Path(directory).rglob("*") if f.is_file())
+
+
+def run(name, cache_class, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config({"core": {"cache_dir": tmp, "data_dir": tmp}, "tidal": {}})
+        track_store._stores.clear()
+
+        playlists = make_playlists(n)
+        uris = list(playlists)
+        num_tracks = sum(len(pl.tracks) for pl in playlists.values())
+        cache = cache_class(max_size=0)
+        start = time.perf_counter()
+        cache.update(playlists)
+        write_secs = time.perf_counter() - start
+        del cache, playlists
+        gc.collect()
+
+        track_store._stores.clear()
+        cache = cache_class(max_size=0)
+        start = time.perf_counter()
+        loaded = [cache[uri] for uri in uris]
+        read_secs = time.perf_counter() - start
+
+        assert sum(len(pl.tracks) for pl in loaded) == num_tracks
+        print(
+            f"{name:8s} write {write_secs:6.2f}s | cold load {read_secs:6.2f}s | "
+            f"{disk_size(tmp) / 1024 / 1024:7.2f} MB on disk"
+        )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    print(f"{n} playlists of {TRACKS_PER_PLAYLIST} tracks")
+    run("full", FullPlaylistCache, n)
+    run("compact", PlaylistCache, n)
+
+
+if __name__ == "__main__":
+    main()
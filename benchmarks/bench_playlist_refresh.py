@@ -0,0 +1,130 @@
+"""
+Measure a full refresh of the playlists (`refresh(include_items=True)`)
+against a fake session, which serves N playlists of 250 tracks with an
+artificial latency per API call.
+
+The refresh is run with a single lookup worker (i.e. one playlist after the
+other, as `refresh` used to fetch them) and then with the default pool sizes.
+In both cases, the pages of each playlist are fetched on the shared API pool,
+and the highest number of concurrent API calls is reported.
+
+Usage: poetry run python benchmarks/bench_playlist_refresh.py [N] [LATENCY_MS]
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from tidalapi.playlist import Playlist as TidalPlaylist
+
+from mopidy_tidal import context
+from mopidy_tidal.playlists import TidalPlaylistsProvider
+from mopidy_tidal.workers import WorkerPools
+
+TRACKS_PER_PLAYLIST = 250
+
+
+class FakePlaylist(TidalPlaylist):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeSession:
+    def __init__(self, num_playlists, latency):
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        artist = SimpleNamespace(id=1, name="Artist")
+        album = SimpleNamespace(
+            id=1, name="Album", artist=artist, artists=[artist], release_date=None
+        )
+        tracks = [
+            SimpleNamespace(
+                id=i,
+                name=f"Track {i}",
+                full_name=f"Track {i}",
+                artist=artist,
+                artists=[artist],
+                album=album,
+                duration=180,
+                track_num=i + 1,
+                disc_num=1,
+                volume_num=1,
+                release_date=None,
+            )
+            for i in range(TRACKS_PER_PLAYLIST)
+        ]
+
+        self.playlists = []
+        for playlist_id in range(num_playlists):
+            playlist = FakePlaylist(
+                id=str(playlist_id),
+                name=f"Playlist {playlist_id}",
+                last_updated=None,
+                num_tracks=len(tracks),
+            )
+            playlist.tracks = self._api_call(
+                lambda limit, offset: tracks[offset : offset + limit]
+            )
+            playlist.tracks.__name__ = "tracks"
+            self.playlists.append(playlist)
+
+    def _api_call(self, func):
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            try:
+                time.sleep(self.latency)
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        return call
+
+
+def run(name, num_playlists, latency, pool_sizes=None):
+    session = FakeSession(num_playlists, latency)
+    backend = mock.Mock(session=session, _config={"tidal": {}})
+    provider = TidalPlaylistsProvider(backend=backend)
+    provider._playlists._persist = False
+    provider._current_tidal_playlists = session.playlists
+
+    pools = WorkerPools(pool_sizes)
+    pools.start()
+    try:
+        start = time.perf_counter()
+        provider.refresh(include_items=True)
+        secs = time.perf_counter() - start
+    finally:
+        pools.shutdown()
+
+    assert len(provider._playlists) == num_playlists
+    print(
+        f"{name:10s} {secs:6.2f}s | {session.calls:5d} API calls | "
+        f"at most {session.max_active} at once"
+    )
+
+
+def main():
+    num_playlists = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        context.set_config({"core": {"cache_dir": tmp, "data_dir": tmp}, "tidal": {}})
+        print(
+            f"{num_playlists} playlists of {TRACKS_PER_PLAYLIST} tracks, "
+            f"{latency * 1000:.0f} ms per API call"
+        )
+        run("serial", num_playlists, latency, {"lookup": 1})
+        run("concurrent", num_playlists, latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,12 +32,36 @@ class Extension(ext.Extension):
         schema["client_id"] = config.String(optional=True)
         schema["client_secret"] = config.String(optional=True)
         schema["playlist_cache_refresh_secs"] = config.Integer(optional=True)
+        schema["playlist_changes_ttl_secs"] = config.Integer(optional=True, minimum=0)
         schema["lazy"] = config.Boolean(optional=True)
         schema["login_method"] = config.String(choices=["BLOCK", "HACK", "AUTO"])
         schema["auth_method"] = config.String(optional=True, choices=["OAUTH", "PKCE"])
         schema["login_server_port"] = config.Integer(
             optional=True, choices=range(8000, 9000)
         )
+        schema["cache_backend"] = config.String(
+            optional=True, choices=["file", "sqlite"]
+        )
+        schema["cache_write_behind"] = config.Boolean(optional=True)
+        schema["search_cache_ttl_secs"] = config.Integer(optional=True, minimum=0)
+        schema["search_cache_size"] = config.Integer(optional=True, minimum=0)
+        schema["page_cache_ttl_secs"] = config.Integer(optional=True, minimum=0)
+        schema["browse_artist_eps"] = config.Boolean(optional=True)
+        schema["favorites_refresh_secs"] = config.Integer(optional=True, minimum=0)
+        schema["favorites_full_sync_secs"] = config.Integer(optional=True, minimum=0)
+        schema["local_search"] = config.Boolean(optional=True)
+        schema["image_proxy"] = config.Boolean(optional=True)
+        schema["image_proxy_port"] = config.Port(optional=True)
+        schema["image_proxy_hostname"] = config.Hostname(optional=True)
+        schema["image_proxy_cache_mb"] = config.Integer(optional=True, minimum=1)
+        schema["api_workers"] = config.Integer(optional=True, minimum=1)
+        schema["lookup_workers"] = config.Integer(optional=True, minimum=1)
+        schema["image_workers"] = config.Integer(optional=True, minimum=1)
+        schema["search_workers"] = config.Integer(optional=True, minimum=1)
+        schema["background_workers"] = config.Integer(optional=True, minimum=1)
+        schema["api_requests_per_sec"] = config.Float(optional=True, minimum=0)
+        schema["api_max_retries"] = config.Integer(optional=True, minimum=0)
+        schema["metrics_log_secs"] = config.Integer(optional=True, minimum=0)
         return schema
 
     def setup(self, registry):
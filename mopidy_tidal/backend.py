@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 import time
 from concurrent.futures import Future
 from pathlib import Path
@@ -13,11 +14,23 @@ from tidalapi import __version__ as tidalapi_ver
 
 from mopidy_tidal import Extension
 from mopidy_tidal import __version__ as mopidy_tidal_ver
-from mopidy_tidal import context, library, playback, playlists
+from mopidy_tidal import (
+    cache_storage,
+    context,
+    library,
+    playback,
+    playlists,
+    rate_limit,
+)
+from mopidy_tidal.metrics import metrics
 from mopidy_tidal.web_auth_server import WebAuthServer
+from mopidy_tidal.workers import DEFAULT_POOL_SIZES, WorkerPools, run_in_background
 
 logger = logging.getLogger(__name__)
 
+# How often (in seconds) the metrics are logged while the backend runs
+DEFAULT_METRICS_LOG_SECS = 300
+
 
 class TidalBackend(ThreadingActor, backend.Backend):
     def __init__(self, config, audio):
@@ -41,6 +54,9 @@ class TidalBackend(ThreadingActor, backend.Backend):
         self.data_dir: Path = Path(Extension.get_data_dir(self._config))
         self.session_file_path: Path = Path("")
         self.web_auth_server: WebAuthServer = WebAuthServer()
+        self.worker_pools: Optional[WorkerPools] = None
+        self.request_scheduler: Optional[rate_limit.RequestScheduler] = None
+        self._metrics_timer: Optional[threading.Timer] = None
 
         # Config parameters
         # Lazy: Connect lazily, i.e. login only when user starts browsing TIDAL directories
@@ -118,10 +134,68 @@ class TidalBackend(ThreadingActor, backend.Backend):
         else:
             logger.info("Using default client id & client secret from python-tidal")
 
+        self.worker_pools = WorkerPools(self._get_pool_sizes())
+        self.worker_pools.start()
+        self._schedule_metrics_log()
+
         self._active_session = Session(config)
+        self.request_scheduler = rate_limit.RequestScheduler(
+            requests_per_sec=rate_limit.get_requests_per_sec(),
+            max_retries=rate_limit.get_max_retries(),
+        )
+        self.request_scheduler.install(self._active_session)
         if not self.lazy_connect:
             self._login()
 
+    def on_stop(self):
+        if self.worker_pools:
+            self.worker_pools.shutdown()
+            self.worker_pools = None
+        if self._metrics_timer:
+            self._metrics_timer.cancel()
+            self._metrics_timer = None
+
+        logger.info("Flushing TIDAL cache...")
+        cache_storage.flush_all()
+        self.library.close()
+        cache_storage.close_all()
+        metrics.log()
+
+    def _schedule_metrics_log(self):
+        interval = self._tidal_config.get("metrics_log_secs")
+        if interval is None:
+            interval = DEFAULT_METRICS_LOG_SECS
+        if not interval:
+            return
+
+        self._metrics_timer = threading.Timer(interval, self._log_metrics)
+        self._metrics_timer.daemon = True
+        self._metrics_timer.start()
+
+    def _log_metrics(self):
+        if not self.worker_pools:
+            # The backend is stopping
+            return
+
+        try:
+            run_in_background("background", metrics.log)
+        except RuntimeError:
+            return
+        self._schedule_metrics_log()
+
+    def _get_pool_sizes(self) -> dict[str, int]:
+        sizes = {}
+        for name, option in (
+            ("api", "api_workers"),
+            ("lookup", "lookup_workers"),
+            ("images", "image_workers"),
+            ("search", "search_workers"),
+            ("background", "background_workers"),
+        ):
+            size = self._tidal_config.get(option)
+            sizes[name] = size if isinstance(size, int) else DEFAULT_POOL_SIZES[name]
+        return sizes
+
     def _login(self):
         """Load session at startup or create a new session"""
         if self._active_session.load_session_from_file(self.session_file_path):
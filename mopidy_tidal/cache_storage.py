@@ -0,0 +1,423 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+from mopidy_tidal.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_write_behind_storages: "weakref.WeakSet[WriteBehindStorage]" = weakref.WeakSet()
+_sqlite_storages: "weakref.WeakSet[SqliteCacheStorage]" = weakref.WeakSet()
+
+
+class CacheStorage(ABC):
+    """
+    Persistence layer of a :class:`mopidy_tidal.lru_cache.LruCache`.
+
+    Storages map TIDAL URIs to picklable values. Lookups of keys that are not
+    stored (or whose stored value can't be read) raise a `KeyError`.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        pass
+
+    def set_many(self, items: Mapping[str, Any]):
+        for key, value in items.items():
+            self.set(key, value)
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileCacheStorage(CacheStorage):
+    """
+    Store each entry as its own pickle file.
+
+    :param cache_file: Callable that maps a key to the path of its cache file
+    """
+
+    def __init__(self, cache_file: Callable[[str], Path]):
+        self._cache_file = cache_file
+
+    def get(self, key):
+        cache_file = self._cache_file(key)
+        if not cache_file.is_file():
+            # Cache miss on the filesystem
+            raise KeyError(key)
+
+        # Cache hit on the filesystem
+        with open(cache_file, "rb") as f:
+            try:
+                return pickle.load(f)
+            except Exception as e:
+                # If the cache entry on the filesystem is corrupt, reset it
+                logger.warning(
+                    "Could not deserialize cache file %s: " "refreshing the entry: %s",
+                    cache_file,
+                    e,
+                )
+
+        self.delete(key)
+        raise KeyError(key)
+
+    def set(self, key, value):
+        # Write to a temporary file and rename it, so readers never see a
+        # partially written entry
+        cache_file = self._cache_file(key)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+    def delete(self, key):
+        cache_file = self._cache_file(key)
+        if cache_file.is_file():
+            cache_file.unlink()
+
+
+class SqliteCacheStorage(CacheStorage):
+    """
+    Store all the entries in a single SQLite database.
+
+    Several storages can share the same database file: their entries are kept
+    apart by `namespace`. The first time a database is opened, the pickle files
+    found in the legacy per-file cache tree under `import_dir` are imported.
+
+    A closed storage opens the database again the next time it's used.
+
+    :param db_file: Path of the database file
+    :param namespace: Namespace of the entries handled by this storage
+    :param import_dir: Root of the legacy per-file cache tree (default: the
+        directory of `db_file`)
+    """
+
+    _init_lock = threading.Lock()
+
+    def __init__(
+        self, db_file: Path, namespace: str = "", import_dir: Optional[Path] = None
+    ):
+        self._db_file = db_file
+        self._namespace = namespace
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        conn = self._connection()
+
+        with self._init_lock:
+            with _Transaction(conn):
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB, "
+                    "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS meta "
+                    "(name TEXT PRIMARY KEY, value TEXT)"
+                )
+                imported = conn.execute(
+                    "SELECT value FROM meta WHERE name = 'imported'"
+                ).fetchone()
+                if not imported:
+                    self._import_tree(import_dir or db_file.parent)
+                    conn.execute(
+                        "INSERT INTO meta (name, value) VALUES ('imported', '1')"
+                    )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with the lock held (or while initialising the storage)
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                str(self._db_file),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            _sqlite_storages.add(self)
+        return self._conn
+
+    def _import_tree(self, root: Path):
+        rows = list(_scan_cache_tree(root))
+
+        if rows:
+            logger.info("Importing %d file cache entries from %s", len(rows), root)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT value FROM cache WHERE namespace = ? AND key = ?",
+                    (self._namespace, key),
+                )
+                .fetchone()
+            )
+
+        if row is None:
+            raise KeyError(key)
+
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.warning(
+                "Could not deserialize cache entry %s: refreshing the entry: %s",
+                key,
+                e,
+            )
+
+        self.delete(key)
+        raise KeyError(key)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        rows = [
+            (self._namespace, key, pickle.dumps(value)) for key, value in items.items()
+        ]
+        with self._lock, _Transaction(self._connection()) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                (self._namespace, key),
+            )
+
+    def clear(self):
+        """Delete all the entries of the namespace."""
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM cache WHERE namespace = ?", (self._namespace,)
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class WriteBehindStorage(CacheStorage):
+    """
+    Defer the writes to another storage to a background thread.
+
+    Written values are visible to :meth:`get` immediately. They are batched
+    (multiple writes to the same key are coalesced) and persisted at most
+    `flush_interval` seconds later, or when :meth:`flush` or :meth:`close` are
+    called.
+
+    :param storage: The storage the writes are deferred to
+    :param flush_interval: How long to wait for more writes before persisting
+        a batch (default: 1 second)
+    """
+
+    def __init__(self, storage: CacheStorage, flush_interval: float = 1.0):
+        self._storage = storage
+        self._flush_interval = flush_interval
+        self._pending: Dict[str, Any] = {}
+        self._in_flight: Dict[str, Any] = {}
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        _write_behind_storages.add(self)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of entries waiting to be persisted."""
+        with self._cond:
+            return len(self._pending)
+
+    def get(self, key):
+        with self._cond:
+            for entries in (self._pending, self._in_flight):
+                if key in entries:
+                    return entries[key]
+
+        return self._storage.get(key)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        if self._closed:
+            self._storage.set_many(items)
+            return
+
+        with self._cond:
+            self._pending.update(items)
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="TidalCacheWriter", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+        _update_queue_depth()
+
+    def delete(self, key):
+        with self._io_lock:
+            with self._cond:
+                self._pending.pop(key, None)
+            self._storage.delete(key)
+        _update_queue_depth()
+
+    def flush(self):
+        """Persist all the pending entries."""
+        with self._io_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+
+            _update_queue_depth()
+            if not batch:
+                return
+
+            start = time.monotonic()
+            try:
+                self._storage.set_many(batch)
+            except Exception as e:
+                logger.error("Could not persist %d cache entries: %s", len(batch), e)
+            finally:
+                with self._cond:
+                    self._in_flight = {}
+
+            flush_secs = time.monotonic() - start
+            metrics.observe("cache.write_behind.flush", flush_secs)
+            metrics.incr("cache.write_behind.flushed", len(batch))
+            logger.debug("Persisted %d cache entries in %.3fs", len(batch), flush_secs)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        self._storage.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                # Give more writes the chance to join the batch
+                self._cond.wait_for(lambda: self._closed, self._flush_interval)
+
+            self.flush()
+
+
+def _update_queue_depth():
+    # Total of all the storages: each one only knows its own queue
+    metrics.set_gauge(
+        "cache.write_behind.queue_depth",
+        sum(storage.queue_depth for storage in list(_write_behind_storages)),
+    )
+
+
+def flush_all():
+    """Persist the pending entries of all the write-behind storages."""
+    for storage in list(_write_behind_storages):
+        storage.flush()
+
+
+def close_all():
+    """
+    Persist the pending entries of all the write-behind storages, and close
+    them along with all the SQLite storages.
+    """
+    for storage in list(_write_behind_storages):
+        storage.close()
+    for storage in list(_sqlite_storages):
+        storage.close()
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, *_):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _key_from_cache_file(path: Path, value: Any) -> str:
+    uri = getattr(value, "uri", None)
+    if isinstance(uri, str) and uri.startswith("tidal:"):
+        return uri
+
+    name = path.name[: -len(".cache")]
+    if ":" in name:
+        # Legacy file name, the key is stored as is
+        return name
+
+    # Dashes in the ID are ambiguous, only the first two separators are colons
+    return ":".join(name.split("-", 2))
+
+
+def _scan_cache_tree(root: Path) -> Iterable[Tuple[str, str, bytes]]:
+    """
+    Yield `(namespace, key, pickled value)` for every entry of a per-file cache
+    tree, laid out as `<directory>/<type or namespace>/<id[:2]>/<key>.cache`.
+    """
+    for path in root.rglob("*.cache"):
+        parts = path.relative_to(root).parts
+        if len(parts) < 3:
+            continue
+
+        data = path.read_bytes()
+        try:
+            value = pickle.loads(data)
+        except Exception as e:
+            logger.warning("Skipping corrupt cache file %s: %s", path, e)
+            continue
+
+        key = _key_from_cache_file(path, value)
+        key_parts = key.split(":")
+        if len(key_parts) < 3:
+            continue
+
+        namespace_parts = list(parts[:-3])
+        if parts[-3] != key_parts[1]:
+            namespace_parts.append(parts[-3])
+
+        yield "/".join(namespace_parts), key, data
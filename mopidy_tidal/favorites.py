@@ -0,0 +1,377 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.workers import SingleFlight, run_in_background
+
+logger = logging.getLogger(__name__)
+
+FAVORITES_FILE = "favorites.pickle"
+# Version of the format of the persisted index
+FAVORITES_VERSION = 2
+DEFAULT_FAVORITES_REFRESH = 600
+DEFAULT_FAVORITES_FULL_SYNC = 86400
+# Number of favourites requested at a time by a delta sync
+DELTA_PAGE_SIZE = 50
+
+
+def get_favorites_refresh_secs() -> int:
+    secs = context.get_config()[Extension.ext_name].get("favorites_refresh_secs")
+    return secs if isinstance(secs, int) else DEFAULT_FAVORITES_REFRESH
+
+
+def get_favorites_full_sync_secs() -> int:
+    secs = context.get_config()[Extension.ext_name].get("favorites_full_sync_secs")
+    return secs if isinstance(secs, int) else DEFAULT_FAVORITES_FULL_SYNC
+
+
+class FavoriteArtist(NamedTuple):
+    id: str
+    name: str
+
+
+class FavoriteAlbum(NamedTuple):
+    id: str
+    name: str
+    artists: Tuple[str, ...]
+
+
+class FavoriteTrack(NamedTuple):
+    id: str
+    name: str
+    artist_id: Optional[str]
+    artists: Tuple[str, ...]
+    album_id: Optional[str]
+    album: Optional[str]
+
+    @property
+    def uri(self) -> str:
+        return f"tidal:track:{self.artist_id}:{self.album_id}:{self.id}"
+
+
+def _id(obj) -> Optional[str]:
+    item_id = getattr(obj, "id", None)
+    return str(item_id) if isinstance(item_id, (int, str)) else None
+
+
+def _name(obj) -> Optional[str]:
+    name = getattr(obj, "name", None)
+    return name if isinstance(name, str) else None
+
+
+def _artist_names(obj) -> Tuple[str, ...]:
+    artists = getattr(obj, "artists", None)
+    if not isinstance(artists, list):
+        artists = [getattr(obj, "artist", None)]
+    return tuple(name for name in map(_name, artists) if name)
+
+
+def _create_entry(kind: str, obj):
+    item_id = str(obj.id)
+    if kind == "artists":
+        return FavoriteArtist(item_id, _name(obj) or "")
+    if kind == "albums":
+        return FavoriteAlbum(item_id, _name(obj) or "", _artist_names(obj))
+
+    album = getattr(obj, "album", None)
+    return FavoriteTrack(
+        item_id,
+        _name(obj) or "",
+        _id(getattr(obj, "artist", None)),
+        _artist_names(obj),
+        _id(album),
+        _name(album),
+    )
+
+
+def _matches(names: Collection[str], wanted: Set[str]) -> bool:
+    return any(name.casefold() in wanted for name in names)
+
+
+class FavoritesIndex:
+    """
+    Local index of the user's favourite artists, albums and tracks (and of
+    the artists and albums that they belong to), newest first. It answers the
+    favourites listings and the `get_distinct` queries of MPD clients without
+    paging through the favourites on the TIDAL API.
+
+    The index is persisted in the cache directory and loaded at startup. Each
+    kind of favourites is fully fetched the first time it's needed. After
+    that, it's kept up to date by delta syncs, which page through the
+    favourites newest first and stop at the first item that's already
+    indexed. Delta syncs can't see removed favourites, so the index is fully
+    synced again every `favorites_full_sync_secs` seconds, in the background.
+
+    :param fetch: Callable that returns the favourites of a kind (`artists`,
+        `albums` or `tracks`) as `tidalapi` objects, newest first:
+        `fetch(kind)` returns all of them, `fetch(kind, limit, offset)` a page
+    :param cache_file: Path of the persisted index (default:
+        `favorites.pickle` in the cache directory)
+    :param on_update: Optional callable, called with the kind and the new
+        entries whenever the index is synced
+    """
+
+    kinds = ("artists", "albums", "tracks")
+
+    def __init__(
+        self,
+        fetch: Callable[..., list],
+        cache_file: Optional[Path] = None,
+        clock: Callable[[], float] = time.time,
+        on_update: Optional[Callable[[str, list], None]] = None,
+    ):
+        self._fetch = fetch
+        self._on_update = on_update
+        self._cache_file = cache_file or (
+            Path(Extension.get_cache_dir(context.get_config())) / FAVORITES_FILE
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._items: Dict[str, dict] = {kind: {} for kind in self.kinds}
+        # When each kind was last synced, and last fully synced
+        self._updated_at: Dict[str, float] = {}
+        self._full_synced_at: Dict[str, float] = {}
+        self._sync_locks = {kind: threading.Lock() for kind in self.kinds}
+        self._syncing: Set[Tuple[str, bool]] = set()
+        self._syncs = SingleFlight("favorites")
+        self._load()
+
+    @property
+    def refresh_secs(self) -> int:
+        return get_favorites_refresh_secs()
+
+    @property
+    def full_sync_secs(self) -> int:
+        return get_favorites_full_sync_secs()
+
+    def _load(self):
+        if not self._cache_file.is_file():
+            return
+
+        try:
+            with open(self._cache_file, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != FAVORITES_VERSION:
+                logger.debug("Ignoring outdated favourites index %s", self._cache_file)
+                return
+            items, updated_at = data["items"], data["updated_at"]
+            full_synced_at = data["full_synced_at"]
+        except Exception as e:
+            logger.warning(
+                "Could not load the favourites index %s: %s", self._cache_file, e
+            )
+            return
+
+        with self._lock:
+            for kind in self.kinds:
+                if kind in full_synced_at:
+                    self._items[kind] = items[kind]
+                    self._updated_at[kind] = updated_at[kind]
+                    self._full_synced_at[kind] = full_synced_at[kind]
+
+        logger.debug(
+            "Loaded the favourites index: %s",
+            ", ".join(f"{len(self._items[k])} {k}" for k in self.kinds),
+        )
+
+    def _save(self):
+        with self._lock:
+            data = {
+                "version": FAVORITES_VERSION,
+                "items": dict(self._items),
+                "updated_at": dict(self._updated_at),
+                "full_synced_at": dict(self._full_synced_at),
+            }
+
+        # Write to a temporary file and rename it, so that an interrupted write
+        # doesn't corrupt the index
+        self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=self._cache_file.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f)
+            os.replace(tmp_file, self._cache_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+    def sync(self, kind: str, full: bool = False):
+        """
+        Sync the favourites of a kind: fetch the ones added since the last
+        sync or, if `full` (or if they were never fetched), all of them.
+        """
+        # Concurrent syncs of the same kind share the API calls
+        self._syncs((kind, full), self._sync, kind, full)
+
+    def _sync(self, kind: str, full: bool):
+        with self._sync_locks[kind]:
+            with self._lock:
+                full = full or kind not in self._full_synced_at
+            if full:
+                entries = self._full_sync(kind)
+            else:
+                entries = self._delta_sync(kind)
+
+        if not (full or entries):
+            return
+
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning("Could not save the favourites index: %s", e)
+
+        if self._on_update:
+            self._on_update(kind, entries)
+
+    def _full_sync(self, kind: str) -> list:
+        with metrics.timer(f"favorites.{kind}.full_sync"):
+            items = {}
+            for obj in self._fetch(kind):
+                entry = _create_entry(kind, obj)
+                items.setdefault(entry.id, entry)
+
+        with self._lock:
+            previous = self._items[kind]
+            added = items.keys() - previous.keys()
+            removed = previous.keys() - items.keys()
+            self._items[kind] = items
+            self._updated_at[kind] = self._full_synced_at[kind] = self._clock()
+
+        logger.debug(
+            "Fully synced favourite %s: %d added, %d removed",
+            kind,
+            len(added),
+            len(removed),
+        )
+        return list(items.values())
+
+    def _delta_sync(self, kind: str) -> list:
+        with self._lock:
+            known = self._items[kind]
+
+        added: Dict[str, object] = {}
+        offset = 0
+        with metrics.timer(f"favorites.{kind}.delta_sync"):
+            while True:
+                page = self._fetch(kind, DELTA_PAGE_SIZE, offset)
+                entries = [_create_entry(kind, obj) for obj in page]
+                new = [e for e in entries if e.id not in known]
+                added.update((e.id, e) for e in new)
+                # Stop at the first known favourite, or at the end of the list
+                if len(new) < len(entries) or len(page) < DELTA_PAGE_SIZE:
+                    break
+                offset += len(page)
+
+        with self._lock:
+            if added:
+                items = dict(added)
+                items.update(
+                    (item_id, entry)
+                    for item_id, entry in self._items[kind].items()
+                    if item_id not in added
+                )
+                self._items[kind] = items
+            self._updated_at[kind] = self._clock()
+
+        metrics.incr(f"favorites.{kind}.added", len(added))
+        logger.debug("Synced favourite %s: %d added", kind, len(added))
+        return list(added.values())
+
+    def _sync_in_background(self, kind: str, full: bool = False):
+        with self._lock:
+            if (kind, full) in self._syncing:
+                return
+            self._syncing.add((kind, full))
+
+        def sync():
+            try:
+                self.sync(kind, full=full)
+            except Exception as e:
+                logger.warning("Could not sync favourite %s: %s", kind, e)
+            finally:
+                with self._lock:
+                    self._syncing.discard((kind, full))
+
+        try:
+            run_in_background("background", sync)
+        except RuntimeError as e:
+            # The backend is stopping
+            logger.debug("Could not sync favourite %s: %s", kind, e)
+            with self._lock:
+                self._syncing.discard((kind, full))
+
+    def get(self, kind: str, sync: bool = False) -> List:
+        """
+        Get the favourites of a kind, newest first.
+
+        :param sync: Whether to (delta) sync the favourites before returning
+            them, rather than returning them straight away and syncing them in
+            the background once they're older than `favorites_refresh_secs`
+        """
+        refresh_secs = self.refresh_secs
+        full_sync_secs = self.full_sync_secs
+        now = self._clock()
+        with self._lock:
+            updated_at = self._updated_at.get(kind)
+            full_synced_at = self._full_synced_at.get(kind)
+
+        if updated_at is None or full_synced_at is None:
+            metrics.incr("favorites.miss")
+            self.sync(kind, full=True)
+        else:
+            metrics.incr("favorites.hit")
+            full_sync_due = not full_sync_secs or now - full_synced_at >= full_sync_secs
+            if sync or not refresh_secs:
+                self.sync(kind)
+            elif now - updated_at >= refresh_secs and not full_sync_due:
+                self._sync_in_background(kind)
+            if full_sync_due:
+                self._sync_in_background(kind, full=True)
+
+        with self._lock:
+            return list(self._items[kind].values())
+
+    def artist_names(self) -> Set[str]:
+        return {a.name for a in self.get("artists")}
+
+    def album_names(self, artists: Optional[Set[str]] = None) -> Set[str]:
+        """
+        Names of the favourite albums or, if `artists` are given, of the
+        favourite albums and of the albums of the favourite tracks by those
+        artists.
+        """
+        albums = self.get("albums")
+        if not artists:
+            return {a.name for a in albums}
+
+        wanted = {a.casefold() for a in artists}
+        return {a.name for a in albums if _matches(a.artists, wanted)} | {
+            t.album
+            for t in self.get("tracks")
+            if t.album and _matches(t.artists, wanted)
+        }
+
+    def track_names(
+        self, artists: Optional[Set[str]] = None, albums: Optional[Set[str]] = None
+    ) -> Set[str]:
+        """
+        Names of the favourite tracks, optionally only those by `artists`
+        and/or from `albums`.
+        """
+        tracks = self.get("tracks")
+        if artists:
+            wanted = {a.casefold() for a in artists}
+            tracks = [t for t in tracks if _matches(t.artists, wanted)]
+        if albums:
+            wanted = {a.casefold() for a in albums}
+            tracks = [t for t in tracks if t.album and _matches([t.album], wanted)]
+        return {t.name for t in tracks}
@@ -1,13 +1,67 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Tuple
 
 from mopidy.models import Album, Artist, Playlist, Track
 
 from mopidy_tidal.helpers import to_timestamp
+from mopidy_tidal.image_index import image_index
 
 logger = logging.getLogger(__name__)
 
+# Max number of artists and of albums whose models are shared
+INTERN_TABLE_SIZE = 2048
+
+
+class ModelTable:
+    """
+    Bounded table of the most recently mapped models, keyed by URI, so that
+    e.g. all the tracks of an album share one `Album` instead of each building
+    (and validating) its own copy.
+
+    :param max_size: Max number of models (0: models are never shared)
+    """
+
+    def __init__(self, max_size: int = INTERN_TABLE_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._models: "OrderedDict[str, Tuple[tuple, object]]" = OrderedDict()
+
+    def intern(self, uri: str, fields: tuple, create: Callable):
+        """
+        The model of `uri`, if one was created from the same `fields`,
+        otherwise a new one returned by `create()`.
+        """
+        with self._lock:
+            entry = self._models.get(uri)
+            if entry and entry[0] == fields:
+                self._models.move_to_end(uri)
+                return entry[1]
+
+        model = create()
+        if self._max_size:
+            with self._lock:
+                self._models.pop(uri, None)
+                self._models[uri] = (fields, model)
+                while len(self._models) > self._max_size:
+                    self._models.popitem(last=False)
+        return model
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+_artists = ModelTable()
+_albums = ModelTable()
+
 
 def _get_release_date(obj):
     d = None
@@ -28,7 +82,10 @@ def create_mopidy_artist(tidal_artist):
     if tidal_artist is None:
         return None
 
-    return Artist(uri="tidal:artist:" + str(tidal_artist.id), name=tidal_artist.name)
+    image_index.add("artist", tidal_artist)
+    uri = "tidal:artist:" + str(tidal_artist.id)
+    name = tidal_artist.name
+    return _artists.intern(uri, (name,), lambda: Artist(uri=uri, name=name))
 
 
 def create_mopidy_albums(tidal_albums):
@@ -39,11 +96,14 @@ def create_mopidy_album(tidal_album, artist):
     if artist is None:
         artist = create_mopidy_artist(tidal_album.artist)
 
-    return Album(
-        uri="tidal:album:" + str(tidal_album.id),
-        name=tidal_album.name,
-        artists=[artist],
-        date=_get_release_date(tidal_album),
+    image_index.add("album", tidal_album)
+    uri = "tidal:album:" + str(tidal_album.id)
+    name = tidal_album.name
+    date = _get_release_date(tidal_album)
+    return _albums.intern(
+        uri,
+        (name, artist, date),
+        lambda: Album(uri=uri, name=name, artists=[artist], date=date),
     )
 
 
@@ -75,6 +135,7 @@ def create_mopidy_track(artist, album, tidal_track):
 
 
 def create_mopidy_playlist(tidal_playlist, tidal_tracks):
+    image_index.add("playlist", tidal_playlist)
     return Playlist(
         uri=f"tidal:playlist:{tidal_playlist.id}",
         name=tidal_playlist.name,
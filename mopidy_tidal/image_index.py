@@ -0,0 +1,118 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from mopidy.models import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL = "https://resources.tidal.com/images/{}/{}x{}.jpg"
+# Max number of objects whose image identifiers are kept
+IMAGE_INDEX_SIZE = 65536
+
+# Sizes (width and height) of the square images of each type of object, as
+# provided by TIDAL, largest first
+IMAGE_SIZES = {
+    "album": (1280, 640, 320, 160, 80),
+    "artist": (750, 480, 320, 160),
+    "playlist": (1080, 750, 640, 480, 320, 160),
+    "mix": (1500, 640, 320),
+}
+# Sizes of the wide pictures of the playlists that have no square one
+WIDE_PLAYLIST_SIZES = ((1080, 720), (750, 500), (480, 320), (160, 107))
+
+# Attribute holding the image identifier of each type of indexed object
+_IMAGE_ATTRS = {
+    "album": "cover",
+    "artist": "picture",
+    "playlist": "square_picture",
+}
+
+
+def create_images(item_type: str, image_id: str) -> List[Image]:
+    """
+    Images of all the sizes of an album cover, or of an artist or playlist
+    (square) picture.
+    """
+    path = image_id.replace("-", "/")
+    return [
+        Image(uri=IMAGE_URL.format(path, size, size), width=size, height=size)
+        for size in IMAGE_SIZES[item_type]
+    ]
+
+
+def _pack(image_id) -> Optional[bytes]:
+    if not isinstance(image_id, str):
+        return None
+    try:
+        return uuid.UUID(image_id).bytes
+    except ValueError:
+        return None
+
+
+class ImageIndex:
+    """
+    Side index of the image identifiers (album covers, artist and playlist
+    pictures) of the TIDAL objects that the backend has mapped, keyed by URI.
+
+    It lets the image URLs of those objects be built without fetching them
+    again from the API. Identifiers are UUIDs, stored as 16 bytes each.
+
+    :param max_size: Max number of indexed objects (the oldest ones are
+        dropped first)
+    """
+
+    def __init__(self, max_size: int = IMAGE_INDEX_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._ids: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def add(self, item_type: str, tidal_obj):
+        """
+        Index the image identifier of a `tidalapi` album, artist or playlist,
+        if it has one.
+        """
+        if tidal_obj is None or item_type not in _IMAGE_ATTRS:
+            return
+
+        image_id = _pack(getattr(tidal_obj, _IMAGE_ATTRS[item_type], None))
+        item_id = getattr(tidal_obj, "id", None)
+        if image_id is None or not isinstance(item_id, (int, str)):
+            return
+
+        uri = f"tidal:{item_type}:{item_id}"
+        with self._lock:
+            self._ids[uri] = image_id
+            if len(self._ids) > self._max_size:
+                self._ids.popitem(last=False)
+
+    def get_images(self, uri: str) -> Optional[List[Image]]:
+        """
+        Images of an album, artist or playlist URI, or `None` if the object
+        was never indexed.
+        """
+        item_type = uri.split(":")[1] if uri.count(":") == 2 else None
+        if item_type not in _IMAGE_ATTRS:
+            return None
+
+        with self._lock:
+            image_id = self._ids.get(uri)
+        if image_id is None:
+            return None
+
+        return create_images(item_type, str(uuid.UUID(bytes=image_id)))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+image_index = ImageIndex()
@@ -0,0 +1,282 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import suppress
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+
+import requests
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.web_auth_server import start_http_daemon
+from mopidy_tidal.workers import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PROXY_DIR = "image_proxy"
+DEFAULT_IMAGE_PROXY_PORT = 8990
+DEFAULT_IMAGE_PROXY_CACHE_MB = 256
+TIDAL_IMAGE_URL = "https://resources.tidal.com/images/"
+# Path of a proxied image: /images/<image id, split on dashes>/<w>x<h>.jpg
+_IMAGE_PATH = re.compile(r"^/images/((?:[0-9a-f]+/){4}[0-9a-f]+)/(\d+)x(\d+)\.jpg$")
+
+
+def get_image_proxy() -> bool:
+    return context.get_config()[Extension.ext_name].get("image_proxy") is True
+
+
+def get_image_proxy_port() -> int:
+    port = context.get_config()[Extension.ext_name].get("image_proxy_port")
+    return port if isinstance(port, int) else DEFAULT_IMAGE_PROXY_PORT
+
+
+def get_image_proxy_hostname() -> str:
+    hostname = context.get_config()[Extension.ext_name].get("image_proxy_hostname")
+    return hostname if isinstance(hostname, str) else socket.gethostname()
+
+
+def get_image_proxy_cache_bytes() -> int:
+    size = context.get_config()[Extension.ext_name].get("image_proxy_cache_mb")
+    size = size if isinstance(size, int) else DEFAULT_IMAGE_PROXY_CACHE_MB
+    return size * 1024 * 1024
+
+
+def _fetch_remote(url: str) -> Optional[bytes]:
+    response = requests.get(url, timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.content
+
+
+class ImageFileCache:
+    """
+    Disk cache of image files, which evicts the least recently used ones
+    once their total size exceeds `max_bytes`.
+
+    :param directory: Directory of the cached files
+    :param max_bytes: Max total size of the cached files
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Size of each cached file, least recently used first
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self._directory.iterdir():
+            if path.suffix != ".jpg":
+                continue
+            with suppress(OSError):
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+
+        with self._lock:
+            for _, name, size in sorted(files):
+                self._files[name] = size
+                self._size += size
+            self._evict()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._size
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+
+        path = self._directory / name
+        try:
+            data = path.read_bytes()
+            # The modification time records the last use across restarts
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._size -= self._files.pop(name, 0)
+            return None
+        return data
+
+    def put(self, name: str, data: bytes):
+        if len(data) > self._max_bytes:
+            return
+
+        fd, tmp_file = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_file, self._directory / name)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+        with self._lock:
+            self._size += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self._max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self._size -= size
+            with suppress(OSError):
+                os.unlink(self._directory / name)
+            metrics.incr("image_proxy.evicted")
+
+
+class ImageProxy:
+    """
+    Local HTTP proxy of the TIDAL images, so that clients on the network
+    don't all download the same images from TIDAL. Images are cached on disk
+    (up to `image_proxy_cache_mb` MB) and served in any size that TIDAL
+    provides, as requested in the URL path.
+
+    The server is started the first time an image URL is proxied.
+
+    :param port: Port of the HTTP server (0: any free port)
+    :param hostname: Host name of the proxy in the image URLs
+    :param cache: Cache of the image files (default: `image_proxy` in the
+        cache directory)
+    :param fetch: Callable that downloads an image URL, returning `None` if
+        it doesn't exist
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        hostname: Optional[str] = None,
+        cache: Optional[ImageFileCache] = None,
+        fetch: Callable[[str], Optional[bytes]] = _fetch_remote,
+    ):
+        self._port = get_image_proxy_port() if port is None else port
+        self._hostname = hostname or get_image_proxy_hostname()
+        self._cache = cache or ImageFileCache(
+            Path(Extension.get_cache_dir(context.get_config())) / IMAGE_PROXY_DIR,
+            get_image_proxy_cache_bytes(),
+        )
+        self._fetch = fetch
+        self._fetches = SingleFlight("image_proxy")
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._failed = False
+
+    @property
+    def url(self) -> Optional[str]:
+        """Base URL of the proxy, or `None` if it isn't running."""
+        if not self._server:
+            return None
+        return f"http://{self._hostname}:{self._server.server_address[1]}"
+
+    def start(self) -> bool:
+        with self._lock:
+            if not (self._server or self._failed):
+                try:
+                    self._server = start_http_daemon(
+                        "TidalImageProxy",
+                        self._port,
+                        partial(ImageProxyHandler, self),
+                        ThreadingHTTPServer,
+                    )
+                    logger.info("Image proxy listening on port %s", self._port)
+                except OSError as e:
+                    # Images are served from TIDAL instead
+                    logger.warning("Could not start the image proxy: %s", e)
+                    self._failed = True
+            return self._server is not None
+
+    def stop(self):
+        with self._lock:
+            server, self._server = self._server, None
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    def proxy_url(self, url: str) -> str:
+        """
+        URL of a TIDAL image on the proxy (other URLs are returned as is).
+        """
+        if not url.startswith(TIDAL_IMAGE_URL) or not self.start():
+            return url
+        return f"{self.url}/images/{url[len(TIDAL_IMAGE_URL):]}"
+
+    def get_image(self, path: str) -> Optional[bytes]:
+        """
+        Content of the image at a proxy path, or `None` if the path isn't a
+        TIDAL image or the image doesn't exist.
+        """
+        match = _IMAGE_PATH.match(path)
+        if not match:
+            return None
+
+        image_path, width, height = match.groups()
+        name = "{}_{}x{}.jpg".format(image_path.replace("/", ""), width, height)
+        data = self._cache.get(name)
+        if data is not None:
+            metrics.incr("image_proxy.hit")
+            return data
+
+        metrics.incr("image_proxy.miss")
+        # Concurrent requests for the same image share the download
+        return self._fetches(name, self._download, name, path[len("/images/") :])
+
+    def _download(self, name: str, image_path: str) -> Optional[bytes]:
+        data = self._fetch(TIDAL_IMAGE_URL + image_path)
+        if data is not None:
+            try:
+                self._cache.put(name, data)
+            except OSError as e:
+                logger.warning("Could not cache image %s: %s", name, e)
+        return data
+
+
+class ImageProxyHandler(BaseHTTPRequestHandler):
+    # Don't delay the body until the headers are acknowledged
+    disable_nagle_algorithm = True
+
+    def __init__(self, proxy: ImageProxy, *args, **kwargs):
+        self.proxy = proxy
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        try:
+            data = self.proxy.get_image(self.path)
+        except requests.RequestException as e:
+            logger.warning("Could not download image %s: %s", self.path, e)
+            self.send_error(502)
+            return
+
+        if data is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        # Images are identified by their content, so they never change
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("Image proxy: " + format, *args)
@@ -1,32 +1,82 @@
 from __future__ import unicode_literals
 
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from contextlib import suppress
-from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Union
+from functools import partial
+from itertools import chain
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, Union
 
 from mopidy import backend, models
 from mopidy.models import Image, Ref, SearchResult, Track
 from requests.exceptions import HTTPError
-from tidalapi.exceptions import ObjectNotFound, TooManyRequests
-
-from mopidy_tidal import full_models_mappers, ref_models_mappers
+from tidalapi.exceptions import ObjectNotFound, TidalAPIError, TooManyRequests
+from tidalapi.types import AlbumOrder, ArtistOrder, ItemOrder, OrderDirection
+
+from mopidy_tidal import Extension, context, full_models_mappers, ref_models_mappers
+from mopidy_tidal.favorites import FavoritesIndex
+from mopidy_tidal.image_index import IMAGE_SIZES, WIDE_PLAYLIST_SIZES, image_index
+from mopidy_tidal.image_proxy import ImageProxy, get_image_proxy
+from mopidy_tidal.local_search import create_local_search_index
 from mopidy_tidal.login_hack import login_hack
-from mopidy_tidal.lru_cache import LruCache
-from mopidy_tidal.playlists import PlaylistMetadataCache
-from mopidy_tidal.utils import apply_watermark
-from mopidy_tidal.workers import get_items
+from mopidy_tidal.lru_cache import LruCache, remove_cache
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.page_cache import PageCache
+from mopidy_tidal.playlists import PlaylistCache
+from mopidy_tidal.utils import apply_watermark, remove_watermark
+from mopidy_tidal.workers import (
+    SingleFlight,
+    get_items,
+    get_num_tracks,
+    run_in_background,
+    worker_pool,
+)
 
 if TYPE_CHECKING:  # pragma: no cover
     from mopidy_tidal.backend import TidalBackend
 
 logger = logging.getLogger(__name__)
 
+# Max number of URIs whose images are kept in memory
+IMAGE_CACHE_SIZE = 4096
+# Former image cache, whose entries only have a single size
+LEGACY_IMAGE_CACHE = "image"
+
+# Discographies older than this (in seconds) are fetched again in the
+# background, while the cached album names are still returned
+DISCOGRAPHY_TTL = 86400
+
+# Order of the favourites: newest first
+FAVORITES_ORDER = {
+    "artists": ArtistOrder.DateAdded,
+    "albums": AlbumOrder.DateAdded,
+    "tracks": ItemOrder.Date,
+}
+
+
+def get_browse_artist_eps() -> bool:
+    return context.get_config()[Extension.ext_name].get("browse_artist_eps") is True
+
 
 class ImagesGetter:
-    def __init__(self, session):
-        self._session = session
-        self._image_cache = LruCache(directory="image")
+    """
+    Resolve the images of TIDAL URIs, caching them in memory (up to
+    `max_size` URIs) and on disk.
+
+    :param get_session: Callable that returns the current TIDAL session
+    :param max_size: Max number of URIs whose images are kept in memory
+    """
+
+    def __init__(self, get_session: Callable, max_size: int = IMAGE_CACHE_SIZE):
+        self._get_session = get_session
+        # Images cached before all their sizes were listed aren't reused
+        remove_cache(LEGACY_IMAGE_CACHE)
+        self._image_cache = LruCache(max_size=max_size, directory="images")
+
+    @property
+    def _session(self):
+        return self._get_session()
 
     @staticmethod
     def _log_image_not_found(obj):
@@ -37,39 +87,61 @@ class ImagesGetter:
         )
 
     @classmethod
-    def _get_image_uri(cls, obj):
-        method = None
-
-        if hasattr(obj, "image"):
-            if hasattr(obj, "picture") and getattr(obj, "picture", None) is not None:
-                method = obj.image
-            elif (
-                hasattr(obj, "square_picture")
-                and getattr(obj, "square_picture", None) is not None
-            ):
-                method = obj.image
-            elif hasattr(obj, "cover") and getattr(obj, "cover", None) is not None:
-                method = obj.image
-            elif hasattr(obj, "images") and getattr(obj, "images", None) is not None:
-                # Mix types contain images type with three small/medium/large image sizes
-                method = obj.image
-            else:
-                # Handle artists/albums/playlists/mixes with missing images
-                cls._log_image_not_found(obj)
-                return
-        else:
+    def _get_item_images(cls, item_type: str, obj) -> List[Image]:
+        """
+        Images of all the sizes that TIDAL provides for an object, as listed in
+        the size table of its type.
+        """
+        if not hasattr(obj, "image"):
             cls._log_image_not_found(obj)
-            return
+            return []
 
-        dimensions = (750, 640, 480)
-        for dim in dimensions:
-            args = (dim,)
-            try:
-                return method(*args)
-            except ValueError:
-                pass
+        # Playlists without a square picture only have a wide one
+        wide = (
+            item_type == "playlist"
+            and getattr(obj, "square_picture", None) is None
+            and getattr(obj, "picture", None) is not None
+        )
+        if all(
+            getattr(obj, attr, None) is None
+            # Mix types contain images type with three small/medium/large image sizes
+            for attr in ("picture", "square_picture", "cover", "images")
+        ):
+            # Handle artists/albums/playlists/mixes with missing images
+            cls._log_image_not_found(obj)
+            return []
 
-        cls._log_image_not_found(obj)
+        if wide:
+            sizes = list(WIDE_PLAYLIST_SIZES)
+        else:
+            sizes = [(size, size) for size in IMAGE_SIZES[item_type]]
+        try:
+            return [
+                Image(
+                    uri=obj.wide_image(width, height) if wide else obj.image(width),
+                    width=width,
+                    height=height,
+                )
+                for width, height in sizes
+            ]
+        except ValueError:
+            cls._log_image_not_found(obj)
+            return []
+
+    @staticmethod
+    def get_image_owner(uri: str) -> Optional[str]:
+        """
+        URI of the object that carries the images of `uri` (i.e. the album for
+        a track, otherwise the object itself), or `None` if it has no images.
+        """
+        parts = uri.split(":")
+        if len(parts) < 3 or parts[0] != "tidal":
+            return None
+        if parts[1] == "track":
+            return f"tidal:album:{parts[3]}" if len(parts) == 5 else None
+        if parts[1] in ("album", "playlist", "artist", "mix"):
+            return ":".join(parts[:3])
+        return None
 
     def _get_api_getter(self, item_type: str):
         return getattr(self._session, item_type, None)
@@ -96,11 +168,21 @@ class ImagesGetter:
             # uri has no image associated to it (eg. tidal:mood tidal:genres etc.)
             return []
 
-        if uri in self._image_cache:
+        in_memory = self._image_cache.in_memory(uri)
+        images = self._image_cache.get(uri)
+        if images is not None:
             # Cache hit
             logger.debug("Cache hit for {}".format(uri))
-            return self._image_cache[uri]
+            metrics.incr("images.hit.memory" if in_memory else "images.hit.disk")
+            return images
 
+        images = image_index.get_images(uri)
+        if images:
+            # The object was already mapped: no need to fetch it again
+            metrics.incr("images.hit.index")
+            return images
+
+        metrics.incr("images.miss")
         logger.debug("Retrieving %r from the API", uri)
         getter = self._get_api_getter(item_type)
         if not getter:
@@ -112,13 +194,13 @@ class ImagesGetter:
             logger.debug("%r is not available on the backend", uri)
             return []
 
-        img_uri = self._get_image_uri(item)
-        if not img_uri:
+        images = self._get_item_images(item_type, item)
+        if not images:
             logger.debug("%r has no associated images", uri)
             return []
 
-        logger.debug("Image URL for %r: %r", uri, img_uri)
-        return [Image(uri=img_uri, width=320, height=320)]
+        logger.debug("Image URLs for %r: %r", uri, [i.uri for i in images])
+        return images
 
     def __call__(self, uri: str) -> Tuple[str, List[Image]]:
         parts = uri.split(":")
@@ -136,7 +218,29 @@ class ImagesGetter:
             return uri, []
 
     def cache_update(self, images):
-        self._image_cache.update(images)
+        # Images served from the cache (memory or disk) are in memory: only
+        # the fetched ones, or the ones built from the index, are stored
+        new_images = {
+            uri: uri_images
+            for uri, uri_images in images.items()
+            if not self._image_cache.in_memory(uri)
+        }
+        if new_images:
+            self._image_cache.update(new_images)
+        metrics.set_gauge("images.cache.size", len(self._image_cache))
+
+    @staticmethod
+    def hit_rate() -> Optional[float]:
+        """
+        Share of the image lookups served without API calls: from the cache
+        (memory or disk) or from the image index.
+        """
+        hits = sum(
+            metrics.counter(f"images.hit.{tier}")
+            for tier in ("memory", "disk", "index")
+        )
+        total = hits + metrics.counter("images.miss")
+        return hits / total if total else None
 
 
 class TidalLibraryProvider(backend.LibraryProvider):
@@ -148,12 +252,34 @@ class TidalLibraryProvider(backend.LibraryProvider):
         self._artist_cache = LruCache()
         self._album_cache = LruCache()
         self._track_cache = LruCache()
-        self._playlist_cache = PlaylistMetadataCache()
+        self._playlist_cache = PlaylistCache()
+        self._lookups = SingleFlight("library.lookup")
+        self._page_cache = PageCache()
+        # TIDAL artist objects, shared by artist browse and lookups
+        self._tidal_artists = LruCache(max_size=256, persist=False)
+        # Album names of artists, by artist URI: `(fetched_at, names)`
+        self._discographies = LruCache(max_size=256, directory="discographies")
+        self._discography_lock = threading.Lock()
+        self._refreshing_discographies: set[str] = set()
+        self._images_getter = ImagesGetter(lambda: self._session)
+        self._image_proxy = ImageProxy() if get_image_proxy() else None
+        self._local_search = create_local_search_index()
+        self._favorites = FavoritesIndex(
+            self._fetch_favorites,
+            on_update=self._index_favorites if self._local_search else None,
+        )
 
     @property
     def _session(self):
         return self.backend.session
 
+    def close(self):
+        """Stop the image proxy and close the local search index."""
+        if self._image_proxy:
+            self._image_proxy.stop()
+        if self._local_search:
+            self._local_search.close()
+
     @staticmethod
     def _convert_tracks(
         tracks: Union[dict, list[dict], list[Track], list[tuple[str, Any | None]]],
@@ -197,42 +323,133 @@ class TidalLibraryProvider(backend.LibraryProvider):
 
         logger.debug("Browsing distinct %s with query %r", field, query)
         session = self._session
+        favorites = self._favorites
 
         if not query:  # library root
             if field in {"artist", "albumartist"}:
-                return {
-                    apply_watermark(a.name) for a in session.user.favorites.artists()
-                }
+                return self._watermark(favorites.artist_names())
             elif field == "album":
-                return {
-                    apply_watermark(a.name) for a in session.user.favorites.albums()
-                }
+                return self._watermark(favorites.album_names())
             elif field in {"track", "track_name"}:
-                return {
-                    apply_watermark(t.name) for t in session.user.favorites.tracks()
-                }
+                return self._watermark(favorites.track_names())
         else:
+            artist_names = self._get_query_values(query, "artist", "albumartist")
             if field == "artist":
-                return {
-                    apply_watermark(a.name) for a in session.user.favorites.artists()
-                }
+                return self._watermark(favorites.artist_names())
             elif field in {"album", "albumartist"}:
+                # The albums of the artist found by a search, along with the
+                # favourite albums of the artist from the index
+                albums = set()
+                if artist_names:
+                    albums.update(favorites.album_names(artists=artist_names))
+
                 artists, _, _ = tidal_search(session, query=query, exact=True)
                 if len(artists) > 0:
                     artist = artists[0]
                     artist_id = artist.uri.split(":")[2]
-                    return {
-                        apply_watermark(a.name)
-                        for a in self._get_artist_albums(session, artist_id)
-                    }
+                    albums.update(self._get_discography(session, artist_id))
+                return self._watermark(albums)
             elif field in {"track", "track_name"}:
-                return {
-                    apply_watermark(t.name) for t in session.user.favorites.tracks()
-                }
+                return self._watermark(
+                    favorites.track_names(
+                        artists=artist_names,
+                        albums=self._get_query_values(query, "album"),
+                    )
+                )
             pass
 
         return set()
 
+    def _get_discography(self, session, artist_id) -> frozenset[str]:
+        """
+        Names of the albums of an artist. Cached discographies are returned
+        straight away, and fetched again in the background once they're older
+        than `DISCOGRAPHY_TTL`.
+        """
+        uri = f"tidal:artist:{artist_id}"
+        entry = self._discographies.get(uri)
+        if entry is None:
+            metrics.incr("library.discography.miss")
+            return self._fetch_discography(session, artist_id)
+
+        fetched_at, names = entry
+        metrics.incr("library.discography.hit")
+        if time.time() - fetched_at >= DISCOGRAPHY_TTL:
+            self._refresh_discography(session, artist_id)
+        return names
+
+    def _fetch_discography(self, session, artist_id) -> frozenset[str]:
+        names = frozenset(
+            a.name for a in self._get_artist_albums(session, artist_id) if a.name
+        )
+        self._discographies[f"tidal:artist:{artist_id}"] = (time.time(), names)
+        return names
+
+    def _refresh_discography(self, session, artist_id):
+        uri = f"tidal:artist:{artist_id}"
+        with self._discography_lock:
+            if uri in self._refreshing_discographies:
+                return
+            self._refreshing_discographies.add(uri)
+
+        def refresh():
+            try:
+                self._fetch_discography(session, artist_id)
+            except Exception as e:
+                logger.warning("Could not refresh the albums of %s: %s", uri, e)
+            finally:
+                with self._discography_lock:
+                    self._refreshing_discographies.discard(uri)
+
+        try:
+            run_in_background("background", refresh)
+        except RuntimeError as e:
+            # The backend is stopping
+            logger.debug("Could not refresh the albums of %s: %s", uri, e)
+            with self._discography_lock:
+                self._refreshing_discographies.discard(uri)
+
+    @staticmethod
+    def _watermark(names) -> set[str]:
+        return {apply_watermark(name) for name in names if name}
+
+    @staticmethod
+    def _get_query_values(query, *fields) -> set[str]:
+        values = set()
+        for field in fields:
+            value = query.get(field) or []
+            if isinstance(value, str):
+                value = [value]
+            values.update(remove_watermark(v) for v in value)
+        return values
+
+    def _fetch_favorites(self, item_type, limit=None, offset=0) -> list:
+        """
+        Favourites of a type, newest first: all of them or, if `limit` is
+        given, a page of them.
+        """
+        session = self._session
+        get_favorites = partial(
+            getattr(session.user.favorites, item_type),
+            order=FAVORITES_ORDER[item_type],
+            order_direction=OrderDirection.Descending,
+        )
+        if limit:
+            items = get_favorites(limit, offset)
+        else:
+            items = get_items(
+                get_favorites, total=self._get_favorites_count(session, item_type)
+            )
+
+        # Favourites aren't mapped to Mopidy models, so their images are
+        # indexed here
+        for item in items:
+            if item_type == "tracks":
+                image_index.add("album", getattr(item, "album", None))
+            else:
+                image_index.add(item_type[:-1], item)
+        return items
+
     @login_hack
     def browse(self, uri) -> list[Ref]:
         logger.info("Browsing uri %s", uri)
@@ -248,33 +465,24 @@ class TidalLibraryProvider(backend.LibraryProvider):
 
         elif uri == "tidal:my_artists":
             return ref_models_mappers.create_artists(
-                get_items(session.user.favorites.artists)
+                self._favorites.get("artists", sync=True)
             )
         elif uri == "tidal:my_albums":
             return ref_models_mappers.create_albums(
-                get_items(session.user.favorites.albums)
+                self._favorites.get("albums", sync=True)
             )
         elif uri == "tidal:my_playlists":
             return self.backend.playlists.as_list()
         elif uri == "tidal:my_mixes":
             return ref_models_mappers.create_mixes(session.user.favorites.mixes())
         elif uri == "tidal:my_tracks":
-            return ref_models_mappers.create_tracks(
-                get_items(session.user.favorites.tracks)
-            )
-        elif uri == "tidal:home":
-            return ref_models_mappers.create_category_directories(uri, session.home())
-        elif uri == "tidal:for_you":
-            return ref_models_mappers.create_category_directories(
-                uri, session.for_you()
-            )
-        elif uri == "tidal:explore":
-            return ref_models_mappers.create_category_directories(
-                uri, session.explore()
-            )
-        elif uri == "tidal:hires":
+            return [
+                Ref.track(uri=t.uri, name=t.name)
+                for t in self._favorites.get("tracks", sync=True)
+            ]
+        elif uri in ("tidal:home", "tidal:for_you", "tidal:explore", "tidal:hires"):
             return ref_models_mappers.create_category_directories(
-                uri, session.hires_page()
+                uri, self._get_page(session, uri.split(":")[1])
             )
         elif uri == "tidal:moods":
             return ref_models_mappers.create_moods(session.moods())
@@ -287,7 +495,9 @@ class TidalLibraryProvider(backend.LibraryProvider):
         # These have 3-part uris
         with suppress(ValueError):
             _, page_id, type, category_id = uri.split(":")
-            category = session.page.get(f"pages/{page_id}").categories[int(category_id)]
+            # Reuse the page which the category was listed from
+            page = self._get_page(session, page_id)
+            category = page.categories[int(category_id)]
             return ref_models_mappers.create_mixed_directory(category.items)
 
         # details with 2-part uris
@@ -300,15 +510,7 @@ class TidalLibraryProvider(backend.LibraryProvider):
                 )
 
             elif type == "artist":
-                top_10_tracks = ref_models_mappers.create_tracks(
-                    self._get_artist_top_tracks(session, id)[:10]
-                )
-
-                albums = ref_models_mappers.create_albums(
-                    self._get_artist_albums(session, id)
-                )
-
-                return albums + top_10_tracks
+                return self._browse_artist(session, id)
 
             elif type == "playlist":
                 return ref_models_mappers.create_tracks(
@@ -331,7 +533,8 @@ class TidalLibraryProvider(backend.LibraryProvider):
                 )
 
             elif type == "page":
-                return ref_models_mappers.create_mixed_directory(session.page.get(id))
+                page = self._page_cache.get(uri, partial(session.page.get, id))
+                return ref_models_mappers.create_mixed_directory(page)
             else:
                 return []
 
@@ -346,6 +549,9 @@ class TidalLibraryProvider(backend.LibraryProvider):
     def search(self, query=None, uris=None, exact=False) -> Optional[SearchResult]:
         from mopidy_tidal.search import tidal_search
 
+        if self._local_search:
+            return self._search_with_local_index(query, exact)
+
         try:
             artists, albums, tracks = tidal_search(
                 self._session, query=query, exact=exact
@@ -355,16 +561,78 @@ class TidalLibraryProvider(backend.LibraryProvider):
             logger.info("EX")
             logger.info("%r", ex)
 
+    def _search_with_local_index(self, query, exact) -> SearchResult:
+        """
+        Search the local index while TIDAL is searched, and return the local
+        results followed by the TIDAL ones (or only the local results if TIDAL
+        can't be searched).
+        """
+        from mopidy_tidal.search import tidal_search
+
+        with worker_pool("api", 1) as pool:
+            remote = pool.submit(tidal_search, self._session, query=query, exact=exact)
+            local = self._local_search.search(query, exact=exact)
+            try:
+                results = remote.result()
+            except Exception as ex:
+                logger.warning("Could not search TIDAL, using local results: %r", ex)
+                results = [], [], []
+            else:
+                self._local_search.add(chain(*results))
+
+        artists, albums, tracks = (
+            list({m.uri: m for m in chain(local_items, remote_items)}.values())
+            for local_items, remote_items in zip(local, results)
+        )
+        return SearchResult(artists=artists, albums=albums, tracks=tracks)
+
+    def _index_favorites(self, kind, entries):
+        self._local_search.add_favorites(entries)
+
     @login_hack
     def get_images(self, uris) -> dict[str, list[Image]]:
         logger.info("Searching Tidal for images for %r" % uris)
-        images_getter = ImagesGetter(self._session)
-
-        with ThreadPoolExecutor(4, thread_name_prefix="mopidy-tidal-images-") as pool:
-            pool_res = pool.map(images_getter, uris)
-
-        images = {uri: item_images for uri, item_images in pool_res if item_images}
-        images_getter.cache_update(images)
+        images_getter = self._images_getter
+        owners = {uri: images_getter.get_image_owner(uri) for uri in uris}
+        # Fetch the images of each object once (e.g. once per album for all
+        # the tracks of an album), then map them back to the requested URIs
+        distinct_owners = list(dict.fromkeys(filter(None, owners.values())))
+
+        with worker_pool("images", 4) as pool:
+            pool_res = pool.map(images_getter, distinct_owners)
+
+        owner_images = {owner: images for owner, images in pool_res if images}
+        images_getter.cache_update(owner_images)
+        images = {
+            uri: owner_images[owner]
+            for uri, owner in owners.items()
+            if owner in owner_images
+        }
+        if self._image_proxy:
+            # Cached images keep the TIDAL URLs, clients get the proxy URLs
+            images = {
+                uri: [
+                    image.replace(uri=self._image_proxy.proxy_url(image.uri))
+                    for image in uri_images
+                ]
+                for uri, uri_images in images.items()
+            }
+
+        metrics.incr("images.requested", len(owners))
+        hit_rate = images_getter.hit_rate()
+        if hit_rate is not None:
+            metrics.set_gauge("images.hit_rate", round(hit_rate, 3))
+        api_calls = metrics.counter("images.miss")
+        if api_calls:
+            metrics.set_gauge(
+                "images.requested_per_api_call",
+                round(metrics.counter("images.requested") / api_calls, 3),
+            )
+        logger.debug(
+            "Resolved the images of %d URIs from %d objects",
+            len(owners),
+            len(distinct_owners),
+        )
         return images
 
     @login_hack
@@ -374,54 +642,89 @@ class TidalLibraryProvider(backend.LibraryProvider):
         if not hasattr(uris, "__iter__"):
             uris = [uris]
 
-        tracks = []
-        cache_updates = {}
+        uris = list(uris or [])
+        session = self._session
+        # Tracks are looked up by album, so that each album is fetched once
+        album_tracks = self._lookup_tracks_by_album(session, uris)
 
-        for uri in uris or []:
-            data = []
-            try:
-                parts = uri.split(":")
-                item_type = parts[1]
-                cache_name = f"_{parts[1]}_cache"
-                cache_miss = True
+        def lookup_uri(uri):
+            return self._lookup_uri(session, uri, album_tracks)
 
-                try:
-                    data = getattr(self, cache_name)[uri]
-                    cache_miss = not bool(data)
-                except (AttributeError, KeyError):
-                    pass
-
-                if cache_miss:
-                    try:
-                        lookup = getattr(self, f"_lookup_{parts[1]}")
-                    except AttributeError:
-                        continue
-
-                    data = cache_data = lookup(self._session, parts)
-                    cache_updates[cache_name] = cache_updates.get(cache_name, {})
-                    if item_type == "playlist":
-                        # Playlists should be persisted on the cache as objects,
-                        # not as lists of tracks. Therefore, _lookup_playlist
-                        # returns a tuple that we need to unpack
-                        data, cache_data = data
-
-                    cache_updates[cache_name][uri] = cache_data
-
-                if item_type == "playlist" and not cache_miss:
-                    tracks += data.tracks
-                else:
-                    tracks += data if hasattr(data, "__iter__") else [data]
-            except HTTPError as err:
-                logger.error("%s when processing URI %r: %s", type(err), uri, err)
+        if len(uris) > 1:
+            # Independent URIs are looked up concurrently
+            with worker_pool("lookup", 4) as pool:
+                results = list(pool.map(lookup_uri, uris))
+        else:
+            results = [lookup_uri(uri) for uri in uris]
+
+        tracks = []
+        cache_updates = {}
+        for uri, (data, cache_update) in zip(uris, results):
+            tracks += data
+            if cache_update:
+                cache_name, cache_data = cache_update
+                cache_updates[cache_name] = cache_updates.get(cache_name, {})
+                cache_updates[cache_name][uri] = cache_data
 
         for cache_name, new_data in cache_updates.items():
             getattr(self, cache_name).update(new_data)
 
         tracks = self._convert_tracks(tracks)
         self._track_cache.update({track.uri: track for track in tracks})
+        if self._local_search and cache_updates:
+            self._local_search.add(tracks)
         logger.info("Returning %d tracks", len(tracks))
         return tracks
 
+    def _lookup_uri(self, session, uri, album_tracks):
+        """
+        Look up a single URI.
+
+        Returns the looked up tracks, and the `(cache_name, data)` to be stored
+        in the cache if they were not cached yet (otherwise `None`).
+        """
+        try:
+            parts = uri.split(":")
+            item_type = parts[1]
+            cache_name = f"_{parts[1]}_cache"
+            cache_miss = True
+            data = []
+
+            try:
+                data = getattr(self, cache_name)[uri]
+                cache_miss = not bool(data)
+            except (AttributeError, KeyError):
+                pass
+
+            if cache_miss and uri in album_tracks:
+                data = cache_data = album_tracks[uri]
+                if data is None:
+                    # The album couldn't be fetched
+                    return [], None
+            elif cache_miss:
+                try:
+                    lookup = getattr(self, f"_lookup_{parts[1]}")
+                except AttributeError:
+                    return [], None
+
+                # A URI repeated in `uris` is looked up once by the lookup pool
+                data = cache_data = self._lookups(uri, lookup, session, parts)
+                if item_type == "playlist":
+                    # Playlists should be persisted on the cache as objects,
+                    # not as lists of tracks. Therefore, _lookup_playlist
+                    # returns a tuple that we need to unpack
+                    data, cache_data = data
+
+            if item_type == "playlist" and not cache_miss:
+                tracks = list(data.tracks)
+            else:
+                tracks = list(data) if hasattr(data, "__iter__") else [data]
+
+            return tracks, (cache_name, cache_data) if cache_miss else None
+        except HTTPError as err:
+            logger.error("%s when processing URI %r: %s", type(err), uri, err)
+            return [], None
+
     @classmethod
     def _get_playlist_tracks(cls, session, playlist_id):
         try:
@@ -430,7 +733,32 @@ class TidalLibraryProvider(backend.LibraryProvider):
             logger.debug("No such playlist: %s", playlist_id)
             return []
         getter_args = tuple()
-        return get_items(pl.tracks, *getter_args)
+        return get_items(pl.tracks, *getter_args, total=get_num_tracks(pl))
+
+    def _get_page(self, session, page_id):
+        fetch = {
+            "home": session.home,
+            "for_you": session.for_you,
+            "explore": session.explore,
+            "hires": session.hires_page,
+        }.get(page_id) or partial(session.page.get, f"pages/{page_id}")
+
+        return self._page_cache.get(f"tidal:{page_id}", fetch)
+
+    @staticmethod
+    def _get_favorites_count(session, item_type) -> Optional[int]:
+        """Number of favourite items of a type, if the API provides it."""
+        get_count = getattr(session.user.favorites, f"get_{item_type}_count", None)
+        if not get_count:
+            return None
+
+        try:
+            count = get_count()
+        except (HTTPError, TidalAPIError) as err:
+            logger.debug("Could not count favourite %s: %s", item_type, err)
+            return None
+
+        return count if isinstance(count, int) else None
 
     @staticmethod
     def _get_genre_items(session, genre_id):
@@ -471,10 +799,38 @@ class TidalLibraryProvider(backend.LibraryProvider):
         # caching purposes
         return pl_tracks, pl
 
-    @staticmethod
-    def _get_artist_albums(session, artist_id):
+    def _get_artist(self, session, artist_id):
+        uri = f"tidal:artist:{artist_id}"
+        artist = self._tidal_artists.get(uri)
+        if artist is None:
+            # Shared with a background refresh of the artist's discography
+            artist = self._lookups(f"{uri}:artist", session.artist, artist_id)
+            self._tidal_artists[uri] = artist
+        return artist
+
+    def _browse_artist(self, session, artist_id):
         try:
-            artist = session.artist(artist_id)
+            artist = self._get_artist(session, artist_id)
+        except ObjectNotFound:
+            logger.debug("No such artist: %s", artist_id)
+            return []
+
+        # Fetch the parts of the artist page concurrently
+        with worker_pool("api", 3) as pool:
+            top_tracks = pool.submit(artist.get_top_tracks)
+            albums = pool.submit(artist.get_albums)
+            ep_singles = (
+                pool.submit(artist.get_ep_singles) if get_browse_artist_eps() else None
+            )
+
+        refs = ref_models_mappers.create_albums(albums.result())
+        if ep_singles:
+            refs += ref_models_mappers.create_albums(ep_singles.result())
+        return refs + ref_models_mappers.create_tracks(top_tracks.result()[:10])
+
+    def _get_artist_albums(self, session, artist_id):
+        try:
+            artist = self._get_artist(session, artist_id)
         except ObjectNotFound:
             logger.debug("No such artist: %s", artist_id)
             return []
@@ -489,6 +845,61 @@ class TidalLibraryProvider(backend.LibraryProvider):
             return []
         return album.tracks()
 
+    def _lookup_tracks_by_album(self, session, uris) -> dict[str, Optional[list]]:
+        """
+        Look up the uncached tracks in the format
+        `tidal:track:<artist_id>:<album_id>:<track_id>` among `uris`, fetching
+        each of their albums only once (and different albums in parallel).
+
+        Returns the looked up tracks by URI (`None` if the album couldn't be
+        fetched).
+        """
+        uris_by_album: dict[str, list[str]] = {}
+        for uri in uris:
+            parts = str(uri).split(":")
+            if len(parts) != 5 or parts[1] != "track" or self._track_cache.get(uri):
+                continue
+            uris_by_album.setdefault(parts[3], []).append(uri)
+
+        if not uris_by_album:
+            return {}
+
+        def fetch_album_tracks(album_id):
+            try:
+                return self._fetch_album_tracks(session, album_id)
+            except HTTPError as err:
+                logger.error(
+                    "%s when fetching tracks of album %r: %s", type(err), album_id, err
+                )
+                return None
+
+        if len(uris_by_album) > 1:
+            with worker_pool("api", 5) as pool:
+                albums_tracks = list(pool.map(fetch_album_tracks, uris_by_album))
+        else:
+            albums_tracks = [fetch_album_tracks(album_id) for album_id in uris_by_album]
+
+        lookups = {}
+        for album_uris, tracks in zip(uris_by_album.values(), albums_tracks):
+            for uri in album_uris:
+                lookups[uri] = (
+                    None
+                    if tracks is None
+                    else self._create_album_track(tracks, uri.split(":")[4])
+                )
+
+        return lookups
+
+    @classmethod
+    def _fetch_album_tracks(cls, session, album_id):
+        try:
+            return cls._get_album_tracks(session, album_id)
+        except ObjectNotFound:
+            logger.warning("No such album: %s", album_id)
+        except TooManyRequests:
+            logger.warning("Too many requests when fetching album: %s", album_id)
+        return []
+
     def _lookup_track(self, session, parts):
         if len(parts) == 3:  # Track in format `tidal:track:<track_id>`
             track_id = parts[2]
@@ -498,15 +909,11 @@ class TidalLibraryProvider(backend.LibraryProvider):
             album_id = parts[3]
             track_id = parts[4]
 
-        try:
-            tracks = self._get_album_tracks(session, album_id)
-        except ObjectNotFound:
-            logger.warning("No such album: %s", album_id)
-            tracks = []
-        except TooManyRequests:
-            logger.warning("Too many requests when fetching album: %s", album_id)
-            tracks = []
+        tracks = self._fetch_album_tracks(session, album_id)
+        return self._create_album_track(tracks, track_id)
 
+    @staticmethod
+    def _create_album_track(tracks, track_id):
         # If album is unavailable, no tracks will be returned
         if tracks:
             track = next((t for t in tracks if t.id == int(track_id)), None)
@@ -528,9 +935,8 @@ class TidalLibraryProvider(backend.LibraryProvider):
 
         return full_models_mappers.create_mopidy_tracks(tracks)
 
-    @staticmethod
-    def _get_artist_top_tracks(session, artist_id):
-        return session.artist(artist_id).get_top_tracks()
+    def _get_artist_top_tracks(self, session, artist_id):
+        return self._get_artist(session, artist_id).get_top_tracks()
 
     def _lookup_artist(self, session, parts):
         artist_id = parts[2]
@@ -0,0 +1,258 @@
+from __future__ import unicode_literals
+
+import logging
+import pickle
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.favorites import FavoriteAlbum, FavoriteArtist, FavoriteTrack
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.utils import remove_watermark
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SEARCH_FILE = "search.sqlite3"
+# Max number of local results of each type (artists, albums, tracks)
+MAX_RESULTS = 50
+
+# Query fields, and the indexed columns that they're matched against
+_QUERY_COLUMNS = {
+    "any": None,
+    "artist": "artist",
+    "albumartist": "artist",
+    "album": "album",
+    "track_name": "title",
+}
+
+
+def get_local_search() -> bool:
+    return context.get_config()[Extension.ext_name].get("local_search") is True
+
+
+def _to_fts_query(query: Mapping) -> Optional[str]:
+    """
+    Translate a Mopidy search query into an FTS5 query, which matches all the
+    words of each value as prefixes (e.g. `{"artist": ["daft"]}` becomes
+    `artist : ("daft"*)`).
+
+    Returns `None` if the query has fields that aren't indexed (e.g. `date`),
+    as leaving them out would match more than what was searched for.
+    """
+    terms = []
+    for field, values in query.items():
+        if field not in _QUERY_COLUMNS:
+            return None
+        if isinstance(values, str):
+            values = [values]
+
+        for value in values:
+            words = remove_watermark(value).split()
+            if not words:
+                continue
+            phrase = " ".join('"{}"*'.format(w.replace('"', '""')) for w in words)
+            column = _QUERY_COLUMNS[field]
+            terms.append(f"{column} : ({phrase})" if column else f"({phrase})")
+
+    return " AND ".join(terms) or None
+
+
+def create_local_search_index() -> Optional["LocalSearchIndex"]:
+    """
+    The local search index, or `None` if local search isn't enabled or the
+    SQLite library doesn't support FTS5.
+    """
+    if not get_local_search():
+        return None
+
+    try:
+        return LocalSearchIndex()
+    except sqlite3.OperationalError as e:
+        logger.warning("Local search is disabled, as SQLite can't index: %s", e)
+        return None
+
+
+def _artist_names(artists) -> str:
+    return " ".join(a.name for a in artists or () if a.name)
+
+
+def _create_row(model) -> Optional[Tuple[str, str, str, str, str]]:
+    """
+    Row of the index of an artist, album or track:
+    `(uri, kind, title, artist, album)`. Only tracks have a title, so that
+    e.g. track names don't match artists.
+    """
+    if isinstance(model, Artist):
+        return model.uri, "artist", "", model.name or "", ""
+    if isinstance(model, Album):
+        artists = _artist_names(model.artists)
+        return model.uri, "album", "", artists, model.name or ""
+    if isinstance(model, Track):
+        album = model.album.name if model.album else ""
+        artists = _artist_names(model.artists)
+        return model.uri, "track", model.name or "", artists, album or ""
+    return None
+
+
+def _create_favorite_model(entry):
+    if isinstance(entry, FavoriteArtist):
+        return Artist(uri=f"tidal:artist:{entry.id}", name=entry.name)
+
+    artists = [Artist(name=name) for name in entry.artists]
+    if isinstance(entry, FavoriteAlbum):
+        return Album(uri=f"tidal:album:{entry.id}", name=entry.name, artists=artists)
+    if isinstance(entry, FavoriteTrack):
+        album = None
+        if entry.album_id:
+            album = Album(uri=f"tidal:album:{entry.album_id}", name=entry.album)
+        return Track(uri=entry.uri, name=entry.name, artists=artists, album=album)
+    return None
+
+
+class LocalSearchIndex:
+    """
+    Full-text index (SQLite FTS5) of the artists, albums and tracks that the
+    backend has come across: looked up tracks, favourites and TIDAL search
+    results. It's stored in the cache directory, so it's available across
+    restarts and when TIDAL can't be reached.
+
+    :param db_file: Path of the database file (default: `search.sqlite3` in
+        the cache directory)
+    :raises sqlite3.OperationalError: If SQLite was built without FTS5
+    """
+
+    def __init__(self, db_file: Optional[Path] = None):
+        self._db_file = db_file or (
+            Path(Extension.get_cache_dir(context.get_config())) / LOCAL_SEARCH_FILE
+        )
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self._db_file), timeout=30, check_same_thread=False
+        )
+        try:
+            self._create_tables()
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Replaced items must be removed from the full-text index as well
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS items (
+                    id INTEGER PRIMARY KEY,
+                    uri TEXT NOT NULL UNIQUE,
+                    kind TEXT NOT NULL,
+                    title TEXT, artist TEXT, album TEXT,
+                    model BLOB
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                    title, artist, album,
+                    content='items', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+                    INSERT INTO items_fts (rowid, title, artist, album)
+                    VALUES (new.id, new.title, new.artist, new.album);
+                END;
+                CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+                    INSERT INTO items_fts (items_fts, rowid, title, artist, album)
+                    VALUES ('delete', old.id, old.title, old.artist, old.album);
+                END;
+                """
+            )
+
+    def add(self, models: Iterable, replace: bool = True):
+        """
+        Index Mopidy artists, albums and tracks.
+
+        :param replace: Whether already indexed items should be replaced
+        """
+        rows = []
+        for model in models:
+            row = _create_row(model)
+            if row and row[0]:
+                rows.append(row + (pickle.dumps(model),))
+
+        if not rows:
+            return
+
+        verb = "REPLACE" if replace else "IGNORE"
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    f"INSERT OR {verb} INTO items "
+                    "(uri, kind, title, artist, album, model) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            logger.warning("Could not update the local search index: %s", e)
+            return
+
+        metrics.incr("local_search.indexed", len(rows))
+
+    def add_favorites(self, entries: Iterable):
+        """
+        Index favourites (see :mod:`mopidy_tidal.favorites`), without replacing
+        the (more complete) items that were indexed from lookups or searches.
+        """
+        self.add(filter(None, map(_create_favorite_model, entries)), replace=False)
+
+    def search(
+        self, query: Mapping, exact: bool = False
+    ) -> Tuple[List[Artist], List[Album], List[Track]]:
+        results: Tuple[list, list, list] = ([], [], [])
+        fts_query = _to_fts_query(query or {})
+        if not fts_query:
+            return results
+
+        with metrics.timer("local_search.search"):
+            with self._lock:
+                try:
+                    rows = self._conn.execute(
+                        "SELECT kind, model FROM items_fts "
+                        "JOIN items ON items.id = items_fts.rowid "
+                        "WHERE items_fts MATCH ? ORDER BY rank",
+                        (fts_query,),
+                    ).fetchall()
+                except sqlite3.OperationalError as e:
+                    logger.debug("Invalid local search query %r: %s", fts_query, e)
+                    return results
+
+        for kind, model in rows:
+            items = results[("artist", "album", "track").index(kind)]
+            if len(items) < MAX_RESULTS:
+                items.append(pickle.loads(model))
+
+        if exact:
+            results = self._get_exact_results(query, results)
+
+        metrics.incr("local_search.results", sum(map(len, results)))
+        return results
+
+    @staticmethod
+    def _get_exact_results(query: Mapping, results):
+        """
+        Only keep the results whose name is one of the queried values.
+        """
+        values = set()
+        for value in query.values():
+            for v in [value] if isinstance(value, str) else value:
+                values.add(remove_watermark(v).casefold())
+
+        return tuple(
+            [item for item in items if (item.name or "").casefold() in values]
+            for items in results
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
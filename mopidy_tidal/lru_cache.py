@@ -1,22 +1,83 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
-import pickle
+import shutil
+import threading
+import time
 from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
 from mopidy_tidal import Extension, context
+from mopidy_tidal.cache_storage import (
+    CacheStorage,
+    FileCacheStorage,
+    SqliteCacheStorage,
+    WriteBehindStorage,
+)
+from mopidy_tidal.utils import remove_watermark
+from mopidy_tidal.workers import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+SQLITE_CACHE_FILE = "cache.sqlite3"
+DEFAULT_SEARCH_CACHE_TTL = 86400
+DEFAULT_SEARCH_CACHE_SIZE = 1024
+
+
+def get_cache_backend() -> str:
+    return context.get_config()[Extension.ext_name].get("cache_backend") or "file"
+
+
+def get_cache_write_behind() -> bool:
+    return context.get_config()[Extension.ext_name].get("cache_write_behind") is True
+
+
+def get_search_cache_ttl() -> int:
+    ttl = context.get_config()[Extension.ext_name].get("search_cache_ttl_secs")
+    return DEFAULT_SEARCH_CACHE_TTL if ttl is None else ttl
+
+
+def get_search_cache_size() -> int:
+    size = context.get_config()[Extension.ext_name].get("search_cache_size")
+    return DEFAULT_SEARCH_CACHE_SIZE if size is None else size
+
+
+def remove_cache(directory: str):
+    """
+    Remove the entries of a cache directory that's no longer used, both from
+    the file tree and from the SQLite database.
+    """
+    cache_root = Path(Extension.get_cache_dir(context.get_config()))
+    cache_dir = cache_root / directory
+    if cache_dir.is_dir():
+        logger.info("Removing the unused cache directory %s", cache_dir)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    db_file = cache_root / SQLITE_CACHE_FILE
+    if db_file.is_file():
+        storage = SqliteCacheStorage(db_file, namespace=directory)
+        try:
+            storage.clear()
+        finally:
+            storage.close()
+
 
 def id_to_cachef(id: str) -> Path:
     return Path(id.replace(":", "-") + ".cache")
 
 
 class LruCache(OrderedDict):
-    def __init__(self, max_size: Optional[int] = 1024, persist=True, directory=""):
+    namespace: Optional[str] = None
+
+    def __init__(
+        self,
+        max_size: Optional[int] = 1024,
+        persist=True,
+        directory="",
+        storage: Optional[CacheStorage] = None,
+    ):
         """
         :param max_size: Max size of the cache in memory. Set 0 or None for no
             limit (default: 1024)
@@ -24,19 +85,42 @@ class LruCache(OrderedDict):
             (default: True)
         :param directory: If `persist=True`, store the cached entries in this
             subfolder of the cache directory (default: '')
+        :param storage: If `persist=True`, use this storage rather than the
+            one selected by the `cache_backend` setting (default: None)
         """
+        # Guards the entries in memory, which are shared by worker threads
+        self._lock = threading.RLock()
         super().__init__(self)
         if max_size:
             assert max_size > 0, f"Invalid cache size: {max_size}"
 
         self._max_size = max_size or 0
-        self._cache_dir = Path(Extension.get_cache_dir(context.get_config()), directory)
+        self._cache_root = Path(Extension.get_cache_dir(context.get_config()))
+        self._cache_dir = self._cache_root / directory
         self._persist = persist
+        self._storage = storage
         if persist:
             self._cache_dir.mkdir(parents=True, exist_ok=True)
+            if not self._storage:
+                self._storage = self._create_storage(directory)
 
         self._check_limit()
 
+    def _create_storage(self, directory: str) -> CacheStorage:
+        storage: CacheStorage
+        if get_cache_backend() == "sqlite":
+            namespace = "/".join(p for p in (directory, self.namespace) if p)
+            storage = SqliteCacheStorage(
+                self._cache_root / SQLITE_CACHE_FILE, namespace=namespace
+            )
+        else:
+            storage = FileCacheStorage(self.cache_file)
+
+        if get_cache_write_behind():
+            storage = WriteBehindStorage(storage)
+
+        return storage
+
     @property
     def max_size(self):
         return self._max_size
@@ -45,12 +129,16 @@ class LruCache(OrderedDict):
     def persist(self):
         return self._persist
 
+    @property
+    def storage(self) -> Optional[CacheStorage]:
+        return self._storage
+
     def cache_file(self, key: str, cache_dir: Optional[Path] = None) -> Path:
         parts = key.split(":")
         assert len(parts) > 2, f"Invalid TIDAL ID: {key}"
         _, obj_type, id, *_ = parts
         if not cache_dir:
-            cache_dir = Path(obj_type)
+            cache_dir = Path(self.namespace or obj_type)
 
         cache_dir = self._cache_dir / cache_dir / id[:2]
         cache_dir.mkdir(parents=True, exist_ok=True)
@@ -62,63 +150,51 @@ class LruCache(OrderedDict):
         return cache_file
 
     def _get_from_storage(self, key):
-        cache_file = self.cache_file(key)
-        err = KeyError(key)
-        if not cache_file.is_file():
-            # Cache miss on the filesystem
-            raise err
-
-        # Cache hit on the filesystem
-        with open(cache_file, "rb") as f:
-            try:
-                value = pickle.load(f)
-            except Exception as e:
-                # If the cache entry on the filesystem is corrupt, reset it
-                logger.warning(
-                    "Could not deserialize cache file %s: " "refreshing the entry: %s",
-                    cache_file,
-                    e,
-                )
-                self._reset_stored_entry(key)
-                raise err
-
-        # Store the filesystem item in memory
+        value = self._storage.get(key)
+
+        # Store the persisted item in memory
         if value is not None:
             self.__setitem__(key, value, _sync_to_fs=False)
-        logger.debug(f"Filesystem cache hit for {key}")
+        logger.debug(f"Persisted cache hit for {key}")
         return value
 
     def __getitem__(self, key, *_, **__):
-        try:
-            # Cache hit in memory
-            return super().__getitem__(key)
-        except KeyError as e:
-            if not self.persist:
-                # No persisted storage -> cache miss
-                raise e
+        with self._lock:
+            try:
+                # Cache hit in memory
+                return super().__getitem__(key)
+            except KeyError as e:
+                if not self.persist:
+                    # No persisted storage -> cache miss
+                    raise e
 
         # Check on the persisted cache
         return self._get_from_storage(key)
 
     def __setitem__(self, key, value, _sync_to_fs=True, *_, **__):
-        if super().__contains__(key):
-            del self[key]
+        with self._lock:
+            if super().__contains__(key):
+                del self[key]
 
-        super().__setitem__(key, value)
-        if self.persist and _sync_to_fs:
-            cache_file = self.cache_file(key)
-            with open(cache_file, "wb") as f:
-                pickle.dump(value, f)
+            super().__setitem__(key, value)
+            self._check_limit()
 
-        self._check_limit()
+        if self.persist and _sync_to_fs:
+            self._storage.set(key, value)
 
     def __contains__(self, key):
         return self.get(key) is not None
 
+    def in_memory(self, key) -> bool:
+        """
+        Whether `key` is cached in memory (i.e. without checking the storage).
+        """
+        with self._lock:
+            return super().__contains__(key)
+
     def _reset_stored_entry(self, key):
-        cache_file = self.cache_file(key)
-        if cache_file.is_file():
-            cache_file.unlink()
+        if self.persist:
+            self._storage.delete(key)
 
     def get(self, key, default=None, *args, **kwargs):
         try:
@@ -134,29 +210,107 @@ class LruCache(OrderedDict):
             logger.debug("Pruning key %r from cache %s", key, self.__class__.__name__)
 
             self._reset_stored_entry(key)
-            self.pop(key, None)
+            with self._lock:
+                self.pop(key, None)
 
     def prune_all(self):
         """
         Prune all the keys in the cache.
         """
-        self.prune(*[*self.keys()])
+        with self._lock:
+            keys = [*self.keys()]
+        self.prune(*keys)
 
     def update(self, *args, **kwargs):
-        super().update(*args, **kwargs)
-        self._check_limit()
+        items = dict(*args, **kwargs)
+        with self._lock:
+            for key, value in items.items():
+                self.__setitem__(key, value, _sync_to_fs=False)
+
+            self._check_limit()
+
+        if self.persist and items:
+            # Persist all the entries at once (in a single transaction, if
+            # supported by the storage)
+            self._storage.set_many(items)
 
     def _check_limit(self):
         if self.max_size:
-            # delete oldest entries
-            while len(self) > self.max_size:
-                self.popitem(last=False)
+            with self._lock:
+                # delete oldest entries
+                while len(self) > self.max_size:
+                    self.popitem(last=False)
 
 
 class SearchCache(LruCache):
+    """
+    Cache of search results, persisted between restarts.
+
+    Results expire `search_cache_ttl_secs` seconds after they were stored (0:
+    never), and at most `search_cache_size` results are kept (0: no limit).
+    """
+
+    index_key = "tidal:search:index"
+
     def __init__(self, search_function):
-        super().__init__(persist=False)
+        super().__init__(max_size=get_search_cache_size(), directory="")
         self._search_function = search_function
+        self._in_flight = SingleFlight("search")
+        # Insertion time of all the persisted results, oldest first
+        self._index: OrderedDict[str, float] = OrderedDict()
+        if self.persist:
+            try:
+                self._index.update(self._storage.get(self.index_key))
+            except KeyError:
+                pass
+
+    @property
+    def ttl(self) -> int:
+        return get_search_cache_ttl()
+
+    def _is_expired(self, key) -> bool:
+        created_at = self._index.get(key)
+        if created_at is None:
+            return True
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def __getitem__(self, key, *args, **kwargs):
+        if self._is_expired(key):
+            if key in self._index:
+                logger.debug("Search cache entry %s expired", key)
+                self.prune(key)
+            raise KeyError(key)
+
+        return super().__getitem__(key, *args, **kwargs)
+
+    def __setitem__(self, key, value, _sync_to_fs=True, *args, **kwargs):
+        super().__setitem__(key, value, _sync_to_fs, *args, **kwargs)
+        if not _sync_to_fs:
+            # Value loaded from the storage
+            return
+
+        with self._lock:
+            self._index.pop(key, None)
+            self._index[key] = time.time()
+            expired_keys = []
+            while self.max_size and len(self._index) > self.max_size:
+                expired_keys.append(self._index.popitem(last=False)[0])
+
+        self.prune(*expired_keys)
+        self._store_index()
+
+    def _store_index(self):
+        if self.persist:
+            with self._lock:
+                index = dict(self._index)
+            self._storage.set(self.index_key, index)
+
+    def prune(self, *keys):
+        super().prune(*keys)
+        with self._lock:
+            pruned = [self._index.pop(key) for key in keys if key in self._index]
+        if pruned:
+            self._store_index()
 
     def __call__(self, *args, **kwargs):
         key = str(SearchKey(**kwargs))
@@ -165,28 +319,45 @@ class SearchCache(LruCache):
             "Search cache miss" if cached_result is None else "Search cache hit"
         )
         if cached_result is None:
-            cached_result = self._search_function(*args, **kwargs)
-            self[key] = cached_result
+            # Identical searches from the actor and the worker pools share a
+            # single upstream search
+            cached_result = self._in_flight(key, self._search, key, *args, **kwargs)
 
         return cached_result
 
+    def _search(self, key, *args, **kwargs):
+        result = self._search_function(*args, **kwargs)
+        self[key] = result
+        return result
+
 
 class SearchKey(object):
     def __init__(self, **kwargs):
         fixed_query = self.fix_query(kwargs["query"])
-        self._query = tuple(sorted(fixed_query.items()))
+        self._query = tuple(
+            sorted((k, self.normalise(v)) for k, v in fixed_query.items())
+        )
         self._exact = kwargs["exact"]
-        self._hash = None
+        self._digest = None
 
-    def __hash__(self):
-        if self._hash is None:
-            self._hash = hash(self._exact)
-            self._hash ^= hash(repr(self._query))
+    @property
+    def digest(self) -> str:
+        """
+        Digest of the normalised query. Unlike `hash()`, this is stable
+        between processes, so it can identify persisted search results.
+        """
+        if self._digest is None:
+            self._digest = hashlib.sha1(
+                repr((self._exact, self._query)).encode()
+            ).hexdigest()
 
-        return self._hash
+        return self._digest
+
+    def __hash__(self):
+        return hash(self.digest)
 
     def __str__(self):
-        return f"tidal:search:{self.__hash__()}"
+        return f"tidal:search:{self.digest}"
 
     def __eq__(self, other):
         if not isinstance(other, SearchKey):
@@ -194,6 +365,18 @@ class SearchKey(object):
 
         return self._exact == other._exact and self._query == other._query
 
+    @classmethod
+    def normalise(cls, value):
+        """
+        Normalise a query value, so that queries which lead to the same search
+        share the same key. Eg: `["Arty [TIDAL]"]` and `[" arty "]`.
+        """
+        if isinstance(value, str):
+            return " ".join(remove_watermark(value).split()).casefold()
+        if isinstance(value, (list, tuple, set)):
+            return tuple(cls.normalise(v) for v in value)
+        return value
+
     @staticmethod
     def fix_query(query):
         """
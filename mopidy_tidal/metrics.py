@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and timings.
+
+    Metrics are identified by dotted names (eg. `cache.write_behind.flush`)
+    and can be inspected with :meth:`snapshot`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, Union[int, float]] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: Union[int, float]):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, secs: float):
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += secs
+            timing["max"] = max(timing["max"], secs)
+            timing["last"] = secs
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> Union[int, float]:
+        with self._lock:
+            return self._gauges.get(name, 0)
+
+    def timing(self, name: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._timings.get(name, {}))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {k: dict(v) for k, v in self._timings.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+    def log(self, level: int = logging.DEBUG):
+        snapshot = self.snapshot()
+        for kind in ("counters", "gauges"):
+            for name, value in sorted(snapshot[kind].items()):
+                logger.log(level, "%s: %s", name, value)
+        for name, timing in sorted(snapshot["timings"].items()):
+            logger.log(
+                level,
+                "%s: count=%d avg=%.3fs max=%.3fs",
+                name,
+                timing["count"],
+                timing["total"] / timing["count"],
+                timing["max"],
+            )
+
+
+metrics = Metrics()
@@ -0,0 +1,120 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Set, Tuple
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.workers import SingleFlight, run_in_background
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_CACHE_TTL = 300
+# Stale pages older than this are not served while they're refreshed
+DEFAULT_PAGE_CACHE_MAX_STALE = 86400
+
+
+def get_page_cache_ttl() -> int:
+    ttl = context.get_config()[Extension.ext_name].get("page_cache_ttl_secs")
+    return DEFAULT_PAGE_CACHE_TTL if ttl is None else ttl
+
+
+class PageCache:
+    """
+    In-memory cache of TIDAL pages (Home, For You, Explore...).
+
+    A cached page is fresh for `page_cache_ttl_secs` seconds (0: pages are not
+    cached). After that, it's still returned while a fresh copy is fetched in
+    the background (stale-while-revalidate), so that only the first visit of a
+    page waits for the API.
+
+    :param max_size: Max number of cached pages (default: 64)
+    :param max_stale: Pages older than this (in seconds) are fetched again
+        before being returned (default: one day)
+    """
+
+    def __init__(
+        self,
+        max_size: int = 64,
+        max_stale: float = DEFAULT_PAGE_CACHE_MAX_STALE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._max_size = max_size
+        self._max_stale = max_stale
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pages: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._fetches = SingleFlight("page_cache")
+
+    @property
+    def ttl(self) -> int:
+        return get_page_cache_ttl()
+
+    def get(self, key: str, fetch: Callable):
+        """
+        Get the page identified by `key`, calling `fetch()` to retrieve it if
+        it isn't cached.
+        """
+        ttl = self.ttl
+        if not ttl:
+            return fetch()
+
+        with self._lock:
+            entry = self._pages.get(key)
+
+        if entry:
+            fetched_at, page = entry
+            age = self._clock() - fetched_at
+            if age < ttl:
+                metrics.incr("page_cache.hit")
+                return page
+            if age < self._max_stale:
+                metrics.incr("page_cache.stale")
+                self._refresh_in_background(key, fetch)
+                return page
+
+        metrics.incr("page_cache.miss")
+        # Concurrent requests for the same page share the API call
+        return self._fetches(key, self._fetch, key, fetch)
+
+    def _fetch(self, key: str, fetch: Callable):
+        page = fetch()
+        with self._lock:
+            self._pages.pop(key, None)
+            self._pages[key] = (self._clock(), page)
+            while len(self._pages) > self._max_size:
+                self._pages.popitem(last=False)
+
+        return page
+
+    def _refresh_in_background(self, key: str, fetch: Callable):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetches(key, self._fetch, key, fetch)
+                logger.debug("Refreshed page %s", key)
+            except Exception as e:
+                logger.warning("Could not refresh page %s: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            run_in_background("background", refresh)
+        except RuntimeError as e:
+            # The backend is stopping
+            logger.debug("Could not refresh page %s: %s", key, e)
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
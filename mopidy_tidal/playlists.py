@@ -3,10 +3,12 @@ from __future__ import unicode_literals
 import difflib
 import logging
 import operator
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
-from threading import Event, Timer
-from typing import TYPE_CHECKING, Collection, List, Optional, Tuple, Union
+import time
+import weakref
+from array import array
+from concurrent.futures import as_completed
+from threading import Event, Lock, Timer
+from typing import TYPE_CHECKING, Collection, List, NamedTuple, Optional, Tuple, Union
 
 from mopidy import backend
 from mopidy.models import Playlist as MopidyPlaylist
@@ -19,23 +21,87 @@ from mopidy_tidal.full_models_mappers import create_mopidy_playlist
 from mopidy_tidal.helpers import to_timestamp
 from mopidy_tidal.login_hack import login_hack
 from mopidy_tidal.lru_cache import LruCache
-from mopidy_tidal.utils import mock_track
-from mopidy_tidal.workers import get_items
+from mopidy_tidal.track_store import get_track_store
+from mopidy_tidal.workers import (
+    get_items,
+    get_num_tracks,
+    run_in_background,
+    worker_pool,
+)
 
 if TYPE_CHECKING:  # pragma: no cover
     from mopidy_tidal.backend import TidalBackend
 
 logger = logging.getLogger(__name__)
 
+# Default validity (in seconds) of the last update times of the listed
+# playlists, used to tell if cached playlists have changed
+DEFAULT_PLAYLIST_CHANGES_TTL = 60
+
+
+class CompactPlaylist(NamedTuple):
+    """
+    Cached playlist, whose tracks are stored as IDs in a
+    :class:`~mopidy_tidal.track_store.TrackStore`.
+    """
+
+    uri: str
+    name: Optional[str]
+    last_modified: Optional[int]
+    track_ids: array
+
+
+class PlaylistMetadata(NamedTuple):
+    """
+    Metadata of a playlist, as listed by :meth:`TidalPlaylistsProvider.as_list`,
+    without its tracks.
+    """
+
+    uri: str
+    name: Optional[str]
+    num_tracks: Optional[int]
+    last_modified: Optional[int]
+    # Total duration of the tracks, in seconds
+    duration: Optional[int]
+
+    @classmethod
+    def from_tidal(cls, tidal_playlist: TidalPlaylist) -> "PlaylistMetadata":
+        duration = getattr(tidal_playlist, "duration", None)
+        return cls(
+            uri=f"tidal:playlist:{tidal_playlist.id}",
+            name=tidal_playlist.name,
+            num_tracks=get_num_tracks(tidal_playlist),
+            last_modified=to_timestamp(tidal_playlist.last_updated),
+            duration=duration if isinstance(duration, int) else None,
+        )
+
 
 class PlaylistCache(LruCache):
-    def __getitem__(
-        self, key: Union[str, TidalPlaylist], *args, **kwargs
-    ) -> MopidyPlaylist:
+    """
+    Cache of playlists. Unless `compact` is false, the playlists are stored
+    as :class:`CompactPlaylist` entries, which only hold the IDs of their
+    tracks, and their tracks are kept in a track store shared by all the
+    playlists. The Mopidy playlists are built back when they're accessed.
+    """
+
+    compact = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracks = get_track_store(self.persist) if self.compact else None
+        # Playlists built from compact entries that are still in use. Mopidy
+        # interns its models, and building a playlist equal to a live one
+        # compares all their tracks: reuse the live one instead.
+        self._built = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _get_uri(key: Union[str, TidalPlaylist]) -> str:
         uri = key.id if isinstance(key, TidalPlaylist) else key
         assert uri
-        uri = f"tidal:playlist:{uri}" if not uri.startswith("tidal:playlist:") else uri
+        return f"tidal:playlist:{uri}" if not uri.startswith("tidal:playlist:") else uri
 
+    def _get_entry(self, key: Union[str, TidalPlaylist], *args, **kwargs):
+        uri = self._get_uri(key)
         playlist = super().__getitem__(uri, *args, **kwargs)
         if (
             playlist
@@ -50,10 +116,93 @@ class PlaylistCache(LruCache):
 
         return playlist
 
+    def _get_tracks(self, playlist: CompactPlaylist) -> List[Track]:
+        try:
+            return self._tracks.get_tracks(playlist.track_ids)
+        except KeyError:
+            # Some tracks are missing from the store: drop the entry, so that
+            # the playlist is fetched again
+            logger.debug("Tracks of %s not found in the track store", playlist.uri)
+            self.prune(playlist.uri)
+            raise KeyError(playlist.uri)
+
+    def __getitem__(
+        self, key: Union[str, TidalPlaylist], *args, **kwargs
+    ) -> MopidyPlaylist:
+        playlist = self._get_entry(key, *args, **kwargs)
+        if not isinstance(playlist, CompactPlaylist):
+            return playlist
+
+        built_key = (
+            playlist.uri,
+            playlist.name,
+            playlist.last_modified,
+            playlist.track_ids.tobytes(),
+        )
+        built = self._built.get(built_key)
+        if built is not None:
+            return built
+
+        built = MopidyPlaylist(
+            uri=playlist.uri,
+            name=playlist.name,
+            tracks=self._get_tracks(playlist),
+            last_modified=playlist.last_modified,
+        )
+        self._built[built_key] = built
+        return built
+
+    def __contains__(self, key):
+        # Checking an entry requires its tracks, but not building the playlist
+        try:
+            playlist = self._get_entry(key)
+            if isinstance(playlist, CompactPlaylist):
+                self._get_tracks(playlist)
+            return playlist is not None
+        except KeyError:
+            return False
+
+    def _compact(self, key, value):
+        if self._tracks is None or not isinstance(value, MopidyPlaylist):
+            return value
+
+        track_ids = self._tracks.add(key, value.tracks)
+        if track_ids is None:
+            # Tracks without numeric IDs are stored within the playlist
+            return value
+
+        return CompactPlaylist(value.uri, value.name, value.last_modified, track_ids)
+
+    def __setitem__(self, key, value, _sync_to_fs=True, *args, **kwargs):
+        if self._tracks is not None and isinstance(value, MopidyPlaylist):
+            value = self._compact(key, value)
+        super().__setitem__(key, value, _sync_to_fs, *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        if self._tracks is not None:
+            # The tracks are stored before the playlists that refer to them
+            items = {key: self._compact(key, value) for key, value in items.items()}
+        super().update(items)
+
+    def prune(self, *keys):
+        if self._tracks is not None:
+            self._tracks.remove(*keys)
+        super().prune(*keys)
+
+    def popitem(self, last=True):
+        key, value = super().popitem(last=last)
+        if self._tracks is not None and not self.persist:
+            # Persisted playlists are only evicted from memory
+            self._tracks.remove(key)
+        return key, value
+
 
 class PlaylistMetadataCache(PlaylistCache):
-    def cache_file(self, key: str) -> Path:
-        return super().cache_file(key, Path("playlist_metadata"))
+    """Cache of the :class:`PlaylistMetadata` of the user's playlists."""
+
+    namespace = "playlist_metadata"
+    compact = False
 
 
 class TidalPlaylistsProvider(backend.PlaylistsProvider):
@@ -64,34 +213,18 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
         self._playlists_metadata = PlaylistMetadataCache()
         self._playlists = PlaylistCache()
         self._current_tidal_playlists = []
+        # Last update times of the listed playlists, by URI
+        self._last_updated = {}
+        self._listed_at: Optional[float] = None
+        self._listing_lock = Lock()
+        self._listing = False
         self._playlists_loaded_event = Event()
 
     def _calculate_added_and_removed_playlist_ids(
         self,
     ) -> Tuple[Collection[str], Collection[str]]:
         logger.info("Calculating playlist updates..")
-        session = self.backend.session
-        updated_playlists = []
-
-        with ThreadPoolExecutor(
-            2, thread_name_prefix="mopidy-tidal-playlists-refresh-"
-        ) as pool:
-            pool_res = pool.map(
-                lambda func: (
-                    get_items(func)
-                    if func == session.user.favorites.playlists
-                    else func()
-                ),
-                [
-                    session.user.favorites.playlists,
-                    session.user.playlists,
-                ],
-            )
-
-            for playlists in pool_res:
-                updated_playlists += playlists
-
-        self._current_tidal_playlists = updated_playlists
+        updated_playlists = self._list_playlists()
         updated_ids = set(pl.id for pl in updated_playlists)
         if not self._playlists_metadata:
             return updated_ids, set()
@@ -109,14 +242,85 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
 
         return added_ids, removed_ids
 
+    def _list_playlists(self) -> list:
+        """
+        List the user's playlists (favourite and own ones), and keep their
+        last update times.
+        """
+        session = self.backend.session
+        playlists = []
+
+        with worker_pool("api", 1) as pool:
+            # Fetch the user's playlists while paging through the favourites
+            # (paging uses the same pool: don't nest it inside a pool task)
+            user_playlists = pool.submit(session.user.playlists)
+            playlists += get_items(session.user.favorites.playlists)
+            playlists += user_playlists.result()
+
+        self._current_tidal_playlists = playlists
+        self._last_updated = {
+            f"tidal:playlist:{pl.id}": getattr(pl, "last_updated", None)
+            for pl in playlists
+        }
+        self._listed_at = time.monotonic()
+        return playlists
+
+    def _list_playlists_in_background(self):
+        with self._listing_lock:
+            if self._listing:
+                return
+            self._listing = True
+
+        def list_playlists():
+            try:
+                self._list_playlists()
+            except Exception as e:
+                logger.warning("Could not list the playlists: %s", e)
+            finally:
+                with self._listing_lock:
+                    self._listing = False
+
+        try:
+            run_in_background("background", list_playlists)
+        except RuntimeError as e:
+            # The backend is stopping
+            logger.debug("Could not list the playlists: %s", e)
+            with self._listing_lock:
+                self._listing = False
+
+    def _get_last_updated(self) -> Optional[dict]:
+        """
+        Last update times of the user's playlists, by URI, as returned by the
+        last listing (`None` if `playlist_changes_ttl_secs` is 0, or if the
+        playlists haven't been listed yet). If the last listing is older than
+        `playlist_changes_ttl_secs`, it's still returned while the playlists
+        are listed again in the background.
+        """
+        ttl = self.backend._config["tidal"].get("playlist_changes_ttl_secs")
+        if ttl is None:
+            ttl = DEFAULT_PLAYLIST_CHANGES_TTL
+        if not ttl:
+            return None
+
+        listed_at = self._listed_at
+        if listed_at is None or time.monotonic() - listed_at > ttl:
+            self._list_playlists_in_background()
+        return None if listed_at is None else self._last_updated
+
     def _has_changes(self, playlist: MopidyPlaylist):
-        upstream_playlist = self.backend.session.playlist(playlist.uri.split(":")[-1])
-        if not upstream_playlist:
-            return True
+        last_updated = self._get_last_updated()
+        if last_updated is not None and playlist.uri in last_updated:
+            upstream_last_updated = last_updated[playlist.uri]
+        else:
+            # Not one of the user's playlists: check the playlist itself
+            upstream_playlist = self.backend.session.playlist(
+                playlist.uri.split(":")[-1]
+            )
+            if not upstream_playlist:
+                return True
+            upstream_last_updated = getattr(upstream_playlist, "last_updated", None)
 
-        upstream_last_updated_at = to_timestamp(
-            getattr(upstream_playlist, "last_updated", None)
-        )
+        upstream_last_updated_at = to_timestamp(upstream_last_updated)
         local_last_updated_at = to_timestamp(playlist.last_modified)
 
         if not upstream_last_updated_at:
@@ -212,9 +416,11 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
 
         session = self.backend.session
         plists = self._current_tidal_playlists
-        mapped_playlists = {}
+        mapped_playlists: dict[str, Union[MopidyPlaylist, PlaylistMetadata]] = {}
         playlist_cache = self._playlists if include_items else self._playlists_metadata
 
+        missing_playlists = []
+
         for pl in plists:
             uri = "tidal:playlist:" + pl.id
             # Skip or cache hit case
@@ -223,20 +429,14 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
 
             # Cache miss case
             if include_items:
-                pl_tracks = self._retrieve_api_tracks(session, pl)
-                tracks = full_models_mappers.create_mopidy_tracks(pl_tracks)
+                missing_playlists.append(pl)
             else:
-                # Create as many mock tracks as the number of items in the playlist.
-                # Playlist metadata is concerned only with the number of tracks, not
-                # the actual list.
-                tracks = [mock_track] * pl.num_tracks
-
-            mapped_playlists[uri] = MopidyPlaylist(
-                uri=uri,
-                name=pl.name,
-                tracks=tracks,
-                last_modified=to_timestamp(pl.last_updated),
-            )
+                # Playlist metadata is concerned only with the number of
+                # tracks, not the actual list
+                mapped_playlists[uri] = PlaylistMetadata.from_tidal(pl)
+
+        if missing_playlists:
+            mapped_playlists.update(self._fetch_playlists(session, missing_playlists))
 
         # When we trigger a playlists_loaded event the backend may call as_list
         # again. Set an event in playlist_cache_refresh_secs seconds to ensure
@@ -265,9 +465,49 @@ class TidalPlaylistsProvider(backend.PlaylistsProvider):
 
         return [Ref.track(uri=t.uri, name=t.name) for t in playlist.tracks]
 
+    def _fetch_playlist(self, session, tidal_playlist) -> MopidyPlaylist:
+        pl_tracks = self._retrieve_api_tracks(session, tidal_playlist)
+        return MopidyPlaylist(
+            uri="tidal:playlist:" + tidal_playlist.id,
+            name=tidal_playlist.name,
+            tracks=full_models_mappers.create_mopidy_tracks(pl_tracks),
+            last_modified=to_timestamp(tidal_playlist.last_updated),
+        )
+
+    def _fetch_playlists(self, session, tidal_playlists) -> dict[str, MopidyPlaylist]:
+        """
+        Fetch the tracks of several playlists concurrently, on the shared
+        lookup pool. Their pages are fetched on the shared API pool, which
+        caps the number of concurrent API requests.
+        """
+        if len(tidal_playlists) == 1:
+            playlist = self._fetch_playlist(session, tidal_playlists[0])
+            return {playlist.uri: playlist}
+
+        total = len(tidal_playlists)
+        log_every = max(total // 10, 1)
+        logger.info("Fetching the tracks of %d playlists..", total)
+
+        with worker_pool("lookup", 4) as pool:
+            futures = [
+                pool.submit(self._fetch_playlist, session, pl) for pl in tidal_playlists
+            ]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    if done % log_every == 0 or done == total:
+                        logger.info("Fetched %d/%d playlists", done, total)
+            finally:
+                # Don't fetch any further playlists if one of them failed
+                for future in futures:
+                    future.cancel()
+
+        playlists = [future.result() for future in futures]
+        return {playlist.uri: playlist for playlist in playlists}
+
     def _retrieve_api_tracks(self, session, playlist):
         getter_args = tuple()
-        return get_items(playlist.tracks, *getter_args)
+        return get_items(playlist.tracks, *getter_args, total=get_num_tracks(playlist))
 
     def save(self, playlist):
         old_playlist = self._get_or_refresh_playlist(playlist.uri)
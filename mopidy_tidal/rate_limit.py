@@ -0,0 +1,208 @@
+from __future__ import unicode_literals
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RETRIES = 3
+# Requests are not retried if TIDAL asks us to wait for longer than this
+MAX_RETRY_AFTER = 60.0
+
+
+def get_requests_per_sec() -> float:
+    rate = context.get_config()[Extension.ext_name].get("api_requests_per_sec")
+    return rate if isinstance(rate, (int, float)) else 0
+
+
+def get_max_retries() -> int:
+    retries = context.get_config()[Extension.ext_name].get("api_max_retries")
+    return retries if isinstance(retries, int) else DEFAULT_MAX_RETRIES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse the value of a `Retry-After` header (either a number of seconds or
+    an HTTP date) into a number of seconds.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket which lets through at most `rate` requests per
+    second on average, in bursts of up to `burst` requests.
+
+    :param rate: Requests per second. 0 means no limit.
+    :param burst: Size of the bucket (default: `rate`, at least 1)
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = max(burst or rate, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._paused_until = 0.0
+
+    def pause(self, secs: float):
+        """
+        Hold all the requests for (at least) `secs` seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + secs)
+
+    def acquire(self) -> float:
+        """
+        Wait for a token. Returns how long (in seconds) the caller waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                delay = self._paused_until - now
+                if delay <= 0:
+                    if not self.rate:
+                        return waited
+
+                    elapsed = now - self._updated_at
+                    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+
+                    delay = (1 - self._tokens) / self.rate
+
+            self._sleep(delay)
+            waited += delay
+
+
+class RequestScheduler:
+    """
+    Schedules the requests to the TIDAL API: requests are throttled to
+    `requests_per_sec` and, when TIDAL answers with `429 Too Many Requests`,
+    all the requests are held for the `Retry-After` time (or for a jittered,
+    exponentially growing delay if it isn't provided) and the request is
+    retried up to `max_retries` times.
+
+    :param requests_per_sec: Requests per second. 0 means no limit.
+    :param max_retries: Maximum number of retries of a throttled request
+    :param backoff_base: Base delay (in seconds) of the exponential back-off
+    :param backoff_max: Maximum delay (in seconds) of the exponential back-off
+    """
+
+    def __init__(
+        self,
+        requests_per_sec: float = 0,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._bucket = TokenBucket(requests_per_sec, clock=clock, sleep=sleep)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before the `attempt`-th retry (starting from 0), with full jitter.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def __call__(self, send: Callable[[], Response]) -> Response:
+        attempt = 0
+        while True:
+            waited = self._bucket.acquire()
+            if waited:
+                metrics.incr("api.rate_limited")
+                metrics.observe("api.rate_limit.wait", waited)
+
+            metrics.incr("api.requests")
+            response = send()
+            if response.status_code != 429:
+                return response
+
+            metrics.incr("api.throttled")
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = self.backoff(attempt)
+
+            if attempt >= self.max_retries or delay > MAX_RETRY_AFTER:
+                metrics.incr("api.gave_up")
+                logger.warning(
+                    "TIDAL request throttled, giving up after %d retries: %s",
+                    attempt,
+                    response.url,
+                )
+                return response
+
+            logger.info(
+                "TIDAL request throttled, retrying in %.1f seconds: %s",
+                delay,
+                response.url,
+            )
+            self._bucket.pause(delay)
+            response.close()
+            metrics.incr("api.retried")
+            attempt += 1
+
+    def adapter(self) -> HTTPAdapter:
+        return _ScheduledAdapter(self)
+
+    def install(self, session):
+        """
+        Route all the requests of a `tidalapi.Session` through the scheduler.
+        """
+        request_session = getattr(session, "request_session", None)
+        if request_session is None:
+            logger.debug("Cannot schedule the requests of %r", session)
+            return
+
+        request_session.mount("https://", self.adapter())
+        request_session.mount("http://", self.adapter())
+
+
+class _ScheduledAdapter(HTTPAdapter):
+    def __init__(self, scheduler: RequestScheduler, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._scheduler = scheduler
+
+    def send(self, request, *args, **kwargs):
+        def send():
+            return super(_ScheduledAdapter, self).send(request, *args, **kwargs)
+
+        return self._scheduler(send)
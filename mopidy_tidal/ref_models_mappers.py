@@ -6,6 +6,8 @@ from mopidy.models import Ref
 from tidalapi import Album, Artist, Mix, Playlist, Track
 from tidalapi.mix import MixType
 
+from mopidy_tidal.image_index import image_index
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,6 +33,7 @@ def create_artists(tidal_artists):
 
 
 def create_artist(tidal_artist):
+    image_index.add("artist", tidal_artist)
     return Ref.artist(
         uri="tidal:artist:" + str(tidal_artist.id), name=tidal_artist.name
     )
@@ -41,6 +44,7 @@ def create_playlists(tidal_playlists):
 
 
 def create_playlist(tidal_playlist):
+    image_index.add("playlist", tidal_playlist)
     return Ref.playlist(
         uri="tidal:playlist:" + str(tidal_playlist.id), name=tidal_playlist.name
     )
@@ -97,11 +101,13 @@ def create_mixed_entry(tidal_mixed):
             name=f"{tidal_mixed.title} ({tidal_mixed.sub_title})",
         )
     elif isinstance(tidal_mixed, Album):
+        image_index.add("album", tidal_mixed)
         return Ref.album(
             uri="tidal:album:" + str(tidal_mixed.id),
             name=f"{tidal_mixed.name} ({tidal_mixed.artist.name})",
         )
     elif isinstance(tidal_mixed, Playlist):
+        image_index.add("playlist", tidal_mixed)
         return Ref.playlist(
             uri="tidal:playlist:" + str(tidal_mixed.id),
             name=f"{tidal_mixed.name}",
@@ -156,6 +162,7 @@ def create_albums(tidal_albums):
 
 
 def create_album(tidal_album):
+    image_index.add("album", tidal_album)
     return Ref.album(uri="tidal:album:" + str(tidal_album.id), name=tidal_album.name)
 
 
@@ -167,4 +174,5 @@ def create_track(tidal_track):
     uri = "tidal:track:{0}:{1}:{2}".format(
         tidal_track.artist.id, tidal_track.album.id, tidal_track.id
     )
+    image_index.add("album", tidal_track.album)
     return Ref.track(uri=uri, name=tidal_track.name)
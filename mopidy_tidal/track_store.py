@@ -0,0 +1,182 @@
+from __future__ import unicode_literals
+
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from mopidy.models import Track
+
+from mopidy_tidal import Extension, context
+from mopidy_tidal.lru_cache import LruCache
+
+# Max number of tracks of a persisted store kept in memory
+TRACK_STORE_SIZE = 65536
+
+_stores: Dict[Path, "TrackStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def get_track_id(track: Track) -> Optional[int]:
+    """
+    Numeric TIDAL ID of a track (the last part of its URI), if it has one.
+    """
+    track_id = (getattr(track, "uri", None) or "").split(":")[-1]
+    return int(track_id) if track_id.isdigit() else None
+
+
+def get_track_store(persist: bool = True) -> "TrackStore":
+    """
+    The track store shared by the persisted playlist caches, or a new
+    in-memory one if `persist` is false.
+    """
+    if not persist:
+        return TrackStore(persist=False)
+
+    cache_dir = Path(Extension.get_cache_dir(context.get_config()))
+    with _stores_lock:
+        if cache_dir not in _stores:
+            _stores[cache_dir] = TrackStore()
+        return _stores[cache_dir]
+
+
+class TrackStore(LruCache):
+    """
+    Cache of the tracks of the cached playlists, keyed by TIDAL track ID, so
+    that playlists only store the IDs of their tracks (see
+    :class:`mopidy_tidal.playlists.PlaylistCache`) and a track that belongs to
+    several playlists is kept once. Tracks are only written if they're new or
+    have changed.
+
+    The store keeps the track IDs of each playlist, and drops the tracks that
+    no playlist uses any longer when a playlist is replaced or removed. A
+    persisted store is shared by all the persisted playlist caches: the IDs
+    are persisted as well, and the unused tracks are only dropped from the
+    storage, as the playlists of other caches may still use them in memory.
+
+    :param persist: Whether the tracks should be persisted (default: True)
+    """
+
+    namespace = "playlist_tracks"
+    # Persisted list of the playlists whose track IDs are stored
+    index_key = "tidal:playlist_tracks:index"
+
+    def __init__(self, persist: bool = True):
+        super().__init__(
+            max_size=TRACK_STORE_SIZE if persist else None, persist=persist
+        )
+        self._playlists: Optional[Dict[str, array]] = None if persist else {}
+        self._refs: Counter = Counter()
+
+    @staticmethod
+    def _key(track_id: int) -> str:
+        return f"tidal:track:{track_id}"
+
+    def _get_playlists(self) -> Dict[str, array]:
+        # Called with the lock held
+        if self._playlists is None:
+            self._playlists = {}
+            try:
+                uris = self._storage.get(self.index_key)
+            except KeyError:
+                uris = []
+
+            for uri in uris:
+                with suppress(KeyError):
+                    self._playlists[uri] = self._storage.get(uri)
+            for track_ids in self._playlists.values():
+                self._refs.update(set(track_ids))
+
+        return self._playlists
+
+    def _set_playlist(self, uri: str, track_ids: Optional[array]):
+        playlists = self._get_playlists()
+        new_playlist = uri not in playlists
+        if track_ids is None:
+            playlists.pop(uri, None)
+        else:
+            playlists[uri] = track_ids
+        if not self.persist:
+            return
+
+        if track_ids is None:
+            self._storage.delete(uri)
+        else:
+            self._storage.set(uri, track_ids)
+        if new_playlist or track_ids is None:
+            self._storage.set(self.index_key, list(playlists))
+
+    def _release(self, track_ids: Iterable[int]):
+        """
+        Count one playlist less for each of the tracks, and drop the tracks
+        that no playlist uses any longer.
+        """
+        unused = []
+        for track_id in set(track_ids):
+            self._refs[track_id] -= 1
+            if self._refs[track_id] <= 0:
+                del self._refs[track_id]
+                unused.append(self._key(track_id))
+
+        if self.persist:
+            for key in unused:
+                self._reset_stored_entry(key)
+        else:
+            self.prune(*unused)
+
+    def add(self, uri: str, tracks: Iterable[Track]) -> Optional[array]:
+        """
+        Store the tracks of a playlist, and return their IDs (or `None` if
+        some tracks have no numeric ID).
+        """
+        tracks = list(tracks)
+        ids = [get_track_id(t) for t in tracks]
+        if None in ids:
+            return None
+
+        track_ids = array("q", ids)
+        with self._lock:
+            old_ids = self._get_playlists().get(uri)
+            changed = {}
+            for track_id, track in zip(ids, tracks):
+                key = self._key(track_id)
+                # Only check the tracks in memory, not the storage. Tracks
+                # that no playlist uses may have been dropped from the storage.
+                stored = OrderedDict.get(self, key)
+                if not self._refs[track_id] or (
+                    stored is not track and stored != track
+                ):
+                    changed[key] = track
+
+            if changed:
+                self.update(changed)
+
+            if old_ids != track_ids:
+                self._refs.update(set(ids))
+                self._set_playlist(uri, track_ids)
+                self._release(old_ids or ())
+
+        return track_ids
+
+    def remove(self, *uris: str):
+        """
+        Forget the tracks of playlists, and drop the tracks that no playlist
+        uses any longer.
+        """
+        with self._lock:
+            for uri in uris:
+                track_ids = self._get_playlists().get(uri)
+                if track_ids is not None:
+                    self._set_playlist(uri, None)
+                    self._release(track_ids)
+
+    def get_tracks(self, track_ids: Iterable[int]) -> List[Track]:
+        """
+        The tracks with the given IDs, in order.
+
+        :raises KeyError: If a track isn't stored
+        """
+        with self._lock:
+            return [self[self._key(track_id)] for track_id in track_ids]
@@ -31,6 +31,21 @@ INTERACTIVE_HTML_BODY = """
 """
 
 
+def start_http_daemon(
+    name: str, port: int, handler: Callable, server_class=HTTPServer
+) -> HTTPServer:
+    """
+    Serve HTTP requests with `handler` on `port`, in a daemon thread.
+    """
+    server = server_class(("", port), handler)
+    daemon = threading.Thread(name=name, target=server.serve_forever)
+    daemon.daemon = (
+        True  # Set as a daemon so it will be killed once the main thread is dead.
+    )
+    daemon.start()
+    return server
+
+
 class WebAuthServer:
     def __init__(self):
         self.handler: Optional[partial] = None
@@ -46,14 +61,7 @@ class WebAuthServer:
             HTTPHandler, login_url, self.set_response_code, pkce_enabled
         )
 
-        daemon = threading.Thread(
-            name="TidalOAuthLogin",
-            target=HTTPServer(("", port), self.handler).serve_forever,
-        )
-        daemon.daemon = (
-            True  # Set as a daemon so it will be killed once the main thread is dead.
-        )
-        daemon.start()
+        start_http_daemon("TidalOAuthLogin", port, self.handler)
         self.daemon_started = True
 
     def set_callback(self, callback: Callable[[str], None]):
@@ -1,11 +1,256 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Deque, Dict, Hashable, Iterator, Mapping, Optional
 
+from mopidy_tidal.metrics import metrics
 
-def func_wrapper(args):
-    (f, offset, *args) = args
-    items = f(*args)
-    return list((i + offset, item) for i, item in enumerate(items))
+logger = logging.getLogger(__name__)
+
+# Default number of workers of each shared pool
+DEFAULT_POOL_SIZES = {
+    "api": 5,  # API paging
+    "lookup": 4,  # Library lookups
+    "images": 4,  # Image lookups
+    "search": 4,  # Search results expansion
+    "background": 2,  # Refreshes of stale pages and favourites
+}
+
+
+class WorkerPool(Executor):
+    """
+    Named, long-lived thread pool which keeps track of its active and queued
+    tasks (`pools.<name>.active` and `pools.<name>.queued` gauges).
+
+    Tasks submitted by one of the pool's own workers are run inline: waiting
+    for them to be picked up by another worker could deadlock the pool.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix=f"mopidy-tidal-{name}-"
+        )
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active = 0
+        self._queued = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def _update_counts(self, active: int = 0, queued: int = 0):
+        with self._lock:
+            self._active += active
+            self._queued += queued
+            metrics.set_gauge(f"pools.{self.name}.active", self._active)
+            metrics.set_gauge(f"pools.{self.name}.queued", self._queued)
+
+    def _run(self, fn, args, kwargs):
+        self._update_counts(active=1, queued=-1)
+        self._local.is_worker = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._local.is_worker = False
+            self._update_counts(active=-1)
+
+    def _on_done(self, future: Future):
+        if future.cancelled():
+            self._update_counts(queued=-1)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if getattr(self._local, "is_worker", False):
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        self._update_counts(queued=1)
+        try:
+            future = self._executor.submit(self._run, fn, args, kwargs)
+        except BaseException:
+            self._update_counts(queued=-1)
+            raise
+
+        future.add_done_callback(self._on_done)
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+_active_pools: Optional["WorkerPools"] = None
+
+
+class WorkerPools:
+    """
+    Shared worker pools of the backend, created on :meth:`start` and shut down
+    on :meth:`shutdown`. While started, :func:`worker_pool` hands out these
+    pools instead of creating a new thread pool on every call.
+
+    :param sizes: Number of workers of each pool, by name (default:
+        `DEFAULT_POOL_SIZES`)
+    """
+
+    def __init__(self, sizes: Optional[Mapping[str, int]] = None):
+        self._sizes = {**DEFAULT_POOL_SIZES, **(sizes or {})}
+        self._pools: Dict[str, WorkerPool] = {}
+
+    def start(self):
+        global _active_pools
+
+        for name, size in self._sizes.items():
+            if name not in self._pools:
+                logger.debug("Starting worker pool %s (%d workers)", name, size)
+                self._pools[name] = WorkerPool(name, size)
+
+        _active_pools = self
+
+    def get(self, name: str) -> Optional[WorkerPool]:
+        return self._pools.get(name)
+
+    def shutdown(self, wait: bool = True):
+        global _active_pools
+
+        if _active_pools is self:
+            _active_pools = None
+
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+@contextmanager
+def worker_pool(name: str, max_workers: int) -> Iterator[Executor]:
+    """
+    Get the shared pool `name` of the running backend or, if the pools haven't
+    been started, a temporary thread pool of `max_workers` workers.
+    """
+    pool = _active_pools.get(name) if _active_pools else None
+    if pool:
+        yield pool
+        return
+
+    with ThreadPoolExecutor(
+        max_workers, thread_name_prefix=f"mopidy-tidal-{name}-"
+    ) as executor:
+        yield executor
+
+
+def run_in_background(name: str, fn: Callable, /, *args, **kwargs) -> Future:
+    """
+    Run `fn` on the shared pool `name` of the running backend without waiting
+    for it or, if the pools haven't been started, on a thread of its own.
+
+    :raises RuntimeError: If the pools are being shut down
+    """
+    pool = _active_pools.get(name) if _active_pools else None
+    if pool:
+        return pool.submit(fn, *args, **kwargs)
+
+    executor = ThreadPoolExecutor(1, thread_name_prefix=f"mopidy-tidal-{name}-")
+    try:
+        return executor.submit(fn, *args, **kwargs)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def get_num_tracks(obj) -> Optional[int]:
+    """
+    Number of tracks of a TIDAL playlist or album, if known.
+    """
+    num_tracks = getattr(obj, "num_tracks", None)
+    if isinstance(num_tracks, int) and num_tracks >= 0:
+        return num_tracks
+    return None
+
+
+def iter_items(
+    func: Callable,
+    *args,
+    parse: Callable = lambda _: _,
+    chunk_size: int = 100,
+    processes: int = 5,
+    total: Optional[int] = None,
+    read_ahead: Optional[int] = None,
+) -> Iterator:
+    """
+    Streaming version of :func:`get_items`: items are yielded in order as soon
+    as all the pages before them have been retrieved, while at most
+    `read_ahead` pages (default: `processes`) are requested ahead of the page
+    being consumed.
+
+    If the `total` number of items is known, the pages needed to retrieve them
+    are requested one after the other within the read-ahead window. If the
+    last of them should be full (or if `total` isn't positive), one more page
+    is requested along with them, in case `total` is stale. Otherwise, or if
+    the last page still comes back full, pages are requested in rounds of
+    `read_ahead` until a round comes back short.
+    """
+    read_ahead = max(read_ahead or processes, 1)
+    pending: Deque[Future] = deque()
+    offset = 0
+    round_size = read_ahead
+
+    with worker_pool("api", processes) as pool:
+
+        def submit(offset):
+            pending.append(pool.submit(func, *args, chunk_size, offset))
+
+        try:
+            if isinstance(total, int):
+                num_pages = -(-max(total, 0) // chunk_size)
+                if max(total, 0) % chunk_size == 0:
+                    num_pages += 1
+
+                offsets = iter(range(0, num_pages * chunk_size, chunk_size))
+                for offset in islice(offsets, read_ahead):
+                    submit(offset)
+
+                page: list = []
+                while pending:
+                    page = list(pending.popleft().result())
+                    for offset in islice(offsets, 1):
+                        submit(offset)
+                    yield from map(parse, page)
+
+                if len(page) < chunk_size:
+                    return
+
+                # The last page is full: `total` is stale
+                offset = num_pages * chunk_size
+
+            while True:
+                for i in range(round_size):
+                    submit(offset + chunk_size * i)
+
+                num_items = 0
+                while pending:
+                    page = list(pending.popleft().result())
+                    num_items += len(page)
+                    yield from map(parse, page)
+
+                if num_items < chunk_size * round_size:
+                    return
+
+                offset += chunk_size * round_size
+                round_size = read_ahead
+        finally:
+            # The consumer may stop early: don't request any further pages
+            for future in pending:
+                future.cancel()
 
 
 def get_items(
@@ -14,46 +259,64 @@ def get_items(
     parse: Callable = lambda _: _,
     chunk_size: int = 100,
     processes: int = 5,
+    total: Optional[int] = None,
 ):
     """
     This function performs pagination on a function that supports
     `limit`/`offset` parameters and it runs API requests in parallel to speed
     things up.
-    """
-    items = []
-    offsets = [-chunk_size]
-    remaining = chunk_size * processes
 
-    with ThreadPoolExecutor(
-        processes, thread_name_prefix=f"mopidy-tidal-{func.__name__}-"
-    ) as pool:
-        while remaining == chunk_size * processes:
-            offsets = [offsets[-1] + chunk_size * (i + 1) for i in range(processes)]
-
-            pool_results = pool.map(
-                func_wrapper,
-                [
-                    (
-                        func,
-                        offset,
-                        *args,
-                        chunk_size,  # limit
-                        offset,  # offset
-                    )
-                    for offset in offsets
-                ],
-            )
-
-            new_items = []
-            for results in pool_results:
-                new_items.extend(results)
-
-            remaining = len(new_items)
-            items.extend(new_items)
-
-    items = [_ for _ in items if _]
-    sorted_items = list(
-        map(lambda item: item[1], sorted(items, key=lambda item: item[0]))
+    See :func:`iter_items` for details.
+    """
+    return list(
+        iter_items(
+            func,
+            *args,
+            parse=parse,
+            chunk_size=chunk_size,
+            processes=processes,
+            total=total,
+        )
     )
 
-    return list(map(parse, sorted_items))
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: while a call for a key is in
+    progress, other callers for that key wait for (and share) its result
+    instead of running the function again.
+
+    Calls from Mopidy core are already serialized on the backend actor, so
+    this only saves work between the worker pools, background refreshes and
+    the actor, not across clients.
+
+    :param name: Name used for the `<name>.coalesced` metrics counter
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def __call__(self, key: Hashable, func: Callable, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.incr(f"{self._name}.coalesced")
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -1,4 +1,5 @@
 import json
+import time
 from concurrent.futures import Future
 from typing import Optional
 from unittest.mock import Mock
@@ -16,6 +17,8 @@ from tidalapi.session import LinkLogin
 from mopidy_tidal import context
 from mopidy_tidal.backend import TidalBackend
 from mopidy_tidal.context import set_config
+from mopidy_tidal.image_index import image_index
+from mopidy_tidal.metrics import metrics
 
 
 def _make_mock(mock: Optional[Mock] = None, **kwargs) -> Mock:
@@ -70,6 +73,31 @@ def config(tmp_path):
     context.set_config(None)
 
 
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    yield
+    metrics.reset()
+
+
+@pytest.fixture(autouse=True)
+def reset_image_index():
+    yield
+    image_index.clear()
+
+
+@pytest.fixture
+def wait_for():
+    """Wait, for up to `timeout` seconds, until `condition()` is true."""
+
+    def wait(condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "Timed out waiting for the condition"
+            time.sleep(0.001)
+
+    return wait
+
+
 @pytest.fixture
 def tidal_search(mocker):
     """Provide an uncached tidal_search.
@@ -252,6 +280,7 @@ def make_playlist(playlist_id, tracks):
         uri=f"tidal:playlist:{playlist_id}",
         tracks=tracks,
         num_tracks=len(tracks),
+        duration=sum(t.duration for t in tracks),
         last_updated=10,
     )
 
@@ -316,8 +345,11 @@ compare = pytest.fixture(lambda: _compare)
 
 @pytest.fixture
 def get_backend(mocker):
+    backends = []
+
     def _get_backend(config=mocker.MagicMock(), audio=mocker.Mock()):
         backend = TidalBackend(config, audio)
+        backends.append(backend)
         session_factory = mocker.Mock()
         # session = mocker.Mock()
         session = mocker.Mock(spec=SessionForTest)
@@ -358,6 +390,9 @@ def get_backend(mocker):
         return backend, config, audio, session_factory, session
 
     yield _get_backend
+    for backend in backends:
+        if backend.worker_pools:
+            backend.worker_pools.shutdown()
     set_config(None)
 
 
@@ -1,11 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
 from json import dump, dumps, load, loads
 from pathlib import Path
 
 import pytest
+import requests
 
 from mopidy_tidal.library import TidalLibraryProvider
 from mopidy_tidal.playback import TidalPlaybackProvider
 from mopidy_tidal.playlists import TidalPlaylistsProvider
+from mopidy_tidal.workers import worker_pool
 
 
 def test_backend_composed_of_correct_parts(get_backend):
@@ -272,3 +275,92 @@ def test_loads_session(get_backend, mocker, config):
     backend.web_auth_server.start_oauth_daemon.assert_not_called()
     session.load_session_from_file.assert_called_once()
     session_factory.assert_called_once()
+
+
+def test_on_stop_flushes_cache(get_backend, mocker):
+    backend, *_ = get_backend()
+    flush_all = mocker.patch("mopidy_tidal.backend.cache_storage.flush_all")
+
+    backend.on_stop()
+
+    flush_all.assert_called_once_with()
+
+
+def test_on_stop_closes_library_and_cache_storages(get_backend, mocker):
+    backend, *_ = get_backend()
+    close_all = mocker.patch("mopidy_tidal.backend.cache_storage.close_all")
+    close_library = mocker.patch.object(backend.library, "close")
+
+    backend.on_stop()
+
+    close_library.assert_called_once_with()
+    close_all.assert_called_once_with()
+
+
+def test_on_start_starts_worker_pools(get_backend, config):
+    config["tidal"]["lazy"] = True
+    config["tidal"]["api_workers"] = 3
+    backend, *_ = get_backend(config=config)
+
+    backend.on_start()
+
+    assert backend.worker_pools.get("api").max_workers == 3
+    assert backend.worker_pools.get("images").max_workers == 4
+    with worker_pool("api", 1) as pool:
+        assert pool is backend.worker_pools.get("api")
+
+
+def test_on_stop_shuts_down_worker_pools(get_backend, config):
+    config["tidal"]["lazy"] = True
+    backend, *_ = get_backend(config=config)
+    backend.on_start()
+
+    backend.on_stop()
+
+    assert backend.worker_pools is None
+    with worker_pool("api", 1) as pool:
+        assert isinstance(pool, ThreadPoolExecutor)
+
+
+def test_on_start_schedules_api_requests(get_backend, config):
+    config["tidal"]["lazy"] = True
+    config["tidal"]["api_max_retries"] = 7
+    backend, _, _, _, session = get_backend(config=config)
+    session.request_session = requests.Session()
+
+    backend.on_start()
+
+    assert backend.request_scheduler.max_retries == 7
+    adapter = session.request_session.get_adapter("https://api.tidal.com/v1/")
+    assert adapter._scheduler is backend.request_scheduler
+
+
+def test_metrics_are_logged_periodically(get_backend, config, mocker):
+    config["tidal"]["lazy"] = True
+    config["tidal"]["metrics_log_secs"] = 60
+    timer = mocker.patch("mopidy_tidal.backend.threading.Timer")
+    log = mocker.patch("mopidy_tidal.backend.metrics.log")
+    backend, *_ = get_backend(config=config)
+    backend.on_start()
+
+    timer.assert_called_once_with(60, backend._log_metrics)
+    backend._log_metrics()
+
+    backend.worker_pools.get("background").shutdown()
+    log.assert_called_once_with()
+    assert timer.call_count == 2
+
+    backend.on_stop()
+    timer.return_value.cancel.assert_called_once_with()
+
+
+def test_metrics_are_not_logged_periodically_if_disabled(get_backend, config, mocker):
+    config["tidal"]["lazy"] = True
+    config["tidal"]["metrics_log_secs"] = 0
+    timer = mocker.patch("mopidy_tidal.backend.threading.Timer")
+    backend, *_ = get_backend(config=config)
+
+    backend.on_start()
+    backend.on_stop()
+
+    timer.assert_not_called()
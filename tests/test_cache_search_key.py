@@ -18,7 +18,21 @@ def test_hashes_of_different_objects_are_different():
     assert hash(key_1) != hash(key_2) != hash(key_3)
 
 
-def test_as_str_constructs_uri_from_hash():
+def test_as_str_constructs_uri_from_digest():
     key = SearchKey(exact=True, query=dict(artist="Arty", album="Alby"))
 
-    assert str(key) == f"tidal:search:{hash(key)}"
+    assert str(key) == f"tidal:search:{key.digest}"
+
+
+def test_digest_is_stable_between_processes():
+    key = SearchKey(exact=True, query=dict(artist="Arty", album="Alby"))
+
+    assert key.digest == "48e159dd47c966ca068dfda9bcbc61e918e33b26"
+
+
+def test_equivalent_queries_are_normalised_to_the_same_key():
+    key_1 = SearchKey(exact=False, query=dict(artist=["Arty [TIDAL]"], track_no=["1"]))
+    key_2 = SearchKey(exact=False, query=dict(artist=[" arty  "]))
+
+    assert key_1 == key_2
+    assert str(key_1) == str(key_2)
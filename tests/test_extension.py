@@ -27,10 +27,32 @@ def test_config_schema_has_correct_keys():
         "client_id",
         "client_secret",
         "playlist_cache_refresh_secs",
+        "playlist_changes_ttl_secs",
         "lazy",
         "login_method",
         "login_server_port",
         "auth_method",
+        "cache_backend",
+        "cache_write_behind",
+        "search_cache_ttl_secs",
+        "search_cache_size",
+        "page_cache_ttl_secs",
+        "browse_artist_eps",
+        "favorites_refresh_secs",
+        "favorites_full_sync_secs",
+        "local_search",
+        "image_proxy",
+        "image_proxy_port",
+        "image_proxy_hostname",
+        "image_proxy_cache_mb",
+        "api_workers",
+        "lookup_workers",
+        "image_workers",
+        "search_workers",
+        "background_workers",
+        "api_requests_per_sec",
+        "api_max_retries",
+        "metrics_log_secs",
     }
 
 
@@ -0,0 +1,215 @@
+import pickle
+import time
+from threading import Event, current_thread
+
+import pytest
+
+from mopidy_tidal.favorites import FavoritesIndex
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.workers import WorkerPools
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeFavorites:
+    """Favourites of each kind, newest first, as served by the API."""
+
+    def __init__(self, **items):
+        self.items = items
+        self.calls = []
+        self.gate = None
+
+    def __call__(self, kind, limit=None, offset=0):
+        if self.gate:
+            self.gate.wait(5)
+        self.calls.append((kind, limit, offset))
+        items = self.items[kind]
+        return list(items[offset : offset + limit] if limit else items)
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fetch(tidal_artists, tidal_albums, tidal_tracks):
+    return FakeFavorites(
+        artists=list(tidal_artists), albums=list(tidal_albums), tracks=tidal_tracks
+    )
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return tmp_path / "favorites.pickle"
+
+
+@pytest.fixture
+def index(fetch, clock, config, cache_file):
+    config["tidal"]["favorites_refresh_secs"] = 60
+    config["tidal"]["favorites_full_sync_secs"] = 3600
+    return FavoritesIndex(fetch, cache_file=cache_file, clock=clock)
+
+
+def test_favourites_are_fetched_once(index, fetch):
+    assert index.artist_names() == {"Artist-0", "Artist-1"}
+    assert index.artist_names() == {"Artist-0", "Artist-1"}
+
+    assert fetch.calls == [("artists", None, 0)]
+    assert metrics.counter("favorites.miss") == 1
+    assert metrics.counter("favorites.hit") == 1
+
+
+def test_albums_by_artist_include_albums_of_favourite_tracks(index):
+    assert index.album_names() == {"Album-0", "Album-1"}
+    assert index.album_names(artists={"album artist"}) == {"Album-0", "Album-1"}
+    # Artist-1 has no favourite albums, but one of their tracks is a favourite
+    assert index.album_names(artists={"Artist-1"}) == {"Album-1"}
+    assert index.album_names(artists={"Nobody"}) == set()
+
+
+def test_tracks_can_be_filtered_by_artist_and_album(index):
+    assert index.track_names() == {"Track-0", "Track-1"}
+    assert index.track_names(artists={"Artist-0"}) == {"Track-0"}
+    assert index.track_names(albums={"Album-1"}) == {"Track-1"}
+    assert index.track_names(artists={"Artist-0"}, albums={"Album-1"}) == set()
+
+
+def test_tracks_have_uris(index):
+    assert [t.uri for t in index.get("tracks")] == [
+        "tidal:track:0:0:0",
+        "tidal:track:1:1:1",
+    ]
+
+
+def test_index_is_loaded_from_disk(index, clock, cache_file):
+    index.artist_names()
+    index.track_names()
+
+    loaded_fetch = FakeFavorites(albums=[])
+    loaded = FavoritesIndex(loaded_fetch, cache_file=cache_file, clock=clock)
+
+    assert loaded.artist_names() == {"Artist-0", "Artist-1"}
+    assert loaded.album_names(artists={"Artist-1"}) == {"Album-1"}
+    # Only the albums, which were never fetched, are missing
+    assert loaded_fetch.calls == [("albums", None, 0)]
+
+
+@pytest.mark.parametrize("content", [b"garbage", pickle.dumps({"version": 1})])
+def test_unreadable_index_is_ignored(fetch, clock, cache_file, content):
+    cache_file.write_bytes(content)
+
+    index = FavoritesIndex(fetch, cache_file=cache_file, clock=clock)
+
+    assert index.artist_names() == {"Artist-0", "Artist-1"}
+    assert fetch.calls == [("artists", None, 0)]
+
+
+def test_sync_fetches_new_favourites_only(index, fetch, make_tidal_artist):
+    index.get("artists")
+    fetch.items["artists"].insert(0, make_tidal_artist(name="Newbie", id=10))
+    fetch.calls.clear()
+
+    artists = index.get("artists", sync=True)
+
+    assert [a.name for a in artists] == ["Newbie", "Artist-0", "Artist-1"]
+    assert fetch.calls == [("artists", 50, 0)]
+    assert metrics.counter("favorites.artists.added") == 1
+
+
+def test_sync_pages_until_a_known_favourite(index, fetch, make_tidal_artist):
+    index.get("artists")
+    new = [make_tidal_artist(name=f"New-{i}", id=100 + i) for i in range(60)]
+    fetch.items["artists"][:0] = new
+    fetch.calls.clear()
+
+    artists = index.get("artists", sync=True)
+
+    assert [a.name for a in artists] == [a.name for a in fetch.items["artists"]]
+    assert fetch.calls == [("artists", 50, 0), ("artists", 50, 50)]
+
+
+def test_stale_favourites_are_served_while_synced(
+    index, fetch, clock, make_tidal_artist
+):
+    index.get("artists")
+    fetch.items["artists"].insert(0, make_tidal_artist(name="Newbie", id=10))
+    fetch.gate = Event()
+    clock.now += 61
+
+    assert "Newbie" not in index.artist_names()
+    fetch.gate.set()
+
+    # The new favourites are fetched in the background
+    wait_for(lambda: "Newbie" in index.artist_names())
+    assert fetch.calls[-1] == ("artists", 50, 0)
+
+
+def test_favourites_are_synced_on_the_background_pool(index, fetch, clock, mocker):
+    index.get("artists")
+    clock.now += 61
+    threads = []
+    sync = mocker.patch.object(
+        index,
+        "sync",
+        side_effect=lambda *_, **__: threads.append(current_thread().name),
+    )
+
+    pools = WorkerPools()
+    pools.start()
+    try:
+        index.get("artists")
+        wait_for(lambda: threads)
+    finally:
+        pools.shutdown()
+
+    sync.assert_called_once_with("artists", full=False)
+    assert threads[0].startswith("mopidy-tidal-background-")
+
+
+def test_removed_favourites_are_dropped_by_full_sync(index, fetch, clock):
+    index.get("artists")
+    removed = fetch.items["artists"].pop()
+    clock.now += 3600
+
+    index.get("artists", sync=True)
+
+    # The delta sync can't see the removed favourite...
+    assert fetch.calls[1] == ("artists", 50, 0)
+    # ...which is dropped by the full sync, in the background
+    wait_for(lambda: removed.name not in index.artist_names())
+    assert fetch.calls[-1] == ("artists", None, 0)
+
+
+def test_failed_sync_keeps_the_index(index, fetch):
+    index.get("artists")
+    fetch.items = {}
+
+    with pytest.raises(KeyError):
+        index.get("artists", sync=True)
+
+    assert index.artist_names() == {"Artist-0", "Artist-1"}
+
+
+def test_favourites_are_synced_on_every_call_without_refresh_interval(
+    index, fetch, config
+):
+    config["tidal"]["favorites_refresh_secs"] = 0
+
+    index.artist_names()
+    index.artist_names()
+
+    assert fetch.calls == [("artists", None, 0), ("artists", 50, 0)]
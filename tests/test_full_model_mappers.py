@@ -2,7 +2,12 @@ from datetime import datetime
 
 import mopidy.models as mopidy_models
 
-from mopidy_tidal.full_models_mappers import create_mopidy_album, create_mopidy_artist
+from mopidy_tidal.full_models_mappers import (
+    ModelTable,
+    create_mopidy_album,
+    create_mopidy_artist,
+    create_mopidy_tracks,
+)
 
 
 class TestCreateMopidyArtist:
@@ -85,3 +90,44 @@ class TestCreateMopidyAlbum:
         assert mopidy_album.artists == {
             mopidy_models.Artist(name="Arty", uri="tidal:artist:12")
         }
+
+
+class TestModelInterning:
+    def test_tracks_of_an_album_share_its_models(
+        self, make_tidal_album, make_tidal_artist, make_tidal_track
+    ):
+        artist = make_tidal_artist(name="Arty", id=12)
+        album = make_tidal_album(name="Alby", id=156, artist=artist)
+        tracks = [make_tidal_track(id=i, artist=artist, album=album) for i in range(3)]
+
+        first, *others = create_mopidy_tracks(tracks)
+
+        for track in others:
+            assert track.album is first.album
+            assert track.artists == first.artists
+            assert next(iter(track.artists)) is next(iter(first.artists))
+
+    def test_changed_objects_get_new_models(self, make_tidal_album):
+        album = make_tidal_album(name="Alby", id=156, release_date=None)
+        first = create_mopidy_album(album, None)
+
+        album.name = "Alby (Remastered)"
+        renamed = create_mopidy_album(album, None)
+
+        assert renamed.name == "Alby (Remastered)"
+        assert first.name == "Alby"
+
+    def test_table_is_bounded(self):
+        table = ModelTable(max_size=2)
+        for i in range(3):
+            table.intern(f"tidal:artist:{i}", (), object)
+
+        assert len(table) == 2
+        assert table.intern("tidal:artist:0", (), lambda: "new") == "new"
+
+    def test_models_are_not_shared_without_table(self):
+        table = ModelTable(max_size=0)
+
+        assert table.intern("tidal:artist:0", (), object) is not table.intern(
+            "tidal:artist:0", (), object
+        )
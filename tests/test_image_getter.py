@@ -1,40 +1,86 @@
 import pytest
 from tidalapi import Artist
 
+from mopidy_tidal.image_index import image_index
 from mopidy_tidal.library import HTTPError, Image, ImagesGetter
+from mopidy_tidal.lru_cache import LruCache
+from mopidy_tidal.metrics import metrics
+
+ALBUM_SIZES = (1280, 640, 320, 160, 80)
+ARTIST_SIZES = (750, 480, 320, 160)
+
+
+def sized_images(uri, sizes):
+    return [Image(uri=uri, width=size, height=size) for size in sizes]
 
 
 @pytest.fixture
 def images_getter(mocker, config):
     session = mocker.Mock()
-    getter = ImagesGetter(session)
+    getter = ImagesGetter(lambda: session)
     return getter, session
 
 
-@pytest.mark.parametrize("dimensions", (750, 640, 480))
-def test_get_album_image(images_getter, mocker, dimensions):
+def test_get_album_image(images_getter, mocker):
     ig, session = images_getter
     uri = "tidal:album:1-1-1"
     get_album = mocker.Mock()
+    get_album.image.side_effect = lambda dim: f"http://img/{dim}"
+    session.album.return_value = get_album
 
-    get_uri_args = None
+    assert ig(uri) == (
+        uri,
+        [Image(uri=f"http://img/{dim}", width=dim, height=dim) for dim in ALBUM_SIZES],
+    )
+    # All the sizes are requested once, without probing
+    assert [c.args for c in get_album.image.mock_calls] == [
+        (dim,) for dim in ALBUM_SIZES
+    ]
+
+
+@pytest.mark.parametrize(
+    "square_picture, images",
+    [
+        (
+            "square",
+            [Image(uri="square", width=s, height=s) for s in (1080, 750, 640)]
+            + [Image(uri="square", width=s, height=s) for s in (480, 320, 160)],
+        ),
+        (
+            None,
+            [
+                Image(uri="wide", width=w, height=h)
+                for w, h in ((1080, 720), (750, 500), (480, 320), (160, 107))
+            ],
+        ),
+    ],
+)
+def test_get_playlist_image(images_getter, mocker, square_picture, images):
+    ig, session = images_getter
+    uri = "tidal:playlist:1-1-1"
+    session.playlist.return_value = mocker.Mock(
+        square_picture=square_picture,
+        picture="wide",
+        **{"image.return_value": "square", "wide_image.return_value": "wide"},
+    )
 
-    def get_uri(dim, *args):
-        nonlocal get_uri_args
-        get_uri_args = [dim] + list(args)
-        if dim != dimensions:
-            raise ValueError()
-        return uri
+    assert ig(uri) == (uri, images)
+
+
+def test_get_mix_image(images_getter, mocker):
+    ig, session = images_getter
+    uri = "tidal:mix:1-1-1"
+    get_mix = mocker.Mock(picture=None, square_picture=None, cover=None)
+    get_mix.image.side_effect = lambda dim: f"http://img/{dim}"
+    session.mix.return_value = get_mix
 
-    get_album.image = get_uri
-    session.album.return_value = get_album
     assert ig(uri) == (
         uri,
         [
-            Image(height=320, uri=uri, width=320)
-        ],  # Why can we just set the dimensions like that?
+            Image(uri=f"http://img/{dim}", width=dim, height=dim)
+            for dim in (1500, 640, 320)
+        ],
     )
-    assert get_uri_args == [dimensions]
 
 
 def test_get_album_no_image(images_getter, mocker):
@@ -64,12 +110,7 @@ def test_get_track_image(images_getter, mocker):
     get_album = mocker.Mock()
     get_album.image.return_value = "tidal:album:1-1-1"
     session.album.return_value = get_album
-    assert ig(uri) == (
-        uri,
-        [
-            Image(height=320, uri="tidal:album:1-1-1", width=320)
-        ],  # Why can we just set the dimensions like that?
-    )
+    assert ig(uri) == (uri, sized_images("tidal:album:1-1-1", ALBUM_SIZES))
     session.album.assert_called_once_with("1-1-1")
 
 
@@ -79,12 +120,7 @@ def test_get_artist_image(images_getter, mocker):
     get_artist = mocker.Mock()
     get_artist.image.return_value = uri
     session.artist.return_value = get_artist
-    assert ig(uri) == (
-        uri,
-        [
-            Image(height=320, uri=uri, width=320)
-        ],  # Why can we just set the dimensions like that?
-    )
+    assert ig(uri) == (uri, sized_images(uri, ARTIST_SIZES))
 
 
 def test_get_artist_no_image_no_picture(images_getter, mocker):
@@ -131,13 +167,63 @@ def test_image_getter_cache(images_getter, mocker):
     get_album.image.return_value = "tidal:album:1-1-1"
     session.album.return_value = get_album
     resp = ig(uri)
-    assert resp == (
-        uri,
-        [
-            Image(height=320, uri="tidal:album:1-1-1", width=320)
-        ],  # Why can we just set the dimensions like that?
-    )
+    assert resp == (uri, sized_images("tidal:album:1-1-1", ALBUM_SIZES))
     ig.cache_update({"tidal:album:1-1-1": resp[1]})
     assert ig(uri) == resp
 
     session.album.assert_called_once_with("1-1-1")
+
+
+def test_image_getter_cache_tiers(mocker, config):
+    session = mocker.Mock()
+    session.album.side_effect = lambda album_id: mocker.Mock(
+        **{"image.return_value": f"http://img/{album_id}"}
+    )
+    ig = ImagesGetter(lambda: session, max_size=2)
+    uris = [f"tidal:album:{i}" for i in range(3)]
+    ig.cache_update(dict(ig(uri) for uri in uris))
+
+    # Only the 2 most recent URIs are kept in memory, the other one is on disk
+    assert [ig(uri)[1][0].uri for uri in reversed(uris)] == [
+        f"http://img/{i}" for i in (2, 1, 0)
+    ]
+
+    assert session.album.call_count == 3
+    assert metrics.counter("images.miss") == 3
+    assert metrics.counter("images.hit.disk") == 1
+    assert metrics.counter("images.hit.memory") == 2
+    assert ig.hit_rate() == 0.5
+    assert metrics.gauge("images.cache.size") == 2
+
+
+def test_images_of_mapped_objects_are_not_fetched(images_getter, mocker):
+    ig, session = images_getter
+    cover = "0a1b2c3d-4e5f-6071-8293-a4b5c6d7e8f9"
+    image_index.add("album", mocker.Mock(id=1, cover=cover))
+
+    assert ig("tidal:track:0:1:2") == (
+        "tidal:track:0:1:2",
+        [
+            Image(
+                uri="https://resources.tidal.com/images/"
+                f"0a1b2c3d/4e5f/6071/8293/a4b5c6d7e8f9/{size}x{size}.jpg",
+                width=size,
+                height=size,
+            )
+            for size in ALBUM_SIZES
+        ],
+    )
+    session.album.assert_not_called()
+    assert metrics.counter("images.hit.index") == 1
+    assert metrics.counter("images.miss") == 0
+
+
+def test_legacy_image_cache_is_removed(config):
+    legacy_cache = LruCache(directory="image")
+    legacy_cache["tidal:album:1"] = sized_images("tidal:album:1", [320])
+    cache_file = legacy_cache.cache_file("tidal:album:1")
+
+    ImagesGetter(lambda: None)
+
+    assert not cache_file.exists()
+    assert not cache_file.parent.parent.exists()
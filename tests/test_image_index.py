@@ -0,0 +1,74 @@
+import pytest
+from mopidy.models import Image
+
+from mopidy_tidal.full_models_mappers import create_mopidy_track
+from mopidy_tidal.image_index import ImageIndex, image_index
+from mopidy_tidal.ref_models_mappers import create_artist
+
+COVER = "0a1b2c3d-4e5f-6071-8293-a4b5c6d7e8f9"
+COVER_PATH = "0a1b2c3d/4e5f/6071/8293/a4b5c6d7e8f9"
+
+
+@pytest.mark.parametrize(
+    "item_type, attr, sizes",
+    [
+        ("album", "cover", [1280, 640, 320, 160, 80]),
+        ("artist", "picture", [750, 480, 320, 160]),
+        ("playlist", "square_picture", [1080, 750, 640, 480, 320, 160]),
+    ],
+)
+def test_images_are_built_from_the_identifier(mocker, item_type, attr, sizes):
+    index = ImageIndex()
+    index.add(item_type, mocker.Mock(id=12, **{attr: COVER}))
+
+    assert index.get_images(f"tidal:{item_type}:12") == [
+        Image(
+            uri=f"https://resources.tidal.com/images/{COVER_PATH}/{size}x{size}.jpg",
+            width=size,
+            height=size,
+        )
+        for size in sizes
+    ]
+
+
+@pytest.mark.parametrize("cover", [None, "", "not-an-id", 42])
+def test_objects_without_identifier_are_not_indexed(mocker, cover):
+    index = ImageIndex()
+    index.add("album", mocker.Mock(id=12, cover=cover))
+
+    assert len(index) == 0
+    assert index.get_images("tidal:album:12") is None
+
+
+def test_unsupported_uris_are_not_resolved(mocker):
+    index = ImageIndex()
+    index.add("album", mocker.Mock(id=12, cover=COVER))
+
+    assert index.get_images("tidal:track:1:12:3") is None
+    assert index.get_images("tidal:mix:12") is None
+    assert index.get_images("tidal:artist:12") is None
+
+
+def test_oldest_objects_are_dropped(mocker):
+    index = ImageIndex(max_size=2)
+    for i in range(3):
+        index.add("album", mocker.Mock(id=i, cover=COVER))
+
+    assert len(index) == 2
+    assert index.get_images("tidal:album:0") is None
+    assert index.get_images("tidal:album:2")
+
+
+def test_mapped_objects_are_indexed(
+    make_tidal_artist, make_tidal_album, make_tidal_track
+):
+    artist = make_tidal_artist(name="Arty", id=1)
+    artist.picture = COVER
+    album = make_tidal_album(name="Alby", id=2, artist=artist, cover=COVER)
+    track = make_tidal_track(name="Track", id=3, artist=artist, album=album)
+
+    create_artist(artist)
+    create_mopidy_track(None, None, track)
+
+    assert image_index.get_images("tidal:artist:1")
+    assert image_index.get_images("tidal:album:2")
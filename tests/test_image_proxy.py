@@ -0,0 +1,115 @@
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mopidy_tidal.image_proxy import ImageFileCache, ImageProxy
+from mopidy_tidal.metrics import metrics
+
+IMAGE_PATH = "0a1b2c3d/4e5f/6071/8293/a4b5c6d7e8f9"
+IMAGE_URL = f"https://resources.tidal.com/images/{IMAGE_PATH}/640x640.jpg"
+
+
+class FakeFetch:
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        return None if "404" in url else url.encode()
+
+
+@pytest.fixture
+def fetch():
+    return FakeFetch()
+
+
+@pytest.fixture
+def proxy(fetch, tmp_path):
+    proxy = ImageProxy(
+        port=0,
+        hostname="localhost",
+        cache=ImageFileCache(tmp_path / "images", max_bytes=1024),
+        fetch=fetch,
+    )
+    yield proxy
+    proxy.stop()
+
+
+def test_cache_evicts_least_recently_used_files(tmp_path):
+    cache = ImageFileCache(tmp_path, max_bytes=10)
+    cache.put("a.jpg", b"aaaa")
+    cache.put("b.jpg", b"bbbb")
+    assert cache.get("a.jpg") == b"aaaa"
+
+    cache.put("c.jpg", b"cccc")
+
+    assert cache.get("b.jpg") is None
+    assert not (tmp_path / "b.jpg").exists()
+    assert cache.size == 8
+    assert metrics.counter("image_proxy.evicted") == 1
+
+
+def test_cache_is_loaded_from_disk(tmp_path):
+    cache = ImageFileCache(tmp_path, max_bytes=10)
+    cache.put("a.jpg", b"aaaa")
+    cache.put("b.jpg", b"bbbb")
+    os.utime(tmp_path / "a.jpg", (0, 0))
+
+    # The least recently used file doesn't fit in a smaller budget
+    loaded = ImageFileCache(tmp_path, max_bytes=6)
+
+    assert len(loaded) == 1
+    assert loaded.get("b.jpg") == b"bbbb"
+    assert not (tmp_path / "a.jpg").exists()
+
+
+def test_tidal_image_urls_are_proxied(proxy):
+    url = proxy.proxy_url(IMAGE_URL)
+
+    assert url == f"{proxy.url}/images/{IMAGE_PATH}/640x640.jpg"
+    assert url.startswith("http://localhost:")
+    assert proxy.proxy_url("https://example.com/a.jpg") == "https://example.com/a.jpg"
+
+
+def test_images_are_downloaded_once(proxy, fetch):
+    path = f"/images/{IMAGE_PATH}/320x320.jpg"
+
+    assert proxy.get_image(path) == proxy.get_image(path)
+    assert fetch.urls == [
+        f"https://resources.tidal.com/images/{IMAGE_PATH}/320x320.jpg"
+    ]
+    assert metrics.counter("image_proxy.miss") == 1
+    assert metrics.counter("image_proxy.hit") == 1
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/images/../../etc/passwd", "/images/abc/640x640.jpg", "/other", "/images/"],
+)
+def test_only_tidal_images_are_proxied(proxy, fetch, path):
+    assert proxy.get_image(path) is None
+    assert fetch.urls == []
+
+
+def test_images_are_served_over_http(proxy):
+    with urllib.request.urlopen(proxy.proxy_url(IMAGE_URL)) as response:
+        assert response.headers["Content-Type"] == "image/jpeg"
+        assert response.read() == IMAGE_URL.encode()
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{proxy.url}/images/{IMAGE_PATH}/404x404.jpg")
+    assert e.value.code == 404
+
+
+def test_remote_urls_are_returned_if_the_proxy_cannot_start(proxy, fetch, tmp_path):
+    proxy.start()
+    busy = ImageProxy(
+        port=proxy._server.server_address[1],
+        hostname="localhost",
+        cache=ImageFileCache(tmp_path / "busy", max_bytes=1024),
+        fetch=fetch,
+    )
+
+    assert busy.proxy_url(IMAGE_URL) == IMAGE_URL
@@ -1,9 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Event
+
 import pytest
 from mopidy.models import Album, Artist, Image, Ref, SearchResult, Track
 from requests import HTTPError
 from tidalapi.playlist import Playlist
+from tidalapi.types import ItemOrder, OrderDirection
 
+from mopidy_tidal import library
 from mopidy_tidal.library import HTTPError, ObjectNotFound, TidalLibraryProvider
+from mopidy_tidal.metrics import metrics
 
 
 @pytest.fixture
@@ -21,20 +27,26 @@ def test_get_track_images(library_provider, backend, mocker):
     get_album.image.return_value = "tidal:album:1-1-1"
     backend.session.album.return_value = get_album
     assert library_provider.get_images(uris) == {
-        uris[0]: [Image(height=320, uri="tidal:album:1-1-1", width=320)]
+        uris[0]: [
+            Image(height=size, uri="tidal:album:1-1-1", width=size)
+            for size in (1280, 640, 320, 160, 80)
+        ]
     }
     backend.session.album.assert_called_once_with("1-1-1")
 
 
-@pytest.mark.xfail
 def test_track_cache(library_provider, backend, mocker):
-    # I think the caching logic is broken here
     uris = ["tidal:track:0-0-0:1-1-1:2-2-2"]
     get_album = mocker.Mock()
     get_album.image.return_value = "tidal:album:1-1-1"
     backend.session.album.return_value = get_album
     first = library_provider.get_images(uris)
-    assert first == {uris[0]: [Image(height=320, uri="tidal:album:1-1-1", width=320)]}
+    assert first == {
+        uris[0]: [
+            Image(height=size, uri="tidal:album:1-1-1", width=size)
+            for size in (1280, 640, 320, 160, 80)
+        ]
+    }
     assert library_provider.get_images(uris) == first
     backend.session.album.assert_called_once_with("1-1-1")
 
@@ -73,6 +85,91 @@ class TestSearch:
         assert tidal_search.mock_calls[0].kwargs["query"] == "nonsuch"
 
 
+class TestLocalSearch:
+    @pytest.fixture
+    def library_provider(self, backend, config):
+        config["tidal"]["local_search"] = True
+        lp = TidalLibraryProvider(backend)
+        for cache_type in {"artist", "album", "track", "playlist"}:
+            getattr(lp, f"_{cache_type}_cache")._persist = False
+        lp._local_search.add(
+            [
+                Artist(uri="tidal:artist:1", name="Arty"),
+                Track(uri="tidal:track:1:2:3", name="Arty Song"),
+            ]
+        )
+        yield lp
+        lp._local_search.close()
+
+    def test_local_results_come_first(self, library_provider, mocker):
+        remote_artist = Artist(uri="tidal:artist:4", name="Arty Party")
+        remote_track = Track(uri="tidal:track:1:2:3", name="Arty Song", length=10)
+        mocker.patch(
+            "mopidy_tidal.search.tidal_search",
+            return_value=([remote_artist], [], [remote_track]),
+        )
+
+        result = library_provider.search(query={"any": ["arty"]})
+
+        assert result.artists == (
+            Artist(uri="tidal:artist:1", name="Arty"),
+            remote_artist,
+        )
+        # Duplicates are listed once, with the TIDAL metadata
+        assert result.tracks == (remote_track,)
+
+    def test_tidal_results_are_indexed(self, library_provider, mocker):
+        remote_artist = Artist(uri="tidal:artist:4", name="Arty Party")
+        tidal_search = mocker.patch(
+            "mopidy_tidal.search.tidal_search", return_value=([remote_artist], [], [])
+        )
+        library_provider.search(query={"any": ["party"]})
+        tidal_search.side_effect = HTTPError("Offline")
+
+        result = library_provider.search(query={"any": ["party"]})
+
+        assert result.artists == (remote_artist,)
+
+    def test_local_results_are_returned_when_tidal_fails(
+        self, library_provider, mocker
+    ):
+        mocker.patch("mopidy_tidal.search.tidal_search", side_effect=HTTPError)
+
+        result = library_provider.search(query={"track_name": ["song"]})
+
+        assert result == SearchResult(
+            tracks=[Track(uri="tidal:track:1:2:3", name="Arty Song")]
+        )
+
+    def test_looked_up_tracks_are_indexed(
+        self, library_provider, session, mocker, tidal_tracks
+    ):
+        mocker.patch("mopidy_tidal.search.tidal_search", side_effect=HTTPError)
+        session.album.return_value.tracks.return_value = tidal_tracks[:1]
+
+        library_provider.lookup("tidal:album:0")
+        result = library_provider.search(query={"album": ["album-0"]})
+
+        assert [t.uri for t in result.tracks] == [tidal_tracks[0].uri]
+
+    def test_favourites_are_indexed(
+        self, library_provider, session, mocker, tidal_albums
+    ):
+        mocker.patch("mopidy_tidal.search.tidal_search", side_effect=HTTPError)
+        session.user.favorites.albums.return_value = tidal_albums
+
+        library_provider.get_distinct("album")
+        result = library_provider.search(query={"album": ["album-1"]})
+
+        assert result.albums == (
+            Album(
+                uri="tidal:album:1",
+                name="Album-1",
+                artists=[Artist(name="Album Artist")],
+            ),
+        )
+
+
 class TestBrowse:
     def test_invalid_uri_returns_empty_list(self, library_provider):
         assert library_provider.browse("") == []
@@ -100,11 +197,10 @@ class TestBrowse:
     def test_my_artists_returns_favourite_artists_from_tidal_as_refs(
         self, library_provider, session, mocker, make_tidal_artist
     ):
-        session.user.favorites.artists = [
+        session.user.favorites.artists.return_value = [
             make_tidal_artist(name="Arty", id=1),
             make_tidal_artist(name="Arthur", id=1_000),
         ]
-        mocker.patch("mopidy_tidal.library.get_items", lambda x: x)
 
         assert library_provider.browse("tidal:my_artists") == [
             Ref(name="Arty", type="artist", uri="tidal:artist:1"),
@@ -114,11 +210,10 @@ class TestBrowse:
     def test_my_albums_returns_favourite_albums_from_tidal_as_refs(
         self, library_provider, session, mocker, make_tidal_album
     ):
-        session.user.favorites.albums = [
+        session.user.favorites.albums.return_value = [
             make_tidal_album(name="Alby", id=7),
             make_tidal_album(name="Albion", id=7_000),
         ]
-        mocker.patch("mopidy_tidal.library.get_items", lambda x: x)
 
         assert library_provider.browse("tidal:my_albums") == [
             Ref(name="Alby", type="album", uri="tidal:album:7"),
@@ -136,17 +231,58 @@ class TestBrowse:
     ):
         artist = make_tidal_artist(name="Arty", id=6)
         album = make_tidal_album(name="Albion", id=7)
-        session.user.favorites.tracks = [
+        session.user.favorites.tracks.return_value = [
             make_tidal_track(name="Tracky", id=12, artist=artist, album=album),
             make_tidal_track(name="Traction", id=13, artist=artist, album=album),
         ]
-        mocker.patch("mopidy_tidal.library.get_items", lambda x: x)
 
         assert library_provider.browse("tidal:my_tracks") == [
             Ref(name="Tracky", type="track", uri="tidal:track:6:7:12"),
             Ref(name="Traction", type="track", uri="tidal:track:6:7:13"),
         ]
 
+    def test_my_tracks_fetches_only_needed_pages_when_count_known(
+        self, library_provider, session, make_tidal_track, make_tidal_album
+    ):
+        album = make_tidal_album(name="Albion", id=7)
+        tracks = [
+            make_tidal_track(id=i, artist=album.artist, album=album) for i in range(150)
+        ]
+        session.user.favorites.get_tracks_count.return_value = 150
+        session.user.favorites.tracks.side_effect = lambda limit, offset, **_: tracks[
+            offset : offset + limit
+        ]
+
+        refs = library_provider.browse("tidal:my_tracks")
+
+        assert [r.uri for r in refs] == [t.uri for t in tracks]
+        assert session.user.favorites.tracks.call_count == 2
+        session.user.favorites.tracks.assert_called_with(
+            100, 100, order=ItemOrder.Date, order_direction=OrderDirection.Descending
+        )
+
+    def test_my_tracks_only_fetches_new_favourites_once_browsed(
+        self, library_provider, session, make_tidal_track, make_tidal_album
+    ):
+        album = make_tidal_album(name="Albion", id=7)
+        tracks = [
+            make_tidal_track(id=i, artist=album.artist, album=album) for i in range(150)
+        ]
+        session.user.favorites.get_tracks_count.return_value = 150
+        session.user.favorites.tracks.side_effect = lambda limit, offset, **_: tracks[
+            offset : offset + limit
+        ]
+        library_provider.browse("tidal:my_tracks")
+        session.user.favorites.tracks.reset_mock()
+        tracks.insert(0, make_tidal_track(id=200, artist=album.artist, album=album))
+
+        refs = library_provider.browse("tidal:my_tracks")
+
+        assert [r.uri for r in refs] == [t.uri for t in tracks]
+        session.user.favorites.tracks.assert_called_once_with(
+            50, 0, order=ItemOrder.Date, order_direction=OrderDirection.Descending
+        )
+
     @pytest.mark.insufficiently_decoupled
     def test_my_playlists_defers_to_backend_as_list(
         self, library_provider, backend, mocker
@@ -245,13 +381,83 @@ class TestGetImages:
 
         images = library_provider.get_images(["tidal:track:0-0-0:1-1-1:2-2-2"])
 
-        assert images == {
-            "tidal:track:0-0-0:1-1-1:2-2-2": [
-                Image(height=320, uri="tidal:album:1-1-1", width=320)
-            ]
-        }
+        # All the sizes of the album cover, largest first
+        assert images["tidal:track:0-0-0:1-1-1:2-2-2"] == [
+            Image(height=size, uri="tidal:album:1-1-1", width=size)
+            for size in (1280, 640, 320, 160, 80)
+        ]
         session.album.assert_called_once_with("1-1-1")
 
+    def test_images_are_cached_in_memory_across_calls(self, library_provider, session):
+        session.artist.return_value.image.return_value = "http://img/1"
+
+        first = library_provider.get_images(["tidal:artist:1"])
+        second = library_provider.get_images(["tidal:artist:1"])
+
+        assert first == second
+        assert first["tidal:artist:1"][0].uri == "http://img/1"
+        session.artist.assert_called_once_with("1")
+        assert metrics.counter("images.hit.memory") == 1
+        assert metrics.gauge("images.hit_rate") == 0.5
+
+    def test_cached_images_are_not_stored_again(
+        self, library_provider, session, mocker
+    ):
+        session.artist.return_value.image.return_value = "http://img/1"
+        session.album.return_value.image.return_value = "http://img/2"
+        storage = library_provider._images_getter._image_cache.storage
+        set_many = mocker.spy(storage, "set_many")
+
+        library_provider.get_images(["tidal:artist:1"])
+        library_provider.get_images(["tidal:artist:1", "tidal:album:2"])
+
+        assert [list(c.args[0]) for c in set_many.call_args_list] == [
+            ["tidal:artist:1"],
+            ["tidal:album:2"],
+        ]
+
+    def test_images_are_fetched_once_per_album(self, library_provider, session):
+        session.album.return_value.image.return_value = "http://img/7"
+        uris = [f"tidal:track:1:7:{i}" for i in range(30)] + ["tidal:album:7"]
+
+        images = library_provider.get_images([*uris, "tidal:track:1", "tidal:moods"])
+
+        assert images.keys() == set(uris)
+        assert {imgs[0].uri for imgs in images.values()} == {"http://img/7"}
+        session.album.assert_called_once_with("7")
+        assert metrics.gauge("images.requested_per_api_call") == 33
+
+    def test_images_are_served_by_the_proxy(self, backend, config, session):
+        config["tidal"].update(
+            image_proxy=True, image_proxy_port=0, image_proxy_hostname="localhost"
+        )
+        library_provider = TidalLibraryProvider(backend)
+        image_url = "https://resources.tidal.com/images/1a/2b/3c/4d/5e/640x640.jpg"
+        session.album.return_value.image.return_value = image_url
+        try:
+            images = library_provider.get_images(["tidal:album:7"])
+        finally:
+            library_provider.close()
+
+        assert images["tidal:album:7"][0].uri.endswith(
+            "/images/1a/2b/3c/4d/5e/640x640.jpg"
+        )
+        assert images["tidal:album:7"][0].uri.startswith("http://localhost:")
+        # The TIDAL URLs are cached
+        assert library_provider._images_getter("tidal:album:7")[1][0].uri == image_url
+
+
+def test_close_stops_image_proxy_and_local_search(backend, config, mocker):
+    config["tidal"].update(image_proxy=True, local_search=True)
+    library_provider = TidalLibraryProvider(backend)
+    stop = mocker.spy(library_provider._image_proxy, "stop")
+    close = mocker.spy(library_provider._local_search, "close")
+
+    library_provider.close()
+
+    stop.assert_called_once_with()
+    close.assert_called_once_with()
+
 
 class TestGetDistinct:
     @pytest.mark.parametrize("field", ("artist", "album", "track"))
@@ -333,6 +539,93 @@ class TestGetDistinct:
         tidal_search.assert_called_once_with(session, query={"any": "any"}, exact=True)
         session.artist.assert_called_once_with("1")
 
+    def test_favourites_are_listed_from_the_index(
+        self, library_provider, session, tidal_artists
+    ):
+        session.user.favorites.artists.return_value = tidal_artists
+
+        first = library_provider.get_distinct("artist")
+        calls = session.user.favorites.artists.call_count
+
+        assert library_provider.get_distinct("artist") == first
+        assert first == {"Artist-0 [TIDAL]", "Artist-1 [TIDAL]"}
+        assert session.user.favorites.artists.call_count == calls
+
+    @pytest.mark.parametrize("field", ("album", "albumartist"))
+    def test_albums_of_favourite_artist_are_merged_with_discography(
+        self, library_provider, session, mocker, field, tidal_albums, tidal_tracks
+    ):
+        artist = mocker.Mock(uri="tidal:artist:1")
+        artist.get_albums.return_value = [mocker.Mock(), tidal_albums[1]]
+        artist.get_albums.return_value[0].name = "Album-2"
+        session.artist.return_value = artist
+        tidal_search = mocker.patch(
+            "mopidy_tidal.search.tidal_search", return_value=([artist], [], [])
+        )
+        session.user.favorites.albums.return_value = tidal_albums
+        session.user.favorites.tracks.return_value = tidal_tracks
+
+        res = library_provider.get_distinct(
+            field, query={"artist": ["Artist-1 [TIDAL]"]}
+        )
+
+        assert res == {"Album-1 [TIDAL]", "Album-2 [TIDAL]"}
+        tidal_search.assert_called_once()
+
+    def test_albums_are_listed_from_memory_on_a_warm_index(
+        self, library_provider, session, mocker, tidal_albums, tidal_tracks
+    ):
+        artist = mocker.Mock(uri="tidal:artist:1")
+        artist.get_albums.return_value = tidal_albums
+        session.artist.return_value = artist
+        mocker.patch(
+            "mopidy_tidal.search.tidal_search", return_value=([artist], [], [])
+        )
+        session.user.favorites.albums.return_value = tidal_albums
+        session.user.favorites.tracks.return_value = tidal_tracks
+        query = {"artist": ["Artist-1 [TIDAL]"]}
+        first = library_provider.get_distinct("album", query=query)
+        session.reset_mock()
+        artist.reset_mock()
+
+        assert library_provider.get_distinct("album", query=query) == first
+        assert session.mock_calls == []
+        assert artist.mock_calls == []
+
+    def test_stale_discography_is_refreshed_in_the_background(
+        self, library_provider, session, mocker, wait_for, make_mock
+    ):
+        artist = mocker.Mock(uri="tidal:artist:1")
+        artist.get_albums.return_value = [make_mock(name="Old")]
+        session.artist.return_value = artist
+        mocker.patch(
+            "mopidy_tidal.search.tidal_search", return_value=([artist], [], [])
+        )
+        now = mocker.patch("mopidy_tidal.library.time").time
+        now.return_value = 1000
+        library_provider.get_distinct("album", query={"any": "any"})
+        artist.get_albums.return_value = [make_mock(name="New")]
+        now.return_value = 1000 + library.DISCOGRAPHY_TTL
+
+        # The stale names are returned while the albums are fetched again
+        res = library_provider.get_distinct("album", query={"any": "any"})
+        assert res == {"Old [TIDAL]"}
+
+        wait_for(lambda: artist.get_albums.call_count == 2)
+        wait_for(
+            lambda: library_provider.get_distinct("album", query={"any": "any"})
+            == {"New [TIDAL]"}
+        )
+
+    def test_tracks_are_filtered_by_album(
+        self, library_provider, session, tidal_tracks
+    ):
+        session.user.favorites.tracks.return_value = tidal_tracks
+
+        res = library_provider.get_distinct("track", query={"album": ["Album-0"]})
+
+        assert res == {"Track-0 [TIDAL]"}
+
 
 class TestLookup:
     def test_raises_when_no_uri_passed(self, library_provider):
@@ -474,7 +767,8 @@ def test_specific_artist(
     ]
     artist.get_top_tracks.assert_called_once_with()
     artist.get_albums.assert_called_once_with()
-    session.artist.assert_has_calls([mocker.call("1"), mocker.call("1")])
+    artist.get_ep_singles.assert_not_called()
+    session.artist.assert_called_once_with("1")
 
 
 def test_lookup_track(library_provider, backend, mocker, tidal_tracks, compare):
@@ -607,3 +901,155 @@ def test_lookup_playlist_cached(
 
     session.playlist.assert_called_with("99")
     assert len(playlist.tracks.mock_calls) == 5, "Didn't run five fetches in parallel."
+
+
+def test_repeated_uri_is_looked_up_once(
+    library_provider, backend, mocker, tidal_tracks, wait_for
+):
+    release = Event()
+
+    def get_tracks():
+        release.wait(5)
+        return tidal_tracks
+
+    album = mocker.Mock(**{"tracks.side_effect": get_tracks})
+    backend.session.album.return_value = album
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(library_provider.lookup, ["tidal:album:1"] * 3)
+        try:
+            wait_for(lambda: metrics.counter("library.lookup.coalesced") >= 2)
+        finally:
+            release.set()
+
+    tracks = future.result()
+    assert len(tracks) == 3 * len(tidal_tracks)
+    album.tracks.assert_called_once_with()
+
+
+def test_lookup_tracks_fetches_each_album_once(
+    library_provider, backend, make_tidal_album, make_tidal_artist
+):
+    artist = make_tidal_artist(name="Artist", id=0)
+    albums = {
+        str(album_id): make_tidal_album(
+            name=f"Album-{album_id}",
+            id=album_id,
+            tracks=[{"id": album_id * 10 + i, "artist": artist} for i in range(3)],
+        )
+        for album_id in (1, 2)
+    }
+    backend.session.album.side_effect = albums.__getitem__
+    uris = [
+        "tidal:track:0:2:21",
+        "tidal:track:0:1:10",
+        "tidal:track:0:2:20",
+        "tidal:track:0:1:12",
+        "tidal:track:0:1:999",  # Not on the album
+    ]
+
+    res = library_provider.lookup(uris)
+
+    assert [t.uri.split(":")[-1] for t in res] == ["21", "10", "20", "12"]
+    assert sorted(c.args for c in backend.session.album.mock_calls) == [
+        ("1",),
+        ("2",),
+    ]
+    for album in albums.values():
+        album.tracks.assert_called_once_with()
+
+
+def test_lookup_tracks_skips_albums_which_cannot_be_fetched(
+    library_provider, backend, mocker, tidal_tracks
+):
+    album = mocker.Mock()
+    album.tracks.return_value = tidal_tracks
+    backend.session.album.side_effect = lambda album_id: (
+        album
+        if album_id == "1"
+        else mocker.Mock(tracks=mocker.Mock(side_effect=HTTPError))
+    )
+
+    res = library_provider.lookup(["tidal:track:0:2:5", "tidal:track:0:1:0"])
+
+    assert [t.uri for t in res] == [tidal_tracks[0].uri]
+
+
+def test_lookup_multiple_uris_concurrently_in_order(
+    library_provider, backend, mocker, make_tidal_album, make_tidal_artist
+):
+    artist = make_tidal_artist(name="Artist", id=0)
+    albums = {
+        str(album_id): make_tidal_album(
+            name=f"Album-{album_id}",
+            id=album_id,
+            tracks=[{"id": album_id * 10, "artist": artist}],
+        )
+        for album_id in (1, 2, 3)
+    }
+    # Both albums must be fetched at the same time to get past the barrier
+    barrier = Barrier(2, timeout=5)
+    for album_id in ("1", "3"):
+        album_tracks = albums[album_id].tracks.return_value
+        albums[album_id].tracks.side_effect = (
+            lambda tracks=album_tracks: barrier.wait() is not None and tracks
+        )
+    albums["2"].tracks.side_effect = HTTPError
+    backend.session.album.side_effect = albums.__getitem__
+    update = mocker.spy(library_provider._album_cache, "update")
+
+    res = library_provider.lookup(["tidal:album:1", "tidal:album:2", "tidal:album:3"])
+
+    assert [t.uri for t in res] == ["tidal:track:0:1:10", "tidal:track:0:3:30"]
+    update.assert_called_once()
+    assert sorted(update.call_args.args[0]) == ["tidal:album:1", "tidal:album:3"]
+
+
+def test_browse_page_category_reuses_page(library_provider, session, mocker, config):
+    config["tidal"]["page_cache_ttl_secs"] = 300
+    category = mocker.Mock(title="Category", items=[])
+    session.home.return_value = mocker.Mock(categories=[category])
+
+    assert library_provider.browse("tidal:home") == [
+        Ref.directory(uri="tidal:home:category:0", name="Category")
+    ]
+    assert library_provider.browse("tidal:home:category:0") == []
+    assert library_provider.browse("tidal:home") != []
+
+    session.home.assert_called_once_with()
+
+
+def test_specific_artist_with_eps(
+    library_provider, backend, config, tidal_albums, tidal_artists
+):
+    config["tidal"]["browse_artist_eps"] = True
+    artist = tidal_artists[0]
+    artist.get_albums.return_value = tidal_albums[:1]
+    artist.get_ep_singles.return_value = tidal_albums[1:]
+    backend.session.artist.return_value = artist
+
+    assert library_provider.browse("tidal:artist:1") == [
+        Ref(name="Album-0", type="album", uri="tidal:album:0"),
+        Ref(name="Album-1", type="album", uri="tidal:album:1"),
+        Ref(name="Track-100", type="track", uri="tidal:track:0:7:100"),
+    ]
+
+
+def test_browsed_artist_is_reused_by_lookup(
+    library_provider, backend, tidal_albums, tidal_artists
+):
+    artist = tidal_artists[0]
+    artist.get_albums.return_value = tidal_albums
+    backend.session.artist.return_value = artist
+
+    library_provider.browse("tidal:artist:1")
+    tracks = library_provider.lookup("tidal:artist:1")
+
+    assert [t.uri for t in tracks] == ["tidal:track:0:7:100"]
+    backend.session.artist.assert_called_once_with("1")
+
+
+def test_browse_missing_artist(library_provider, backend):
+    backend.session.artist.side_effect = ObjectNotFound
+
+    assert library_provider.browse("tidal:artist:1") == []
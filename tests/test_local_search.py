@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+from mopidy.models import Album, Artist, Track
+
+from mopidy_tidal.favorites import FavoriteAlbum, FavoriteArtist, FavoriteTrack
+from mopidy_tidal.local_search import (
+    LocalSearchIndex,
+    create_local_search_index,
+    get_local_search,
+)
+from mopidy_tidal.metrics import metrics
+
+
+@pytest.fixture
+def artist():
+    return Artist(uri="tidal:artist:1", name="Daft Punk")
+
+
+@pytest.fixture
+def album(artist):
+    return Album(uri="tidal:album:2", name="Discovery", artists=[artist])
+
+
+@pytest.fixture
+def tracks(artist, album):
+    return [
+        Track(
+            uri=f"tidal:track:1:2:{i}",
+            name=name,
+            artists=[artist],
+            album=album,
+            length=1000,
+        )
+        for i, name in enumerate(["One More Time", "Aerodynamic", "Digital Love"])
+    ]
+
+
+@pytest.fixture
+def index(tmp_path, artist, album, tracks):
+    index = LocalSearchIndex(tmp_path / "search.sqlite3")
+    index.add([artist, album, *tracks])
+    yield index
+    index.close()
+
+
+def uris(results):
+    return tuple({m.uri for m in items} for items in results)
+
+
+def test_any_field_matches_words_as_prefixes(index, artist, album, tracks):
+    assert uris(index.search({"any": ["daft"]})) == uris(([artist], [album], tracks))
+    assert uris(index.search({"any": ["daft disc"]})) == uris(([], [album], tracks))
+    assert index.search({"any": ["one tim"]}) == ([], [], [tracks[0]])
+    assert metrics.counter("local_search.results") == 10
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ({"artist": ["daft"]}, (1, 1, 3)),
+        ({"albumartist": ["Daft Punk [TIDAL]"]}, (1, 1, 3)),
+        ({"album": ["discovery"]}, (0, 1, 3)),
+        ({"track_name": ["love"]}, (0, 0, 1)),
+        ({"track_name": ["love"], "artist": ["daft"]}, (0, 0, 1)),
+        ({"track_name": ["daft"]}, (0, 0, 0)),
+        ({"genre": ["electro"]}, (0, 0, 0)),
+        ({"artist": ["daft"], "date": ["2001"]}, (0, 0, 0)),
+        ({"any": ['"']}, (0, 0, 0)),
+    ],
+)
+def test_fields_match_their_columns(index, query, expected):
+    assert tuple(map(len, index.search(query))) == expected
+
+
+def test_diacritics_are_ignored(index, tmp_path):
+    track = Track(uri="tidal:track:1:3:1", name="Café Olé")
+    index.add([track])
+
+    assert index.search({"any": ["cafe ole"]}) == ([], [], [track])
+
+
+def test_exact_search_matches_whole_names(index, tracks):
+    assert index.search({"track_name": ["digital love"]}, exact=True) == (
+        [],
+        [],
+        [tracks[2]],
+    )
+    assert index.search({"track_name": ["digital"]}, exact=True) == ([], [], [])
+
+
+def test_replaced_items_are_reindexed(index, tracks):
+    index.add([tracks[0].replace(name="Two More Times")])
+
+    assert index.search({"any": ["one"]}) == ([], [], [])
+    assert [t.name for t in index.search({"any": ["two"]})[2]] == ["Two More Times"]
+
+
+def test_favourites_do_not_replace_indexed_items(index, tracks):
+    index.add_favorites(
+        [
+            FavoriteArtist("1", "Daft Punk"),
+            FavoriteAlbum("3", "Homework", ("Daft Punk",)),
+            FavoriteTrack("0", "One More Time", "1", ("Daft Punk",), "2", "Discovery"),
+        ]
+    )
+
+    artists, albums, results = index.search({"artist": ["daft"]})
+
+    assert [a.name for a in albums] == ["Discovery", "Homework"]
+    assert albums[1].artists == {Artist(name="Daft Punk")}
+    # The looked up track is kept
+    assert tracks[0] in results
+
+
+def test_index_is_persisted(index, tmp_path, tracks):
+    other = LocalSearchIndex(tmp_path / "search.sqlite3")
+
+    assert other.search({"track_name": ["aero"]}) == ([], [], [tracks[1]])
+    other.close()
+
+
+def test_config(config):
+    assert get_local_search() is False
+
+    config["tidal"]["local_search"] = True
+    assert get_local_search() is True
+
+
+def test_create_local_search_index(config):
+    assert create_local_search_index() is None
+
+    config["tidal"]["local_search"] = True
+    index = create_local_search_index()
+    assert isinstance(index, LocalSearchIndex)
+    index.close()
+
+
+def test_local_search_is_disabled_without_fts5(config, mocker, caplog):
+    config["tidal"]["local_search"] = True
+    mocker.patch.object(
+        LocalSearchIndex,
+        "_create_tables",
+        side_effect=sqlite3.OperationalError("no such module: fts5"),
+    )
+
+    assert create_local_search_index() is None
+    assert "Local search is disabled" in caplog.text
@@ -1,10 +1,21 @@
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from time import sleep
 
 import pytest
 
-from mopidy_tidal.lru_cache import LruCache, SearchCache
+from mopidy_tidal.cache_storage import (
+    CacheStorage,
+    SqliteCacheStorage,
+    WriteBehindStorage,
+    _write_behind_storages,
+    close_all,
+    flush_all,
+)
+from mopidy_tidal.lru_cache import LruCache, SearchCache, remove_cache
+from mopidy_tidal.metrics import metrics
 
 
 @pytest.fixture
@@ -22,6 +33,19 @@ def lru_cache(request) -> LruCache:
     return LruCache(max_size=8, persist=request.param, directory="cache")
 
 
+@pytest.fixture
+def sqlite_backend(config):
+    config["tidal"]["cache_backend"] = "sqlite"
+
+
+@pytest.fixture
+def write_behind(config):
+    config["tidal"]["cache_write_behind"] = True
+    yield
+    for storage in list(_write_behind_storages):
+        storage.close()
+
+
 def test_config_stored_on_cache():
     l = LruCache(max_size=1678, persist=True, directory="cache")
 
@@ -111,6 +135,213 @@ class TestDiskPersistence:
         assert new_cache["tidal:uri:none"] == None
 
 
+class TestSqlitePersistence:
+    def test_uses_sqlite_storage_when_configured(self, sqlite_backend, tmp_path):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache["tidal:uri:val"] = "hi"
+
+        assert isinstance(cache.storage, SqliteCacheStorage)
+        assert (tmp_path / "tidal" / "cache.sqlite3").is_file()
+        assert not list((tmp_path / "tidal").rglob("*.cache"))
+
+    def test_values_persisted_between_caches(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.update(
+            {"tidal:uri:val": "hi", "tidal:uri:otherval": 17, "tidal:uri:none": None}
+        )
+        del cache
+
+        new_cache = LruCache(max_size=8, persist=True, directory="cache")
+
+        assert new_cache["tidal:uri:val"] == "hi"
+        assert new_cache["tidal:uri:otherval"] == 17
+        assert new_cache["tidal:uri:none"] is None
+
+    def test_caches_in_different_directories_do_not_collide(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        other_cache = LruCache(max_size=8, persist=True, directory="other")
+        cache["tidal:uri:val"] = "hi"
+
+        with pytest.raises(KeyError):
+            other_cache["tidal:uri:val"]
+
+    def test_prune_removes_entries(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.update({"tidal:uri:val": "hi", "tidal:uri:otherval": 17})
+        cache.prune("tidal:uri:val")
+        del cache
+
+        new_cache = LruCache(max_size=8, persist=True, directory="cache")
+        assert new_cache["tidal:uri:otherval"] == 17
+        with pytest.raises(KeyError):
+            new_cache["tidal:uri:val"]
+
+    def test_raises_keyerror_if_entry_corrupted(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache["tidal:uri:val"] = "hi"
+        cache.storage._conn.execute("UPDATE cache SET value = x'00'")
+        cache.pop("tidal:uri:val")
+
+        with pytest.raises(KeyError):
+            cache["tidal:uri:val"]
+
+    def test_update_is_a_single_transaction(self, sqlite_backend, mocker):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        set_many = mocker.spy(cache.storage, "set_many")
+
+        cache.update({f"tidal:uri:{val}": val for val in range(4)})
+
+        set_many.assert_called_once()
+
+    def test_imports_existing_file_cache(self, config):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.update({"tidal:uri:val": "hi", "tidal:uri:1-2-3": 17})
+        del cache
+
+        config["tidal"]["cache_backend"] = "sqlite"
+        new_cache = LruCache(max_size=8, persist=True, directory="cache")
+
+        assert isinstance(new_cache.storage, SqliteCacheStorage)
+        assert new_cache["tidal:uri:val"] == "hi"
+        assert new_cache["tidal:uri:1-2-3"] == 17
+
+    def test_remove_cache_deletes_entries(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        other = LruCache(max_size=8, persist=True, directory="other")
+        cache["tidal:uri:val"] = "hi"
+        other["tidal:uri:val"] = "there"
+
+        remove_cache("cache")
+
+        with pytest.raises(KeyError):
+            cache.storage.get("tidal:uri:val")
+        assert other.storage.get("tidal:uri:val") == "there"
+
+    def test_storages_closed_by_close_all(self, sqlite_backend):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache["tidal:uri:val"] = "hi"
+
+        close_all()
+
+        assert cache.storage._conn is None
+
+    def test_closed_storages_are_opened_again(self, sqlite_backend, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache["tidal:uri:val"] = "hi"
+        close_all()
+
+        # e.g. the backend is started again in the same process
+        cache["tidal:uri:otherval"] = 17
+        cache.prune("tidal:uri:val")
+
+        new_cache = LruCache(max_size=8, persist=True, directory="cache")
+        assert new_cache["tidal:uri:otherval"] == 17
+        with pytest.raises(KeyError):
+            new_cache["tidal:uri:val"]
+
+
+class TestWriteBehind:
+    def test_uses_write_behind_storage_when_configured(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+
+        assert isinstance(cache.storage, WriteBehindStorage)
+
+    def test_values_visible_before_being_persisted(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        cache["tidal:uri:val"] = "hi"
+        cache.pop("tidal:uri:val")
+
+        assert cache["tidal:uri:val"] == "hi"
+
+    def test_values_persisted_after_flush(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        cache.update({"tidal:uri:val": "hi", "tidal:uri:otherval": 17})
+        assert not cache.cache_file("tidal:uri:val").exists()
+        assert cache.storage.queue_depth == 2
+
+        flush_all()
+
+        assert cache.storage.queue_depth == 0
+        assert cache.cache_file("tidal:uri:val").exists()
+        assert metrics.counter("cache.write_behind.flushed") == 2
+        assert metrics.timing("cache.write_behind.flush")["count"] == 1
+
+    def test_values_persisted_by_close_all(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        cache["tidal:uri:val"] = "hi"
+
+        close_all()
+
+        assert cache.cache_file("tidal:uri:val").exists()
+
+    def test_queue_depth_gauge_is_the_total_of_all_storages(self, write_behind):
+        caches = [
+            LruCache(max_size=8, persist=True, directory=directory)
+            for directory in ("cache", "other")
+        ]
+        for cache in caches:
+            cache.storage._flush_interval = 60
+        caches[0].update({"tidal:uri:val": "hi", "tidal:uri:otherval": 17})
+        caches[1]["tidal:uri:val"] = "hi"
+
+        assert metrics.gauge("cache.write_behind.queue_depth") == 3
+
+        caches[1].storage.flush()
+        assert metrics.gauge("cache.write_behind.queue_depth") == 2
+
+        caches[0].prune("tidal:uri:val")
+        assert metrics.gauge("cache.write_behind.queue_depth") == 1
+
+    def test_writes_to_same_key_are_coalesced(self, write_behind, mocker):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        set_many = mocker.spy(cache.storage._storage, "set_many")
+        for val in range(3):
+            cache["tidal:uri:val"] = val
+
+        cache.storage.flush()
+
+        set_many.assert_called_once_with({"tidal:uri:val": 2})
+
+    def test_background_writer_persists_values(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 0.01
+        cache["tidal:uri:val"] = "hi"
+
+        for _ in range(100):
+            if cache.cache_file("tidal:uri:val").exists():
+                break
+            sleep(0.01)
+
+        assert cache.cache_file("tidal:uri:val").exists()
+
+    def test_prune_drops_pending_values(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        cache["tidal:uri:val"] = "hi"
+
+        cache.prune("tidal:uri:val")
+        cache.storage.flush()
+
+        assert not cache.cache_file("tidal:uri:val").exists()
+        with pytest.raises(KeyError):
+            cache["tidal:uri:val"]
+
+    def test_close_persists_values_and_writes_through(self, write_behind):
+        cache = LruCache(max_size=8, persist=True, directory="cache")
+        cache.storage._flush_interval = 60
+        cache["tidal:uri:val"] = "hi"
+
+        cache.storage.close()
+        assert cache.cache_file("tidal:uri:val").exists()
+
+        cache["tidal:uri:otherval"] = 17
+        assert cache.cache_file("tidal:uri:otherval").exists()
+
+
 def test_raises_key_error_if_target_missing(lru_cache):
     with pytest.raises(KeyError):
         lru_cache["tidal:uri:nonsuch"]
@@ -238,3 +469,34 @@ def test_cache_grows_indefinitely_if_max_size_zero():
     cache.update({f"tidal:uri:{val}": val for val in range(2**12)})
 
     assert len(cache) == 2**12
+
+
+class SlowLruCache(LruCache):
+    """Cache that lets other threads run while it drops entries."""
+
+    def popitem(self, last=True):
+        sleep(0.0001)
+        return super().popitem(last)
+
+    def __delitem__(self, key):
+        sleep(0.0001)
+        super().__delitem__(key)
+
+
+@pytest.mark.parametrize("persist", (True, False))
+def test_concurrent_writes_keep_the_cache_consistent(persist: bool):
+    cache = SlowLruCache(max_size=4, persist=persist)
+
+    def write(n):
+        for val in range(300):
+            cache[f"tidal:uri:{val % 6}"] = n
+
+    with ThreadPoolExecutor(8) as pool:
+        assert [*pool.map(write, range(8))] == [None] * 8
+
+    assert len(cache) == 4
+
+
+def test_cache_storage_is_abstract():
+    with pytest.raises(TypeError):
+        CacheStorage()
@@ -0,0 +1,119 @@
+import time
+from threading import current_thread
+
+import pytest
+
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.page_cache import PageCache
+from mopidy_tidal.workers import WorkerPools
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def page_cache(clock, config):
+    config["tidal"]["page_cache_ttl_secs"] = 60
+    return PageCache(max_stale=600, clock=clock)
+
+
+def test_fresh_pages_are_cached(page_cache, clock, mocker):
+    fetch = mocker.Mock(return_value=mocker.sentinel.page)
+
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.page
+    clock.now = 59
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.page
+
+    fetch.assert_called_once_with()
+    assert metrics.counter("page_cache.hit") == 1
+    assert metrics.counter("page_cache.miss") == 1
+
+
+def test_stale_pages_are_served_while_refreshed(page_cache, clock, mocker):
+    fetch = mocker.Mock(side_effect=[mocker.sentinel.old, mocker.sentinel.new])
+    page_cache.get("tidal:home", fetch)
+    clock.now = 61
+
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.old
+
+    # The page is refreshed in the background
+    deadline = time.monotonic() + 5
+    while page_cache.get("tidal:home", fetch) is not mocker.sentinel.new:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert fetch.call_count == 2
+    assert metrics.counter("page_cache.stale") >= 1
+
+
+def test_pages_are_refreshed_on_the_background_pool(
+    page_cache, clock, mocker, wait_for
+):
+    threads = []
+    fetch = mocker.Mock(side_effect=lambda: threads.append(current_thread().name))
+    page_cache.get("tidal:home", fetch)
+    clock.now = 61
+
+    pools = WorkerPools()
+    pools.start()
+    try:
+        page_cache.get("tidal:home", fetch)
+        wait_for(lambda: len(threads) == 2)
+    finally:
+        pools.shutdown()
+
+    assert threads[1].startswith("mopidy-tidal-background-")
+
+
+def test_refresh_is_retried_if_it_cannot_be_started(page_cache, clock, mocker):
+    fetch = mocker.Mock(side_effect=[mocker.sentinel.old, mocker.sentinel.new])
+    page_cache.get("tidal:home", fetch)
+    clock.now = 61
+    run = mocker.patch(
+        "mopidy_tidal.page_cache.run_in_background",
+        side_effect=[RuntimeError("shut down"), None],
+    )
+
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.old
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.old
+    assert run.call_count == 2
+
+
+def test_too_stale_pages_are_fetched_again(page_cache, clock, mocker):
+    fetch = mocker.Mock(side_effect=[mocker.sentinel.old, mocker.sentinel.new])
+
+    page_cache.get("tidal:home", fetch)
+    clock.now = 601
+
+    assert page_cache.get("tidal:home", fetch) is mocker.sentinel.new
+
+
+def test_zero_ttl_disables_cache(page_cache, config, mocker):
+    config["tidal"]["page_cache_ttl_secs"] = 0
+    fetch = mocker.Mock(return_value=mocker.sentinel.page)
+
+    page_cache.get("tidal:home", fetch)
+    page_cache.get("tidal:home", fetch)
+
+    assert fetch.call_count == 2
+
+
+def test_size_is_bounded(clock, config, mocker):
+    page_cache = PageCache(max_size=2, clock=clock)
+    fetch = mocker.Mock(side_effect=lambda: object())
+
+    for key in ("a", "b", "c", "a"):
+        page_cache.get(key, fetch)
+
+    # "a" was evicted by "c"
+    assert fetch.call_count == 4
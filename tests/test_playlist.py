@@ -1,13 +1,14 @@
 from copy import deepcopy
+from threading import Barrier
 from time import sleep
 
 import pytest
-from mopidy.models import Track
 from requests import HTTPError
 
 from mopidy_tidal.playlists import (
     MopidyPlaylist,
     PlaylistCache,
+    PlaylistMetadata,
     Ref,
     TidalPlaylist,
     TidalPlaylistsProvider,
@@ -19,6 +20,9 @@ def tpp(mocker):
     mocker.patch("mopidy_tidal.playlists.Timer")
     backend = mocker.Mock()
     backend._config = {"tidal": {"playlist_cache_refresh_secs": 0}}
+    # The user has no playlists, unless a test lists some
+    backend.session.user.playlists.return_value = []
+    backend.session.user.favorites.playlists.return_value = []
 
     tpp = TidalPlaylistsProvider(backend)
     tpp._playlists = PlaylistCache(persist=False)
@@ -208,19 +212,20 @@ def test_refresh_metadata(tpp, mocker, tidal_playlists):
 
     listener.send.assert_called_once_with("playlists_loaded")
 
-    tracks = [Track(uri="tidal:track:0:0:0")] * 2
     assert dict(tpp._playlists_metadata) == {
-        "tidal:playlist:101": MopidyPlaylist(
-            last_modified=10,
-            name="Playlist-101",
+        "tidal:playlist:101": PlaylistMetadata(
             uri="tidal:playlist:101",
-            tracks=tracks,
-        ),
-        "tidal:playlist:222": MopidyPlaylist(
+            name="Playlist-101",
+            num_tracks=2,
             last_modified=10,
-            name="Playlist-222",
+            duration=sum(t.duration for t in tidal_playlists[0].tracks),
+        ),
+        "tidal:playlist:222": PlaylistMetadata(
             uri="tidal:playlist:222",
-            tracks=tracks[:1],
+            name="Playlist-222",
+            num_tracks=len(tidal_playlists[1].tracks),
+            last_modified=10,
+            duration=sum(t.duration for t in tidal_playlists[1].tracks),
         ),
     }
 
@@ -275,6 +280,45 @@ def test_refresh(tpp, mocker):
     api_test(tpp, mocker, api_method, tp)
 
 
+def test_refresh_fetches_playlists_concurrently(tpp, mocker, tidal_playlists):
+    tpp, backend = tpp
+    mocker.patch("mopidy_tidal.playlists.backend.BackendListener")
+    tpp._current_tidal_playlists = tidal_playlists
+    # Each playlist waits for the other one to be fetched as well
+    barrier = Barrier(len(tidal_playlists), timeout=5)
+    for pl in tidal_playlists:
+        items = list(pl.tracks)
+
+        def get_tracks(limit, offset, items=items):
+            if offset == 0:
+                barrier.wait()
+            return items[offset : offset + limit]
+
+        pl.tracks = mocker.Mock(side_effect=get_tracks, __name__="get_tracks")
+
+    tpp.refresh(include_items=True)
+
+    assert len(tpp._playlists) == 2
+    assert [t.uri for t in tpp._playlists["tidal:playlist:222"].tracks] == [
+        t.uri for t in items
+    ]
+
+
+def test_refresh_fails_if_a_playlist_fails(tpp, mocker, tidal_playlists):
+    tpp, backend = tpp
+    mocker.patch("mopidy_tidal.playlists.backend.BackendListener")
+    tpp._current_tidal_playlists = tidal_playlists
+    tidal_playlists[0].tracks = mocker.Mock(return_value=[], __name__="get_tracks")
+    tidal_playlists[1].tracks = mocker.Mock(
+        side_effect=HTTPError("Failed"), __name__="get_tracks"
+    )
+
+    with pytest.raises(HTTPError):
+        tpp.refresh(include_items=True)
+
+    assert not len(tpp._playlists)
+
+
 def test_as_list(tpp, mocker, tidal_playlists):
     tpp, backend = tpp
     mocker.patch("mopidy_tidal.playlists.get_items", lambda x: x)
@@ -332,11 +376,19 @@ def test_update_changes(tpp, mocker, tidal_playlists):
     tpp, backend = tpp
     tpp._playlists_metadata.update(
         {
-            "tidal:playlist:101": MopidyPlaylist(
-                last_modified=10, name="Playlist-101", uri="tidal:playlist:101"
+            "tidal:playlist:101": PlaylistMetadata(
+                uri="tidal:playlist:101",
+                name="Playlist-101",
+                num_tracks=1,
+                last_modified=10,
+                duration=100,
             ),
-            "tidal:playlist:222": MopidyPlaylist(
-                last_modified=9, name="Playlist-222", uri="tidal:playlist:222"
+            "tidal:playlist:222": PlaylistMetadata(
+                uri="tidal:playlist:222",
+                name="Playlist-222",
+                num_tracks=1,
+                last_modified=9,
+                duration=100,
             ),
         }
     )
@@ -354,11 +406,19 @@ def test_update_no_changes(tpp, mocker, tidal_playlists):
     tpp, backend = tpp
     tpp._playlists_metadata.update(
         {
-            "tidal:playlist:101": MopidyPlaylist(
-                last_modified=10, name="Playlist-101", uri="tidal:playlist:101"
+            "tidal:playlist:101": PlaylistMetadata(
+                uri="tidal:playlist:101",
+                name="Playlist-101",
+                num_tracks=1,
+                last_modified=10,
+                duration=100,
             ),
-            "tidal:playlist:222": MopidyPlaylist(
-                last_modified=10, name="Playlist-222", uri="tidal:playlist:222"
+            "tidal:playlist:222": PlaylistMetadata(
+                uri="tidal:playlist:222",
+                name="Playlist-222",
+                num_tracks=1,
+                last_modified=10,
+                duration=100,
             ),
         }
     )
@@ -381,6 +441,77 @@ def test_lookup_modified_cached(tpp, mocker):
     assert tpp.lookup("tidal:playlist:0:1:2") is playlist
 
 
+def test_lookup_checks_changes_from_listing(tpp, mocker, tidal_playlists, wait_for):
+    tpp, backend = tpp
+    backend.session.user.playlists.return_value = tidal_playlists
+    backend.session.playlist.return_value = mocker.Mock(last_updated=10)
+    playlist = mocker.MagicMock(uri="tidal:playlist:101", last_modified=10)
+    tpp._playlists["tidal:playlist:101"] = playlist
+
+    # Before the playlists are listed (in the background), the playlist
+    # itself is checked
+    assert tpp.lookup("tidal:playlist:101") is playlist
+    wait_for(lambda: tpp._listed_at is not None)
+    assert tpp.lookup("tidal:playlist:101") is playlist
+
+    backend.session.user.playlists.assert_called_once()
+    backend.session.playlist.assert_called_once_with("101")
+
+
+def test_lookup_refreshes_playlist_changed_in_listing(tpp, mocker, tidal_playlists):
+    tpp, backend = tpp
+    backend.session.user.playlists.return_value = tidal_playlists
+    refresh = mocker.patch.object(tpp, "refresh")
+    playlist = mocker.MagicMock(uri="tidal:playlist:101", last_modified=9)
+    tpp._playlists["tidal:playlist:101"] = playlist
+    tpp._list_playlists()
+
+    tpp.lookup("tidal:playlist:101")
+
+    refresh.assert_called_once_with("tidal:playlist:101", include_items=True)
+    backend.session.playlist.assert_not_called()
+
+
+def test_lookup_lists_playlists_again_in_background_when_outdated(
+    tpp, mocker, tidal_playlists
+):
+    tpp, backend = tpp
+    backend.session.user.playlists.return_value = tidal_playlists
+    playlist = mocker.MagicMock(uri="tidal:playlist:101", last_modified=10)
+    tpp._playlists["tidal:playlist:101"] = playlist
+    tpp._list_playlists()
+    tpp._listed_at -= 61
+    run_in_background = mocker.patch("mopidy_tidal.playlists.run_in_background")
+    backend.session.reset_mock()
+
+    # The outdated listing is used, and the playlists aren't listed inline
+    assert tpp.lookup("tidal:playlist:101") is playlist
+    assert tpp.lookup("tidal:playlist:101") is playlist
+    backend.session.user.playlists.assert_not_called()
+    backend.session.user.favorites.playlists.assert_not_called()
+    backend.session.playlist.assert_not_called()
+
+    # ...but in the background, once
+    run_in_background.assert_called_once()
+    name, list_playlists = run_in_background.call_args.args
+    assert name == "background"
+    list_playlists()
+    backend.session.user.playlists.assert_called_once()
+
+
+def test_lookup_without_listing_checks_playlist(tpp, mocker, tidal_playlists):
+    tpp, backend = tpp
+    backend._config["tidal"]["playlist_changes_ttl_secs"] = 0
+    backend.session.playlist.return_value = mocker.Mock(last_updated=10)
+    playlist = mocker.MagicMock(uri="tidal:playlist:101", last_modified=10)
+    tpp._playlists["tidal:playlist:101"] = playlist
+
+    assert tpp.lookup("tidal:playlist:101") is playlist
+
+    backend.session.playlist.assert_called_once_with("101")
+    backend.session.user.playlists.assert_not_called()
+
+
 def test_get_items_none(tpp):
     tpp, backend = tpp
     assert not tpp.get_items("tidal:playlist:0-1-2")
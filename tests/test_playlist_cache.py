@@ -1,8 +1,17 @@
+from array import array
 from pathlib import Path
 
 import pytest
+from mopidy.models import Playlist as MopidyPlaylist
+from mopidy.models import Track
 
-from mopidy_tidal.playlists import PlaylistCache, PlaylistMetadataCache, TidalPlaylist
+from mopidy_tidal import track_store
+from mopidy_tidal.playlists import (
+    CompactPlaylist,
+    PlaylistCache,
+    PlaylistMetadataCache,
+    TidalPlaylist,
+)
 
 
 def test_metadata_cache():
@@ -49,3 +58,161 @@ def test_updated(mocker):
     cache["tidal:playlist:0-1-2"] = playlist
     with pytest.raises(KeyError):
         cache[key]
+
+
+def make_playlist(playlist_id, track_ids, last_modified=10):
+    return MopidyPlaylist(
+        uri=f"tidal:playlist:{playlist_id}",
+        name=f"Playlist-{playlist_id}",
+        last_modified=last_modified,
+        tracks=[
+            Track(uri=f"tidal:track:1:2:{i}", name=f"Track-{i}") for i in track_ids
+        ],
+    )
+
+
+def test_playlists_are_stored_as_track_ids():
+    cache = PlaylistCache(persist=False)
+    playlists = {p.uri: p for p in (make_playlist(1, [1, 2]), make_playlist(2, [2]))}
+
+    cache.update(playlists)
+
+    entry = super(PlaylistCache, cache).__getitem__("tidal:playlist:1")
+    assert isinstance(entry, CompactPlaylist)
+    assert entry.track_ids == array("q", [1, 2])
+    # Shared tracks are stored once
+    assert len(cache._tracks) == 2
+    assert cache["tidal:playlist:1"] == playlists["tidal:playlist:1"]
+    assert cache["2"] == playlists["tidal:playlist:2"]
+
+
+def test_persisted_playlists_share_the_track_store():
+    cache = PlaylistCache()
+    playlist = make_playlist(1, [1, 2])
+    cache[playlist.uri] = playlist
+    track_store._stores.clear()
+
+    loaded = PlaylistCache(max_size=0)
+
+    assert loaded[playlist.uri] == playlist
+    assert len(loaded._tracks) == 2
+
+
+def test_tracks_of_pruned_playlists_are_dropped():
+    cache = PlaylistCache(persist=False)
+    cache.update({p.uri: p for p in (make_playlist(1, [1, 2]), make_playlist(2, [2]))})
+
+    cache.prune("tidal:playlist:1")
+
+    assert len(cache._tracks) == 1
+    assert cache["tidal:playlist:2"] == make_playlist(2, [2])
+
+
+def test_unused_tracks_are_dropped_from_storage():
+    cache = PlaylistCache()
+    cache.update({p.uri: p for p in (make_playlist(1, [1, 2]), make_playlist(2, [2]))})
+    # The track IDs of the playlists are persisted
+    track_store._stores.clear()
+    cache = PlaylistCache()
+
+    cache["tidal:playlist:2"] = make_playlist(2, [3], last_modified=20)
+    cache.prune("tidal:playlist:1")
+    track_store._stores.clear()
+    store = track_store.get_track_store()
+
+    assert store.get_tracks([3]) == list(make_playlist(2, [3]).tracks)
+    for track_id in (1, 2):
+        with pytest.raises(KeyError):
+            store.storage.get(f"tidal:track:{track_id}")
+
+
+def test_dropped_tracks_are_stored_again_when_used():
+    cache = PlaylistCache()
+    playlist = make_playlist(1, [1, 2])
+    cache[playlist.uri] = playlist
+    cache.prune(playlist.uri)
+
+    cache[playlist.uri] = playlist
+
+    assert cache._tracks.storage.get("tidal:track:1") == playlist.tracks[0]
+
+
+def test_playlist_with_missing_tracks_is_a_miss():
+    cache = PlaylistCache()
+    playlist = make_playlist(1, [1, 2])
+    cache[playlist.uri] = playlist
+    cache._tracks.prune_all()
+
+    assert playlist.uri not in cache
+    with pytest.raises(KeyError):
+        cache[playlist.uri]
+    # The entry is dropped, so that the playlist is fetched again
+    with pytest.raises(KeyError):
+        cache.storage.get(playlist.uri)
+
+
+def test_pruned_playlist_keeps_the_tracks_of_other_caches():
+    cache = PlaylistCache(max_size=1)
+    other_cache = PlaylistCache(max_size=0)
+    playlist = make_playlist(1, [1, 2])
+    cache[playlist.uri] = playlist
+    other_cache[playlist.uri] = playlist
+
+    # Evicted from memory, then pruned
+    cache["tidal:playlist:2"] = make_playlist(2, [3])
+    cache.prune(playlist.uri, "tidal:playlist:2")
+
+    # The tracks are only dropped from the storage
+    assert other_cache[playlist.uri] == playlist
+    with pytest.raises(KeyError):
+        other_cache._tracks.storage.get("tidal:track:1")
+
+
+def test_caches_not_persisted_have_their_own_tracks():
+    cache = PlaylistCache(persist=False)
+    other_cache = PlaylistCache(persist=False)
+    playlist = make_playlist(1, [1, 2])
+    cache[playlist.uri] = playlist
+    other_cache[playlist.uri] = playlist
+
+    cache.prune(playlist.uri)
+
+    assert len(cache._tracks) == 0
+    assert other_cache[playlist.uri] == playlist
+
+
+def test_unchanged_tracks_are_not_written_again(mocker):
+    cache = PlaylistCache()
+    set_many = mocker.spy(cache._tracks.storage, "set_many")
+
+    cache["tidal:playlist:1"] = make_playlist(1, [1, 2])
+    cache["tidal:playlist:2"] = make_playlist(2, [2, 3])
+    cache["tidal:playlist:1"] = make_playlist(1, [1, 2], last_modified=20)
+
+    assert [sorted(c.args[0]) for c in set_many.call_args_list] == [
+        ["tidal:track:1", "tidal:track:2"],
+        ["tidal:track:3"],
+    ]
+
+
+def test_tracks_without_numeric_ids_are_stored_in_the_playlist():
+    cache = PlaylistCache(persist=False)
+    playlist = MopidyPlaylist(
+        uri="tidal:playlist:1", tracks=[Track(uri="tidal:track:0-0-0:1-1-1:2-2-2")]
+    )
+
+    cache[playlist.uri] = playlist
+
+    assert super(PlaylistCache, cache).__getitem__(playlist.uri) == playlist
+    assert len(cache._tracks) == 0
+
+
+def test_playlist_in_use_is_reused():
+    cache = PlaylistCache(persist=False)
+    cache.update({p.uri: p for p in (make_playlist(1, [1, 2]), make_playlist(2, [2]))})
+
+    playlist = cache["tidal:playlist:1"]
+
+    assert cache["tidal:playlist:1"] is playlist
+    cache["tidal:playlist:1"] = make_playlist(1, [2], last_modified=20)
+    assert cache["tidal:playlist:1"].last_modified == 20
@@ -0,0 +1,231 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+from tidalapi import Config, Session
+from tidalapi.exceptions import TooManyRequests
+
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.rate_limit import (
+    RequestScheduler,
+    TokenBucket,
+    get_max_retries,
+    get_requests_per_sec,
+    parse_retry_after,
+)
+
+
+class FakeAPI:
+    """Local HTTP server answering with a queue of canned responses."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api.requests.append(self.path)
+                status, headers = api.responses.pop(0) if api.responses else (200, {})
+                body = json.dumps({"status": status}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        self._server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True
+        )
+
+    def throttle(self, times, retry_after=None):
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.responses.extend([(429, headers)] * times)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def fake_api():
+    with FakeAPI() as api:
+        yield api
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.now += secs
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def http(clock):
+    def _http(**kwargs):
+        scheduler = RequestScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+        session = requests.Session()
+        session.mount("http://", scheduler.adapter())
+        return session
+
+    return _http
+
+
+class TestRequestScheduler:
+    def test_retries_after_retry_after(self, fake_api, http, clock):
+        fake_api.throttle(2, retry_after=3)
+
+        response = http().get(fake_api.url)
+
+        assert response.status_code == 200
+        assert len(fake_api.requests) == 3
+        assert clock.sleeps == [3, 3]
+        assert metrics.counter("api.throttled") == 2
+        assert metrics.counter("api.retried") == 2
+        assert metrics.counter("api.requests") == 3
+
+    def test_backs_off_exponentially_without_retry_after(
+        self, fake_api, http, clock, mocker
+    ):
+        uniform = mocker.patch(
+            "mopidy_tidal.rate_limit.random.uniform", side_effect=lambda a, b: b
+        )
+        fake_api.throttle(3)
+
+        response = http(backoff_base=1).get(fake_api.url)
+
+        assert response.status_code == 200
+        assert clock.sleeps == [1, 2, 4]
+        assert [c.args for c in uniform.mock_calls] == [(0, 1), (0, 2), (0, 4)]
+
+    def test_backoff_is_capped(self, mocker):
+        mocker.patch(
+            "mopidy_tidal.rate_limit.random.uniform", side_effect=lambda a, b: b
+        )
+        scheduler = RequestScheduler(backoff_base=1, backoff_max=5)
+
+        assert [scheduler.backoff(i) for i in range(5)] == [1, 2, 4, 5, 5]
+
+    def test_gives_up_after_max_retries(self, fake_api, http):
+        fake_api.throttle(5, retry_after=0)
+
+        response = http(max_retries=2).get(fake_api.url)
+
+        assert response.status_code == 429
+        assert len(fake_api.requests) == 3
+        assert metrics.counter("api.retried") == 2
+        assert metrics.counter("api.gave_up") == 1
+
+    def test_does_not_wait_for_too_long(self, fake_api, http, clock):
+        fake_api.throttle(1, retry_after=3600)
+
+        response = http().get(fake_api.url)
+
+        assert response.status_code == 429
+        assert len(fake_api.requests) == 1
+        assert not clock.sleeps
+
+    def test_throttles_requests(self, fake_api, http, clock):
+        session = http(requests_per_sec=2)
+
+        for _ in range(6):
+            session.get(fake_api.url)
+
+        # 2 requests go through straight away, then one every 0.5 seconds
+        assert clock.now == pytest.approx(2)
+        assert metrics.counter("api.rate_limited") == 4
+
+    def test_tidalapi_requests_are_retried(self, fake_api):
+        fake_api.throttle(1, retry_after=0)
+        session = Session(Config())
+        RequestScheduler().install(session)
+
+        response = session.request.request("GET", "tracks/1", base_url=fake_api.url)
+
+        assert response.json() == {"status": 200}
+        assert len(fake_api.requests) == 2
+
+    def test_tidalapi_raises_once_retries_exhausted(self, fake_api):
+        fake_api.throttle(2, retry_after=0)
+        session = Session(Config())
+        RequestScheduler(max_retries=1).install(session)
+
+        with pytest.raises(TooManyRequests) as e:
+            session.request.request("GET", "tracks/1", base_url=fake_api.url)
+
+        assert e.value.retry_after == 0
+        assert len(fake_api.requests) == 2
+
+
+class TestTokenBucket:
+    def test_no_limit(self, clock):
+        bucket = TokenBucket(0, clock=clock, sleep=clock.sleep)
+
+        assert [bucket.acquire() for _ in range(100)] == [0] * 100
+
+    def test_refills_over_time(self, clock):
+        bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(0.1)
+        clock.now += 1
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+
+    def test_pause_holds_requests(self, clock):
+        bucket = TokenBucket(0, clock=clock, sleep=clock.sleep)
+
+        bucket.pause(5)
+        bucket.pause(1)
+
+        assert bucket.acquire() == 5
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, None),
+        ("", None),
+        ("7", 7),
+        ("-1", 0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0),
+        ("soon", None),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_config_defaults(config):
+    assert get_requests_per_sec() == 0
+    assert get_max_retries() == 3
+
+    config["tidal"]["api_requests_per_sec"] = 2.5
+    config["tidal"]["api_max_retries"] = 0
+    assert get_requests_per_sec() == 2.5
+    assert get_max_retries() == 0
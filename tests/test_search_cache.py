@@ -1,4 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
 from mopidy_tidal.lru_cache import SearchCache, SearchKey
+from mopidy_tidal.metrics import metrics
 
 
 def test_search_cache_returns_cached_value_if_present(mocker):
@@ -26,3 +30,81 @@ def test_search_defers_to_search_function_if_not_present_and_stores(mocker):
     assert results is mocker.sentinel.results
     assert str(search_key) in cache
     search_function.assert_called_once_with("arg", **query)
+
+
+def test_search_results_persisted_between_caches(mocker):
+    search_function = mocker.Mock(return_value=("artists", "albums", "tracks"))
+    query = {"exact": False, "query": {"any": ["Arty"]}}
+    SearchCache(search_function)("arg", **query)
+
+    results = SearchCache(search_function)("arg", **query)
+
+    assert results == ("artists", "albums", "tracks")
+    search_function.assert_called_once()
+
+
+def test_search_results_expire_after_ttl(mocker, config):
+    config["tidal"]["search_cache_ttl_secs"] = 60
+    search_function = mocker.Mock(return_value=mocker.sentinel.results)
+    time = mocker.patch("mopidy_tidal.lru_cache.time.time", return_value=1000)
+    cache = SearchCache(search_function)
+    query = {"exact": False, "query": {"any": ["Arty"]}}
+    cache("arg", **query)
+
+    time.return_value = 1059
+    cache("arg", **query)
+    assert search_function.call_count == 1
+
+    time.return_value = 1061
+    cache("arg", **query)
+    assert search_function.call_count == 2
+
+
+def test_search_results_never_expire_with_zero_ttl(mocker, config):
+    config["tidal"]["search_cache_ttl_secs"] = 0
+    search_function = mocker.Mock(return_value=mocker.sentinel.results)
+    time = mocker.patch("mopidy_tidal.lru_cache.time.time", return_value=1000)
+    cache = SearchCache(search_function)
+    query = {"exact": False, "query": {"any": ["Arty"]}}
+    cache("arg", **query)
+
+    time.return_value = 10**9
+    cache("arg", **query)
+
+    search_function.assert_called_once()
+
+
+def test_oldest_search_results_evicted_when_full(mocker, config):
+    config["tidal"]["search_cache_size"] = 2
+    search_function = mocker.Mock(side_effect=lambda *_, **kw: kw["query"]["any"])
+    cache = SearchCache(search_function)
+    for any in ("a", "b", "c"):
+        cache("arg", exact=False, query={"any": any})
+
+    new_cache = SearchCache(search_function)
+
+    assert str(SearchKey(exact=False, query={"any": "a"})) not in new_cache
+    assert new_cache("arg", exact=False, query={"any": "c"}) == "c"
+    assert search_function.call_count == 3
+
+
+def test_concurrent_identical_searches_are_coalesced(mocker, wait_for):
+    release = Event()
+
+    def search(*_, **__):
+        release.wait(5)
+        return mocker.sentinel.results
+
+    search_function = mocker.Mock(side_effect=search)
+    cache = SearchCache(search_function)
+    query = {"exact": False, "query": {"any": ["Arty"]}}
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(cache, "arg", **query) for _ in range(3)]
+        try:
+            wait_for(lambda: metrics.counter("search.coalesced") >= 2)
+        finally:
+            release.set()
+
+    assert [f.result() for f in futures] == [mocker.sentinel.results] * 3
+    search_function.assert_called_once()
@@ -0,0 +1,295 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Event, Semaphore, current_thread
+
+import pytest
+
+from mopidy_tidal.metrics import metrics
+from mopidy_tidal.workers import (
+    SingleFlight,
+    WorkerPool,
+    WorkerPools,
+    get_items,
+    iter_items,
+    run_in_background,
+    worker_pool,
+)
+
+
+def make_paged_source(mocker, num_items):
+    items = list(range(num_items))
+    source = mocker.Mock(side_effect=lambda limit, offset: items[offset:][:limit])
+    source.__name__ = "source"
+    return source
+
+
+class TestGetItems:
+    @pytest.mark.parametrize("num_items", (0, 99, 100, 1234))
+    def test_probing_returns_all_items_in_order(self, mocker, num_items):
+        source = make_paged_source(mocker, num_items)
+
+        assert get_items(source) == list(range(num_items))
+
+    def test_probing_requests_pages_in_rounds(self, mocker):
+        source = make_paged_source(mocker, 500)
+
+        get_items(source)
+
+        # The first round is full, so a second (empty) round is needed
+        assert source.call_count == 10
+
+    @pytest.mark.parametrize("num_items", (99, 1234))
+    def test_known_total_requests_only_needed_pages(self, mocker, num_items):
+        source = make_paged_source(mocker, num_items)
+
+        assert get_items(source, total=num_items) == list(range(num_items))
+        assert sorted(c.args for c in source.mock_calls) == [
+            (100, offset) for offset in range(0, num_items, 100)
+        ]
+
+    def test_known_total_checks_one_more_page_if_last_page_full(self, mocker):
+        source = make_paged_source(mocker, 200)
+
+        assert get_items(source, total=200) == list(range(200))
+        assert sorted(c.args for c in source.mock_calls) == [
+            (100, 0),
+            (100, 100),
+            (100, 200),
+        ]
+
+    def test_extra_page_is_requested_with_the_last_page(self, mocker):
+        # Each request waits for the others: the extra page must be requested
+        # while the other pages are
+        barrier = Barrier(3, timeout=5)
+        items = list(range(200))
+
+        def source(limit, offset):
+            barrier.wait()
+            return items[offset:][:limit]
+
+        source = mocker.Mock(side_effect=source, __name__="source")
+
+        assert get_items(source, total=200) == items
+        assert source.call_count == 3
+
+    @pytest.mark.parametrize("total", (0, -1))
+    def test_total_that_is_not_positive_probes_once(self, mocker, total):
+        assert get_items(make_paged_source(mocker, 0), total=total) == []
+
+        source = make_paged_source(mocker, 150)
+        assert get_items(source, total=total) == list(range(150))
+        assert source.call_count == 6
+
+    def test_probes_further_if_total_is_stale(self, mocker):
+        source = make_paged_source(mocker, 250)
+
+        assert get_items(source, total=200) == list(range(250))
+
+    def test_falls_back_to_probing_if_total_unknown(self, mocker):
+        source = make_paged_source(mocker, 250)
+
+        assert get_items(source, total=mocker.Mock()) == list(range(250))
+        assert source.call_count == 5
+
+    def test_parses_items(self, mocker):
+        source = make_paged_source(mocker, 3)
+
+        assert get_items(source, parse=str, total=3) == ["0", "1", "2"]
+
+
+class TestIterItems:
+    def test_yields_first_page_before_later_pages_are_in(self, mocker):
+        release = Event()
+        items = list(range(250))
+
+        def source(limit, offset):
+            if offset:
+                release.wait(5)
+            return items[offset:][:limit]
+
+        source = mocker.Mock(side_effect=source, __name__="source")
+
+        it = iter_items(source, total=250)
+        first_page = [next(it) for _ in range(100)]
+        release.set()
+
+        assert first_page == items[:100]
+        assert [*it] == items[100:]
+
+    def test_read_ahead_is_bounded(self, mocker):
+        source = make_paged_source(mocker, 1000)
+
+        it = iter_items(source, total=950, read_ahead=2)
+        next(it)
+
+        assert source.call_count <= 3
+        assert [0, *it] == list(range(1000))
+        # The total is stale: a round of 2 pages is probed past the last page
+        assert source.call_count == 12
+
+    def test_stops_requesting_pages_once_consumer_stops(self, mocker):
+        source = make_paged_source(mocker, 10000)
+
+        it = iter_items(source, total=10000, processes=1, read_ahead=1)
+        next(it)
+        it.close()
+
+        assert source.call_count <= 2
+
+    def test_parses_items_lazily(self, mocker):
+        source = make_paged_source(mocker, 3)
+        parse = mocker.Mock(side_effect=str)
+
+        it = iter_items(source, parse=parse, total=3)
+        assert next(it) == "0"
+        assert parse.call_count == 1
+        assert [*it] == ["1", "2"]
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_for_same_key_share_one_call(self, mocker, wait_for):
+        started, release = Event(), Event()
+
+        def slow_call():
+            started.set()
+            release.wait(5)
+            return mocker.sentinel.result
+
+        func = mocker.Mock(side_effect=slow_call)
+        single_flight = SingleFlight("test")
+
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(single_flight, "key", func)
+            started.wait(5)
+            followers = [pool.submit(single_flight, "key", func) for _ in range(3)]
+            try:
+                wait_for(lambda: metrics.counter("test.coalesced") >= 3)
+            finally:
+                release.set()
+
+            results = [f.result() for f in [leader, *followers]]
+
+        assert results == [mocker.sentinel.result] * 4
+        func.assert_called_once_with()
+        assert metrics.counter("test.coalesced") == 3
+
+    def test_calls_for_different_keys_are_not_coalesced(self, mocker):
+        func = mocker.Mock(side_effect=lambda x: x * 2)
+        single_flight = SingleFlight("test")
+
+        assert single_flight("a", func, 1) == 2
+        assert single_flight("b", func, 2) == 4
+        assert single_flight("a", func, 3) == 6
+        assert metrics.counter("test.coalesced") == 0
+
+    def test_errors_are_propagated_and_not_remembered(self, mocker):
+        func = mocker.Mock(side_effect=[ValueError("boom"), "ok"])
+        single_flight = SingleFlight("test")
+
+        with pytest.raises(ValueError):
+            single_flight("key", func)
+
+        assert single_flight("key", func) == "ok"
+
+
+class TestWorkerPool:
+    @pytest.fixture
+    def pool(self):
+        pool = WorkerPool("test", 2)
+        yield pool
+        pool.shutdown()
+
+    def test_runs_tasks_and_tracks_them_in_gauges(self, pool):
+        started, release = Semaphore(0), Event()
+
+        def task(x):
+            started.release()
+            release.wait(5)
+            return x * 2
+
+        first, *others = [pool.submit(task, x) for x in (1, 2, 3)]
+        assert started.acquire(timeout=5) and started.acquire(timeout=5)
+
+        assert metrics.gauge("pools.test.active") == 2
+        assert metrics.gauge("pools.test.queued") == 1
+        release.set()
+        assert [f.result() for f in [first, *others]] == [2, 4, 6]
+        assert (pool.active, pool.queued) == (0, 0)
+        assert metrics.gauge("pools.test.active") == 0
+
+    def test_nested_tasks_run_inline(self):
+        pool = WorkerPool("test", 1)
+
+        def outer():
+            # Would deadlock if queued behind the only (busy) worker
+            return [f.result(5) for f in [pool.submit(str, i) for i in range(3)]]
+
+        try:
+            assert pool.submit(outer).result(5) == ["0", "1", "2"]
+        finally:
+            pool.shutdown()
+
+    def test_map_preserves_order(self, pool):
+        assert list(pool.map(str, range(10))) == [str(i) for i in range(10)]
+
+    def test_cancelled_tasks_leave_the_queue(self, pool):
+        release = Event()
+        busy = [pool.submit(release.wait, 5) for _ in range(2)]
+        queued = pool.submit(str, 1)
+
+        assert queued.cancel()
+        assert pool.queued == 0
+        release.set()
+        assert all(f.result() for f in busy)
+
+
+class TestWorkerPools:
+    def test_worker_pool_falls_back_to_temporary_pool(self):
+        with worker_pool("api", 2) as pool:
+            assert isinstance(pool, ThreadPoolExecutor)
+            assert pool.submit(str, 1).result() == "1"
+
+    def test_worker_pool_uses_started_pools(self):
+        pools = WorkerPools({"api": 2})
+        pools.start()
+        try:
+            with worker_pool("api", 5) as pool:
+                assert pool is pools.get("api")
+                assert pool.max_workers == 2
+            with worker_pool("search", 5) as pool:
+                assert pool.max_workers == 4
+        finally:
+            pools.shutdown()
+
+        with worker_pool("api", 2) as pool:
+            assert isinstance(pool, ThreadPoolExecutor)
+
+    def test_run_in_background_uses_started_pools(self):
+        pools = WorkerPools({"background": 1})
+        pools.start()
+        try:
+            future = run_in_background("background", lambda: current_thread().name)
+            assert future.result(timeout=5).startswith("mopidy-tidal-background-")
+            assert metrics.gauge("pools.background.active") == 0
+        finally:
+            pools.shutdown()
+
+    def test_run_in_background_does_not_wait_without_started_pools(self):
+        release = Event()
+        future = run_in_background("background", release.wait, 5)
+        try:
+            assert not future.done()
+        finally:
+            release.set()
+        assert future.result(timeout=5) is True
+
+    def test_get_items_pages_on_shared_pool(self, mocker):
+        source = make_paged_source(mocker, 250)
+        pools = WorkerPools()
+        pools.start()
+        try:
+            assert get_items(source, total=250) == list(range(250))
+        finally:
+            pools.shutdown()
+
+        assert metrics.gauge("pools.api.queued") == 0
+        assert metrics.gauge("pools.api.active") == 0